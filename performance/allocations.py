@@ -0,0 +1,132 @@
+"""Memory blocks retained by benchmarks, traced by tracemalloc (--trace-alloc).
+
+tracemalloc only sees memory blocks which are still alive: blocks allocated
+and released by the benchmark function are not in its snapshots. The metrics
+per source line are the blocks retained per inner loop: allocated by the
+benchmark function and not released when it returns (caches, leaks, growing
+containers). Temporary blocks, allocated and released by the benchmark
+function (ex: objects created by a loop and released at the next loop), are
+only measured by the peak size of the traced memory, without source lines.
+
+Metadata:
+
+* alloc_retained_blocks, alloc_retained_size: number and size in bytes of the
+  memory blocks retained per inner loop
+* alloc_peak_size: peak size in bytes of the traced memory while the
+  benchmark function ran (not divided by the number of loops)
+* alloc_temporary_size: peak size in bytes of the temporary blocks, the peak
+  of the traced memory minus the memory still traced when the benchmark
+  function returns, average of all calls (not divided by the number of loops)
+* alloc_retained_lines: blocks retained per inner loop of the RETAINED_LINES
+  source lines retaining the most blocks, "file:line blocks size" separated
+  by semicolons
+"""
+
+from __future__ import division, with_statement, print_function, absolute_import
+
+import json
+import os.path
+
+
+# Number of source lines stored in the alloc_retained_lines metadata
+RETAINED_LINES = 20
+
+
+def short_filename(filename):
+    """Keep the last two parts of a path: paths of two virtual environments
+    are different."""
+    parts = filename.replace(os.sep, '/').split('/')
+    return '/'.join(parts[-2:])
+
+
+def load_traces(filename, inner_loops=1):
+    """Load traces written by the instrument script.
+
+    Args:
+        filename: JSON file written by the --trace-alloc option of the
+            instrument script: blocks retained per loop of the benchmark
+            function.
+        inner_loops: number of inner loops per loop of the benchmark
+            function.
+
+    Returns:
+        Metadata as a dict.
+    """
+    with open(filename) as fp:
+        data = json.load(fp)
+
+    lines = {}
+    for trace_filename, lineno, blocks, size in data['traces']:
+        key = '%s:%s' % (short_filename(trace_filename), lineno)
+        entry = lines.setdefault(key, [0, 0])
+        entry[0] += blocks / inner_loops
+        entry[1] += size / inner_loops
+
+    total_blocks = sum(entry[0] for entry in lines.values())
+    total_size = sum(entry[1] for entry in lines.values())
+    top = sorted(lines.items(), key=lambda item: (-item[1][0], item[0]))
+    top = top[:RETAINED_LINES]
+    return {
+        'alloc_retained_blocks': '%.2f' % total_blocks,
+        'alloc_retained_size': '%.1f' % total_size,
+        'alloc_peak_size': str(data['peak']),
+        'alloc_temporary_size': '%.1f' % data.get('temporary', 0),
+        'alloc_retained_lines': '; '.join('%s %.2f %.1f' % (key, blocks, size)
+                                          for key, (blocks, size) in top),
+    }
+
+
+class RetainedBlocks(object):
+    """Memory blocks retained per inner loop parsed from benchmark
+    metadata."""
+
+    def __init__(self, blocks, size, lines, temporary_size=None):
+        self.blocks = blocks
+        self.size = size
+        # "file:line" => (blocks, size)
+        self.lines = lines
+        # peak size of the temporary blocks, None for results of older
+        # versions
+        self.temporary_size = temporary_size
+
+    @classmethod
+    def from_metadata(cls, metadata):
+        """Parse metadata, return None if allocations were not traced."""
+        if 'alloc_retained_blocks' not in metadata:
+            return None
+        lines = {}
+        for item in metadata.get('alloc_retained_lines', '').split(';'):
+            item = item.strip()
+            if not item:
+                continue
+            key, blocks, size = item.rsplit(' ', 2)
+            lines[key] = (float(blocks), float(size))
+        temporary_size = metadata.get('alloc_temporary_size')
+        if temporary_size is not None:
+            temporary_size = float(temporary_size)
+        return cls(float(metadata['alloc_retained_blocks']),
+                   float(metadata['alloc_retained_size']), lines,
+                   temporary_size)
+
+
+def diff_lines(base, changed):
+    """Compare retained blocks per source line.
+
+    Returns:
+        A list of (line, base_blocks, changed_blocks) tuples of lines with a
+        different number of retained blocks, sorted by decreasing absolute
+        change.
+    """
+    diff = []
+    for key in set(base.lines) | set(changed.lines):
+        if any(key not in retained.lines
+               and len(retained.lines) >= RETAINED_LINES
+               for retained in (base, changed)):
+            # the line may be missing because only the top lines are stored
+            continue
+        base_blocks = base.lines.get(key, (0.0, 0.0))[0]
+        changed_blocks = changed.lines.get(key, (0.0, 0.0))[0]
+        if base_blocks != changed_blocks:
+            diff.append((key, base_blocks, changed_blocks))
+    diff.sort(key=lambda item: (-abs(item[2] - item[1]), item[0]))
+    return diff
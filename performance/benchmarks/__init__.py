@@ -8,7 +8,7 @@ import perf
 import performance
 from performance.venv import ROOT_DIR
 from performance.run import (run_perf_script,
-                            BenchmarkError, CallAndCaptureOutput)
+                            BenchmarkError, CallAndCaptureOutput, get_timeout)
 
 
 def Relative(*path):
@@ -26,6 +26,17 @@ def VersionRange(minver=None, maxver=None):
     return deco
 
 
+# Decorator for startup benchmarks: after the measured run, the import time
+# of each module of "python python_args -c pass" is measured once per
+# benchmark in an unmeasured pass (see run.measure_import_times()).
+
+def ImportTime(python_args=()):
+    def deco(func):
+        func._importtime_args = list(python_args)
+        return func
+    return deco
+
+
 @VersionRange()
 def BM_PyBench(python, options):
     #if options.track_memory:
@@ -52,7 +63,8 @@ def BM_PyBench(python, options):
     try:
         cmd = python + args
         stdout = CallAndCaptureOutput(cmd, inherit_env=options.inherit_env,
-                                      hide_stderr=False)
+                                      hide_stderr=False,
+                                      timeout=get_timeout(options))
 
         suite = perf.BenchmarkSuite.loads(stdout)
         for benchmark in suite:
@@ -261,15 +273,59 @@ def BM_Formatted_Logging(python, options):
     return _LoggingBenchmark(python, options, "formatted_output")
 
 
+def _StartupBenchmark(python, options, extra_args=[]):
+    bm_path = Relative("bm_startup.py")
+    return run_perf_script(python, options, bm_path, extra_args=extra_args)
+
 @VersionRange()
+@ImportTime()
 def BM_normal_startup(python, options):
-    bm_path = Relative("bm_startup.py")
-    return run_perf_script(python, options, bm_path)
+    return _StartupBenchmark(python, options)
 
 @VersionRange()
+@ImportTime(["-S"])
 def BM_startup_nosite(python, options):
-    bm_path = Relative("bm_startup.py")
-    return run_perf_script(python, options, bm_path, extra_args=["--no-site"])
+    return _StartupBenchmark(python, options, extra_args=["--no-site"])
+
+
+def _AppStartupBenchmark(python, options, app, cold=False):
+    bm_path = Relative("bm_app_startup.py")
+    extra_args = [app]
+    if cold:
+        extra_args.append("--cold")
+    return run_perf_script(python, options, bm_path, extra_args=extra_args)
+
+@VersionRange('2.7', None)
+def BM_django_startup(python, options):
+    return _AppStartupBenchmark(python, options, "django")
+
+@VersionRange('3.8', None)   # PYTHONPYCACHEPREFIX
+def BM_django_startup_cold(python, options):
+    return _AppStartupBenchmark(python, options, "django", cold=True)
+
+@VersionRange()
+def BM_tornado_startup(python, options):
+    return _AppStartupBenchmark(python, options, "tornado")
+
+@VersionRange('3.8', None)
+def BM_tornado_startup_cold(python, options):
+    return _AppStartupBenchmark(python, options, "tornado", cold=True)
+
+@VersionRange()
+def BM_mako_startup(python, options):
+    return _AppStartupBenchmark(python, options, "mako")
+
+@VersionRange('3.8', None)
+def BM_mako_startup_cold(python, options):
+    return _AppStartupBenchmark(python, options, "mako", cold=True)
+
+@VersionRange('2.7', None)
+def BM_chameleon_startup(python, options):
+    return _AppStartupBenchmark(python, options, "chameleon")
+
+@VersionRange('3.8', None)
+def BM_chameleon_startup_cold(python, options):
+    return _AppStartupBenchmark(python, options, "chameleon", cold=True)
 
 
 @VersionRange()
@@ -376,7 +432,12 @@ BENCH_GROUPS = {"default": ["2to3", "chameleon", "django_template", "nbody",
                             "tornado_http", "fastpickle", "fastunpickle",
                             "regex_v8", "json_dump_v2", "json_load"],
                 "startup": ["normal_startup", "startup_nosite",
-                            "hg_startup"],
+                            "hg_startup", "app_startup"],
+                "app_startup": ["django_startup", "django_startup_cold",
+                                "tornado_startup", "tornado_startup_cold",
+                                "mako_startup", "mako_startup_cold",
+                                "chameleon_startup",
+                                "chameleon_startup_cold"],
                 "regex": ["regex_v8", "regex_effbot", "regex_compile"],
                 "threading": ["threaded_count", "iterative_count"],
                 "serialize": ["slowpickle", "slowunpickle",  # Not for Python 3
@@ -0,0 +1,90 @@
+"""
+Startup time of applications: import a third-party package in a fresh
+interpreter.
+
+In cold mode, Python is run with an empty bytecode cache
+(PYTHONPYCACHEPREFIX, Python 3.8+) and doesn't write bytecode
+(PYTHONDONTWRITEBYTECODE), so each run compiles all modules from source. In
+warm mode, modules are loaded from the __pycache__ directories. The difference
+is the cost of the compiler compared to unmarshal.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import perf.text_runner
+from six.moves import xrange
+
+
+IMPORTS = {
+    'django': ('import django; '
+               'from django.conf import settings; '
+               'settings.configure(); '
+               'django.setup()'),
+    'tornado': 'import tornado.web',
+    'mako': 'import mako.template',
+    'chameleon': 'import chameleon',
+}
+
+
+def bench_startup(loops, command, env):
+    run = subprocess.check_call
+    range_it = xrange(loops)
+    t0 = perf.perf_counter()
+
+    for _ in range_it:
+        run(command, env=env)
+
+    return perf.perf_counter() - t0
+
+
+def make_env(cold):
+    """Get the environment variables of the application processes.
+
+    Returns:
+        (env, tmpdir) tuple: tmpdir is the empty bytecode cache directory of
+        the cold mode, to be removed, or None.
+    """
+    env = dict(os.environ)
+    tmpdir = None
+    if cold:
+        # empty cache which stays empty: bytecode is never written
+        tmpdir = tempfile.mkdtemp()
+        env['PYTHONPYCACHEPREFIX'] = tmpdir
+        env['PYTHONDONTWRITEBYTECODE'] = '1'
+    return (env, tmpdir)
+
+
+def prepare_cmd(runner, cmd):
+    cmd.append(runner.args.app)
+    if runner.args.cold:
+        cmd.append("--cold")
+
+
+if __name__ == "__main__":
+    runner = perf.text_runner.TextRunner(name='app_startup', samples=10)
+    runner.argparser.add_argument("app", choices=sorted(IMPORTS))
+    runner.argparser.add_argument("--cold", action="store_true",
+                                  help="Empty bytecode cache")
+    runner.prepare_subprocess_args = prepare_cmd
+
+    args = runner.parse_args()
+    runner.name += "/%s" % args.app
+    runner.metadata['description'] = ("Startup time of %s (%s bytecode "
+                                      "cache)"
+                                      % (args.app,
+                                         "cold" if args.cold else "warm"))
+
+    if args.cold:
+        runner.name += "_cold"
+    env, tmpdir = make_env(args.cold)
+
+    command = [sys.executable, "-c", IMPORTS[args.app]]
+    try:
+        runner.bench_sample_func(bench_startup, command, env)
+    finally:
+        if tmpdir is not None:
+            shutil.rmtree(tmpdir)
@@ -0,0 +1,131 @@
+from __future__ import division, with_statement, print_function, absolute_import
+
+import json
+import os
+import re
+import sys
+
+
+# Minimum number of worker processes of a benchmark in time budget mode
+MIN_PROCESSES = 3
+
+# Estimated duration of a worker process (in seconds) of a benchmark which
+# never ran before, used if no benchmark ran before
+DEFAULT_PROCESS_DURATION = 10.0
+
+_DURATION_RE = re.compile(r'^(?:(\d+(?:\.\d*)?)h)?(?:(\d+(?:\.\d*)?)m)?'
+                          r'(?:(\d+(?:\.\d*)?)s?)?$')
+
+
+def parse_duration(text):
+    """Parse a duration like "90", "90s", "20m" or "1h30m" into seconds."""
+    match = _DURATION_RE.match(text.strip())
+    if not match or not any(match.groups()):
+        raise ValueError("invalid duration: %r" % text)
+    hours, minutes, seconds = (float(value) if value else 0.0
+                               for value in match.groups())
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def format_duration(seconds):
+    if seconds >= 60:
+        return "%.0f min %.0f sec" % divmod(seconds, 60)
+    return "%.1f sec" % seconds
+
+
+def get_default_history_filename():
+    # sys.prefix is the virtual environment of the benchmarked Python:
+    # durations are specific to an interpreter
+    return os.path.join(sys.prefix, 'performance_durations.json')
+
+
+class DurationHistory(object):
+    """Durations of the previous runs of benchmarks.
+
+    For each benchmark, store the duration of its last run and its number of
+    worker processes in a JSON file.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.durations = {}
+        if os.path.exists(filename):
+            with open(filename) as fp:
+                self.durations = json.load(fp)
+
+    def record(self, name, duration, processes):
+        self.durations[name] = {'duration': duration,
+                                'processes': processes}
+
+    def save(self):
+        tmp_filename = self.filename + '.tmp'
+        with open(tmp_filename, 'w') as fp:
+            json.dump(self.durations, fp, sort_keys=True, indent=4)
+        if os.path.exists(self.filename):
+            os.unlink(self.filename)
+        os.rename(tmp_filename, self.filename)
+
+    def get_process_duration(self, name):
+        """Get the estimated duration of one worker process in seconds,
+        or None if the benchmark never ran before."""
+        entry = self.durations.get(name)
+        if not entry or not entry['processes']:
+            return None
+        return entry['duration'] / entry['processes']
+
+
+def plan_budget(to_run, history, budget, max_processes,
+                min_processes=MIN_PROCESSES):
+    """Plan the number of worker processes of each benchmark.
+
+    First, if the budget doesn't cover min_processes processes for all
+    benchmarks, the most expensive benchmarks are dropped. Then processes
+    are given one by one to each benchmark in turn, cheapest benchmarks first,
+    while the budget allows it, to spread the number of samples evenly.
+
+    Args:
+        to_run: list of benchmark names.
+        history: DurationHistory.
+        budget: time budget in seconds.
+        max_processes: maximum number of processes of a benchmark.
+
+    Returns:
+        (plan, dropped, estimated) tuple: plan is a dict mapping benchmark
+        names to numbers of processes, dropped is the list of dropped
+        benchmarks and estimated the estimated duration in seconds.
+    """
+    known = [history.get_process_duration(name) for name in to_run]
+    known = sorted(cost for cost in known if cost is not None)
+    if known:
+        # median of the known costs
+        default_cost = known[len(known) // 2]
+    else:
+        default_cost = DEFAULT_PROCESS_DURATION
+
+    costs = {}
+    for name in to_run:
+        cost = history.get_process_duration(name)
+        costs[name] = cost if cost is not None else default_cost
+
+    min_processes = min(min_processes, max_processes)
+    selected = sorted(to_run, key=lambda name: (costs[name], name))
+    dropped = []
+    while selected and (sum(costs[name] for name in selected) * min_processes
+                        > budget):
+        dropped.append(selected.pop())
+
+    plan = dict((name, min_processes) for name in selected)
+    spent = sum(costs[name] * min_processes for name in selected)
+    progress = True
+    while progress:
+        progress = False
+        for name in selected:
+            if plan[name] >= max_processes:
+                continue
+            if spent + costs[name] > budget:
+                continue
+            plan[name] += 1
+            spent += costs[name]
+            progress = True
+
+    return (plan, sorted(dropped), spent)
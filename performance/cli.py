@@ -4,6 +4,7 @@ import argparse
 import os.path
 import sys
 
+from performance.budget import parse_duration
 from performance.venv import exec_in_virtualenv, which, cmd_venv
 
 
@@ -12,6 +13,19 @@ def ParseEnvVars(option, opt_str, value, parser):
     parser.values.inherit_env = [v for v in value.split(",") if v]
 
 
+def ParsePercent(value):
+    """Parse a percentage like "0.5%" or "0.5" into a ratio (0.005)."""
+    return float(value.rstrip('%')) / 100
+
+
+def ParseDuration(value):
+    """Parse a duration like "90s", "20m" or "1h30m" into seconds."""
+    try:
+        return parse_duration(value)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(str(exc))
+
+
 def _add_run_options(cmd):
     cmd.add_argument("-r", "--rigorous", action="store_true",
                       help=("Spend longer running tests to get more" +
@@ -22,9 +36,10 @@ def _add_run_options(cmd):
                       help="Debug: fastest mode, only collect a single sample")
     cmd.add_argument("-v", "--verbose", action="store_true",
                       help="Print more output")
-    # FIXME: reimplement this feature
-    #cmd.add_argument("-m", "--track_memory", action="store_true",
-    #                  help="Track memory usage. This only works on Linux.")
+    cmd.add_argument("-m", "--track_memory", action="store_true",
+                      help=("Track the memory usage of worker processes: "
+                            "store the peak RSS and a RSS timeline in "
+                            "metadata. This only works on Linux."))
 
     cmd.add_argument("-a", "--args", default="",
                       help=("Pass extra arguments (interpreted as a "
@@ -51,6 +66,77 @@ def _add_run_options(cmd):
                       help=("Specify CPU affinity for benchmark runs. This "
                             "way, benchmarks can be forced to run on a given "
                             "CPU to minimize run to run variation."))
+    cmd.add_argument("-j", "--jobs", metavar="N", type=int, default=1,
+                      help=("Run up to N benchmarks in parallel. Each job is "
+                            "pinned to its own group of CPUs taken from "
+                            "--affinity (default: all available CPUs). "
+                            "Default: 1 (run benchmarks sequentially)."))
+    cmd.add_argument("--target-precision", metavar="PERCENT",
+                      type=ParsePercent, default=None,
+                      help=("Adaptive sampling: spawn more worker processes "
+                            "until the half-width of the 95%% confidence "
+                            "interval of the median is smaller than PERCENT "
+                            "of the median (ex: 0.5%%), or until "
+                            "--max-bench-time is reached."))
+    cmd.add_argument("--max-bench-time", metavar="SECONDS",
+                      type=float, default=600.0,
+                      help=("Maximum duration of a benchmark in adaptive "
+                            "sampling mode (default: 600 seconds)."))
+    cmd.add_argument("--time-budget", metavar="DURATION",
+                      type=ParseDuration, default=None,
+                      help=("Fit the whole run in DURATION (ex: 20m, 1h30m): "
+                            "plan the number of worker processes of each "
+                            "benchmark from the durations of previous runs. "
+                            "Benchmarks which don't fit are dropped."))
+    cmd.add_argument("--timeout", metavar="SECONDS",
+                      type=float, default=None,
+                      help=("Kill a benchmark which doesn't complete in "
+                            "SECONDS, record it as failed and run the next "
+                            "benchmark. Tracebacks of the hung processes "
+                            "are written into stderr."))
+    cmd.add_argument("--global-timeout", metavar="DURATION",
+                      type=ParseDuration, default=None,
+                      help=("Timeout of the whole run (ex: 2h): the running "
+                            "benchmark is killed and the remaining "
+                            "benchmarks are skipped."))
+    cmd.add_argument("--profile", metavar="DIR", default=None,
+                      help=("Run an extra unmeasured worker process per "
+                            "benchmark under cProfile and write statistics "
+                            "into DIR/BENCHMARK.pstats"))
+    cmd.add_argument("--flamegraph", metavar="DIR", default=None,
+                      help=("Run an extra unmeasured worker process per "
+                            "benchmark with a sampling profiler and write "
+                            "collapsed stacks and a SVG flame graph into "
+                            "DIR/BENCHMARK.collapsed and DIR/BENCHMARK.svg"))
+    cmd.add_argument("--sample-interval", metavar="MS",
+                      type=float, default=10.0,
+                      help=("Interval between two stack samples of "
+                            "--flamegraph in milliseconds (default: 10 ms)"))
+    cmd.add_argument("--trace-alloc", action="store_true",
+                      help=("Run an extra unmeasured worker process per "
+                            "benchmark with tracemalloc and store the memory "
+                            "blocks retained per loop, grouped by source "
+                            "line, and the peak size of temporary blocks in "
+                            "metadata. Requires Python 3.4 or newer."))
+    cmd.add_argument("--gc-stats", action="store_true",
+                      help=("Collect statistics of the garbage collector in "
+                            "each worker process using gc.callbacks and "
+                            "store them in metadata. Requires Python 3.3 or "
+                            "newer."))
+    cmd.add_argument("--auto-warmups", metavar="SAMPLES", type=int,
+                      default=None,
+                      help=("Run worker processes without warmup, computing "
+                            "SAMPLES samples each, and detect where the "
+                            "steady state starts using a changepoint "
+                            "analysis: samples before are removed. The "
+                            "warmup curve is stored in metadata."))
+    cmd.add_argument("--worker-server", action="store_true",
+                      help=("Run perf worker processes in children forked "
+                            "from warm interpreters which already imported "
+                            "perf and the benchmark dependencies, instead "
+                            "of spawning a fresh interpreter per process. "
+                            "See the documentation for the isolation "
+                            "differences. Requires fork()."))
 
 
 def _add_compare_options(cmd):
@@ -60,6 +146,26 @@ def _add_compare_options(cmd):
                       help=("What style the benchmark output should take."
                             " Valid options are 'normal' and 'table'."
                             " Default is normal."))
+    cmd.add_argument("--stats", choices=("ttest", "bootstrap", "mannwhitney"),
+                     default="ttest",
+                     help=("Statistical test of significant changes: "
+                           "Student's t-test (default), bootstrap confidence "
+                           "interval of the ratio of medians, or "
+                           "Mann-Whitney U test"))
+    cmd.add_argument("--correction", choices=("none", "holm", "bh"),
+                     default="none",
+                     help=("Correction of p-values for multiple "
+                           "comparisons: none (default), Holm-Bonferroni "
+                           "or Benjamini-Hochberg"))
+    cmd.add_argument("--weights", metavar="FILENAME",
+                     help=("Weights of benchmarks in the geometric mean: "
+                           "file with one \"benchmark weight\" line per "
+                           "benchmark, the default weight is 1"))
+    cmd.add_argument("--noise", metavar="FILENAME",
+                     help=("Noise file written by calibrate-noise: changes "
+                           "of the median smaller than the noise threshold "
+                           "of the benchmark are not significant, instead "
+                           "of changes smaller than 1%%"))
     cmd.add_argument("--csv", metavar="CSV_FILE",
                      action="store", default=None,
                      help=("Name of a file the results will be written to,"
@@ -83,19 +189,155 @@ def parse_args():
     cmd.add_argument("-o", "--output", metavar="FILENAME",
                       help="Run the benchmarks on only one interpreter and "
                            "write benchmark into FILENAME. "
-                           "Provide only baseline_python, not changed_python.")
+                           "Provide only baseline_python, not changed_python. "
+                           "Write a packed file if FILENAME ends with .pack, "
+                           "a result log if it ends with .jsonl.")
     cmd.add_argument("--append", metavar="FILENAME",
                       help="Add runs to an existing file, or create it "
-                           "if it doesn't exist")
+                           "if it doesn't exist. Packed files stay packed, "
+                           "runs are appended to result logs without "
+                           "rewriting them.")
+    cmd.add_argument("--changed-python", metavar="PYTHON",
+                      help="Interleaved A/B mode: run benchmarks on the "
+                           "Python of --python and on this second Python, "
+                           "alternating worker processes between the two "
+                           "interpreters. Results of the second Python "
+                           "are written into --changed-output")
+    cmd.add_argument("--changed-output", metavar="FILENAME",
+                      help="Output file of the --changed-python results")
+    cmd.add_argument("--resume", action="store_true",
+                      help="Resume an interrupted run: load benchmarks "
+                           "completed by the previous run from the journal "
+                           "of the output file and only run the remaining "
+                           "benchmarks")
 
     # compare
-    cmd = subparsers.add_parser('compare', help='Compare two benchmark files')
+    cmd = subparsers.add_parser('compare',
+                                help='Compare benchmark files to a baseline')
     cmds.append(cmd)
     cmd.add_argument("-v", "--verbose", action="store_true",
                       help="Print more output")
     _add_compare_options(cmd)
     cmd.add_argument("baseline_filename", metavar="baseline_file.json")
-    cmd.add_argument("changed_filename", metavar="changed_file.json")
+    cmd.add_argument("changed_filenames", metavar="changed_file.json",
+                     nargs="+",
+                     help=("With more than one changed file, display a "
+                           "matrix of the speedups compared to the "
+                           "baseline"))
+
+    # profile-diff
+    cmd = subparsers.add_parser('profile-diff',
+                                help='Compare profiles of two runs')
+    cmds.append(cmd)
+    cmd.add_argument("-n", "--limit", metavar="N", type=int, default=20,
+                      help="Number of functions displayed per benchmark "
+                           "(default: 20)")
+    cmd.add_argument("baseline", metavar="baseline_dir",
+                      help="--profile directory or pstats file")
+    cmd.add_argument("changed", metavar="changed_dir",
+                      help="--profile directory or pstats file")
+
+    # flamegraph-diff
+    cmd = subparsers.add_parser('flamegraph-diff',
+                                help='Render differential flame graphs of '
+                                     'two runs')
+    cmds.append(cmd)
+    cmd.add_argument("-o", "--output", metavar="DIR", required=True,
+                      help="Directory where SVG files are written")
+    cmd.add_argument("baseline", metavar="baseline_dir",
+                      help="--flamegraph directory or collapsed stack file")
+    cmd.add_argument("changed", metavar="changed_dir",
+                      help="--flamegraph directory or collapsed stack file")
+
+    # history
+    cmd = subparsers.add_parser('history',
+                                help='Local history of benchmark results')
+    history_cmds = cmd.add_subparsers(dest='history_action')
+
+    cmd = history_cmds.add_parser('import',
+                                  help='Import results of benchmark files')
+    cmds.append(cmd)
+    cmd.add_argument("filenames", metavar="FILENAME", nargs="+")
+
+    cmd = history_cmds.add_parser('show',
+                                  help='Display the results of a benchmark')
+    cmds.append(cmd)
+    cmd.add_argument("benchmark")
+    cmd.add_argument("--python-version", metavar="VERSION",
+                     help=("Only display results of Python versions "
+                           "starting with VERSION"))
+    cmd.add_argument("--hostname",
+                     help="Only display results of this host")
+    cmd.add_argument("--performance-version", metavar="VERSION",
+                     help="Only display results of this performance version")
+    cmd.add_argument("--since", metavar="DATE",
+                     help="Only display results since DATE (ex: 2016-09-01)")
+    cmd.add_argument("--until", metavar="DATE",
+                     help="Only display results until DATE (ex: 2016-09)")
+
+    cmd = history_cmds.add_parser('detect',
+                                  help='Detect regressions in the history')
+    cmds.append(cmd)
+    cmd.add_argument("paths", metavar="PATH", nargs="*",
+                     help=("Analyze these JSON files or directories of JSON "
+                           "files instead of the history database"))
+    cmd.add_argument("--window", type=int, default=12,
+                     help=("Number of results compared before and after "
+                           "each result (default: %(default)s)"))
+    cmd.add_argument("--alpha", type=float, default=0.001,
+                     help=("Significance level of the Mann-Whitney U test "
+                           "(default: %(default)s)"))
+    cmd.add_argument("--min-change", metavar="PERCENT", type=float,
+                     default=1.0,
+                     help=("Ignore changes of the median smaller than "
+                           "PERCENT (default: %(default)s%%)"))
+    cmd.add_argument("--since", metavar="DATE",
+                     help="Only analyze results since DATE")
+    cmd.add_argument("--fail-since", metavar="DATE",
+                     help=("Regressions detected thanks to the results "
+                           "at or after DATE are new. By default, "
+                           "regressions detected thanks to the last result "
+                           "are new. Exit with code 1 if a new regression "
+                           "is detected."))
+
+    cmd = history_cmds.add_parser('list',
+                                  help='List benchmarks of the history')
+    cmds.append(cmd)
+
+    for cmd in cmds[-4:]:
+        cmd.add_argument("--database", metavar="FILENAME",
+                         default="pyperformance_history.sqlite",
+                         help=("SQLite database of the history "
+                               "(default: %(default)s)"))
+
+    # convert
+    cmd = subparsers.add_parser('convert',
+                                help='Convert a result file to JSON, to a '
+                                     'packed file or to a result log')
+    cmds.append(cmd)
+    cmd.add_argument("input_filename", metavar="INPUT",
+                     help="JSON file (.json or .json.gz), packed file or "
+                          "result log")
+    cmd.add_argument("output_filename", metavar="OUTPUT",
+                     help="Packed file if OUTPUT ends with .pack, result "
+                          "log if it ends with .jsonl, JSON file otherwise")
+
+    # calibrate-noise
+    cmd = subparsers.add_parser('calibrate-noise',
+                                help='Measure the noise of benchmarks '
+                                     'with A/A runs')
+    cmds.append(cmd)
+    _add_run_options(cmd)
+    cmd.add_argument("--repeat", metavar="N", type=int, default=5,
+                     help=("Number of runs of the benchmarks on the running "
+                           "Python (default: %(default)s)"))
+    cmd.add_argument("-o", "--output", metavar="FILENAME",
+                     default="pyperformance_noise.json",
+                     help=("Noise file where thresholds are written "
+                           "(default: %(default)s)"))
+    cmd.add_argument("filenames", metavar="RESULT_FILE", nargs="*",
+                     help=("Estimate the noise from these results of the "
+                           "same Python instead of running the benchmarks"))
 
     # list
     cmd = subparsers.add_parser('list', help='List benchmarks of the running Python')
@@ -126,17 +368,34 @@ def parse_args():
 
     options = parser.parse_args()
 
-    if options.action == 'run' and options.debug_single_sample:
+    if getattr(options, 'history_action', None) == 'detect':
+        if options.window < 2:
+            parser.error("--window must be at least 2")
+        if not 0 < options.alpha < 1:
+            parser.error("--alpha must be in the range ]0; 1[")
+
+    if (options.action in ('run', 'calibrate-noise')
+            and options.debug_single_sample):
         options.fast = True
 
     if not options.action:
         # an action is mandatory
         parser.print_help()
         sys.exit(1)
+    if options.action == 'history' and not options.history_action:
+        parser.error("history action is missing: import, show, detect "
+                     "or list")
 
     options.python = which(options.python)
     options.python = os.path.realpath(options.python)
 
+    if getattr(options, 'changed_python', None):
+        changed_python = which(options.changed_python)
+        if not changed_python:
+            parser.error("unable to find the Python program %s"
+                         % options.changed_python)
+        options.changed_python = os.path.realpath(changed_python)
+
     return (parser, options)
 
 
@@ -152,6 +411,10 @@ def _main():
 
     from performance.run import cmd_run, cmd_list
     from performance.compare import cmd_compare
+    from performance.profiling import cmd_flamegraph_diff, cmd_profile_diff
+    from performance.history import cmd_history
+    from performance.packed import cmd_convert
+    from performance.noise import cmd_calibrate_noise
     from performance.benchmarks import get_benchmark_groups
 
     if options.action == 'run':
@@ -159,6 +422,17 @@ def _main():
         cmd_run(parser, options, bench_funcs, bench_groups)
     elif options.action == 'compare':
         cmd_compare(options)
+    elif options.action == 'profile-diff':
+        cmd_profile_diff(options)
+    elif options.action == 'flamegraph-diff':
+        cmd_flamegraph_diff(options)
+    elif options.action == 'history':
+        cmd_history(options)
+    elif options.action == 'convert':
+        cmd_convert(options)
+    elif options.action == 'calibrate-noise':
+        bench_funcs, bench_groups = get_benchmark_groups()
+        cmd_calibrate_noise(parser, options, bench_funcs, bench_groups)
     elif options.action in ('list', 'list_groups'):
         bench_funcs, bench_groups = get_benchmark_groups()
         cmd_list(options, bench_funcs, bench_groups)
@@ -1,11 +1,22 @@
 from __future__ import division, with_statement, print_function, absolute_import
 
+import copy
 import csv
 import os.path
+import sys
+try:
+    import multiprocessing
+except ImportError:
+    multiprocessing = None
 
 import perf
 import statistics
 
+from performance import packed, stats
+from performance.allocations import RetainedBlocks, diff_lines
+from performance.importtime import ImportTimes, diff_modules
+from performance.memory import parse_timeline
+
 
 def _FormatPerfDataForTable(base_label, changed_label, results):
     """Prepare performance data for tabular output.
@@ -18,19 +29,28 @@ def _FormatPerfDataForTable(base_label, changed_label, results):
             BenchmarkResult object.
 
     Returns:
-        A list of 6-tuples, where each tuple corresponds to a row in the output
-        table, and each item in the tuples corresponds to a cell in the output
-        table.
+        A list of 5-tuples (6-tuples if the memory usage was tracked), where
+        each tuple corresponds to a row in the output table, and each item in
+        the tuples corresponds to a cell in the output table.
     """
-    table = [("Benchmark", base_label, changed_label, "Change", "Significance")]
+    has_memory = any(result.delta_mem is not None
+                     for (bench_name, result) in results)
+
+    header = ("Benchmark", base_label, changed_label, "Change", "Significance")
+    if has_memory:
+        header += ("Memory change",)
+    table = [header]
 
     for (bench_name, result) in results:
-        table.append((bench_name,
-                      # Limit the precision for conciseness in the table.
-                      str(round(result.avg_base, 2)),
-                      str(round(result.avg_changed, 2)),
-                      result.delta_avg,
-                      result.t_msg.strip()))
+        row = (bench_name,
+               # Limit the precision for conciseness in the table.
+               str(round(result.avg_base, 2)),
+               str(round(result.avg_changed, 2)),
+               result.delta_avg,
+               result.t_msg.strip())
+        if has_memory:
+            row += (result.delta_mem or "-",)
+        table.append(row)
 
     return table
 
@@ -52,7 +72,19 @@ def FormatOutputAsTable(base_label, changed_label, results):
         table = _FormatPerfDataForTable(base_label, changed_label, results)
     else:
         raise TypeError("Unknown result type: %r" % type(results[0][1]))
+    return _FormatTable(table)
+
+
+def _FormatTable(table):
+    """Format rows of strings in an ASCII-art table.
 
+    Args:
+        table: list of rows, the first row is the header. Columns with None
+            values are skipped.
+
+    Returns:
+        A string holding the ASCII-art table.
+    """
     # Columns with None values are skipped
     skipped_cols = set()
     col_widths = [0] * len(table[0])
@@ -95,16 +127,131 @@ class RawData(object):
         mem_usage: list of ints, memory usage in kilobytes.
         inst_output: output from Unladen's --with-instrumentation build. This is
             the empty string if there was no instrumentation output.
+        mem_max_rss: peak memory usage in kilobytes, or None if the memory
+            usage was not tracked.
+        retained_blocks: RetainedBlocks, or None if allocations were not
+            traced.
+        import_times: ImportTimes, or None if import times were not measured.
     """
 
-    def __init__(self, runtimes, mem_usage, inst_output=""):
+    def __init__(self, runtimes, mem_usage, inst_output="", mem_max_rss=None,
+                 retained_blocks=None, import_times=None):
         self.runtimes = runtimes
+        self.retained_blocks = retained_blocks
+        self.import_times = import_times
         self.mem_usage = mem_usage
         self.inst_output = inst_output
+        if mem_max_rss is None and mem_usage:
+            mem_max_rss = max(mem_usage)
+        self.mem_max_rss = mem_max_rss
+
+
+def FormatMemory(size):
+    """Format a memory size in kilobytes."""
+    return "%.1f MB" % (size / 1024.0)
+
+
+# Number of source lines displayed in the retained blocks diff
+RETAINED_DIFF_LINES = 5
+
+# Relative change of the peak size of temporary blocks displayed even if the
+# timing change is not significant
+TEMPORARY_SIZE_CHANGE = 0.05
+
+# Number of modules displayed in the import time diff
+IMPORTTIME_DIFF_MODULES = 5
 
 
 class BaseBenchmarkResult(object):
     always_display = True
+    # Display the result even if the timing change is not significant
+    force_display = False
+    # p-value of the statistical test, None if the change was not tested
+    pvalue = None
+    # Peak memory usage in kilobytes, None if the memory was not tracked
+    mem_base = None
+    mem_changed = None
+    delta_mem = None
+    # Blocks retained per inner loop, None if allocations were not traced
+    retained_base = None
+    retained_changed = None
+    # Import times, None if they were not measured
+    importtime_base = None
+    importtime_changed = None
+
+    def set_memory_usage(self, mem_base, mem_changed):
+        self.mem_base = mem_base
+        self.mem_changed = mem_changed
+        self.delta_mem = QuantityDelta(mem_base, mem_changed)
+
+    def _format_memory(self):
+        if self.delta_mem is None:
+            return ""
+        return ("Peak memory: %s -> %s: %s\n"
+                % (FormatMemory(self.mem_base),
+                   FormatMemory(self.mem_changed),
+                   self.delta_mem))
+
+    def set_retained_blocks(self, retained_base, retained_changed):
+        self.retained_base = retained_base
+        self.retained_changed = retained_changed
+        base_temporary = retained_base.temporary_size
+        changed_temporary = retained_changed.temporary_size
+        if (abs(retained_base.blocks - retained_changed.blocks) >= 0.5
+                or (base_temporary is not None
+                    and changed_temporary is not None
+                    and abs(changed_temporary - base_temporary)
+                    > max(base_temporary, changed_temporary)
+                    * TEMPORARY_SIZE_CHANGE)):
+            # display added or removed allocations even if the timing
+            # change is not significant
+            self.force_display = True
+            self.always_display = True
+
+    def _format_retained_blocks(self):
+        if self.retained_base is None:
+            return ""
+        base = self.retained_base
+        changed = self.retained_changed
+        lines = ["Retained blocks per loop: %.2f blocks (%.0f B) -> "
+                 "%.2f blocks (%.0f B): %+.2f blocks"
+                 % (base.blocks, base.size, changed.blocks, changed.size,
+                    changed.blocks - base.blocks)]
+        for key, base_blocks, changed_blocks in diff_lines(
+                base, changed)[:RETAINED_DIFF_LINES]:
+            lines.append("  %s: %.2f -> %.2f blocks"
+                         % (key, base_blocks, changed_blocks))
+        if (base.temporary_size is not None
+                and changed.temporary_size is not None):
+            lines.append("Temporary blocks peak size: %.0f B -> %.0f B: %s"
+                         % (base.temporary_size, changed.temporary_size,
+                            QuantityDelta(base.temporary_size,
+                                          changed.temporary_size)))
+        return "\n".join(lines) + "\n"
+
+    def set_import_times(self, importtime_base, importtime_changed):
+        self.importtime_base = importtime_base
+        self.importtime_changed = importtime_changed
+
+    def _format_import_times(self):
+        if self.importtime_base is None:
+            return ""
+        base = self.importtime_base
+        changed = self.importtime_changed
+        lines = ["Import time: %.0f us -> %.0f us: %s"
+                 % (base.total, changed.total,
+                    TimeDelta(base.total, changed.total))]
+        for name, base_time, changed_time in diff_modules(
+                base, changed)[:IMPORTTIME_DIFF_MODULES]:
+            lines.append("  %s: %.0f us -> %.0f us (%+.0f us)"
+                         % (name, base_time, changed_time,
+                            changed_time - base_time))
+        return "\n".join(lines) + "\n"
+
+    def _format_extra(self):
+        """Format memory, retained blocks and import times."""
+        return (self._format_memory() + self._format_retained_blocks()
+                + self._format_import_times())
 
     def __str__(self):
         raise NotImplementedError
@@ -122,8 +269,12 @@ class SimpleBenchmarkResult(BaseBenchmarkResult):
         self.time_delta   = time_delta
 
     def __str__(self):
-        return ("%(base_time)f -> %(changed_time)f: %(time_delta)s"
+        text = ("%(base_time)f -> %(changed_time)f: %(time_delta)s"
                 % self.__dict__)
+        extra = self._format_extra()
+        if extra:
+            text += "\n" + extra.rstrip()
+        return text
 
     def as_csv(self):
         # Base, changed
@@ -150,14 +301,22 @@ class BenchmarkResult(BaseBenchmarkResult):
         self.delta_std     = delta_std
         self.always_display = is_significant
 
+    def set_corrected_pvalue(self, pvalue):
+        """Use a p-value corrected for multiple comparisons."""
+        significant = (pvalue < 1 - CONFIDENCE)
+        self.t_msg = ("%s (%s, corrected p=%.4f)\n"
+                      % ("Significant" if significant else "Not significant",
+                         self.stats_detail, pvalue))
+        self.always_display = significant or self.force_display
+
     def __str__(self):
         values = (self.avg_base, self.std_base,
                   self.avg_changed, self.std_changed)
         # FIXME: don't use perf private function
         # FIXME: reuse perf.Benchmark.format()
         text = "%s +- %s -> %s +- %s" % perf._format_timedeltas(values)
-        return ("Median +- Std dev: %s: %s\n%s"
-                 % (text, self.delta_avg, self.t_msg))
+        return ("Median +- Std dev: %s: %s\n%s%s"
+                 % (text, self.delta_avg, self.t_msg, self._format_extra()))
 
     def as_csv(self):
         # Min base, min changed
@@ -186,24 +345,78 @@ def QuantityDelta(old, new):
         return "no change"
 
 
+# Confidence level of the statistical tests
+CONFIDENCE = 0.95
+
+
+def StudentTTest(base_times, changed_times):
+    """Student's two-sample t-test of perf: requires the same number of
+    samples."""
+    if len(base_times) != len(changed_times):
+        raise ValueError("the t-test requires the same number of samples: "
+                         "use --stats=bootstrap or --stats=mannwhitney")
+    significant, t_score = perf.is_significant(base_times, changed_times)
+    pvalue = stats.student_t_pvalue(t_score,
+                                    len(base_times) + len(changed_times) - 2)
+    return (pvalue, "t=%.2f" % t_score)
+
+
+def BootstrapTest(base_times, changed_times):
+    """Bootstrap confidence interval of the ratio of medians: the change is
+    significant if the interval doesn't contain 1."""
+    low, high, pvalue = stats.bootstrap_ratio(base_times, changed_times,
+                                              CONFIDENCE)
+    return (pvalue,
+            "ratio %.0f%% CI: %.4f..%.4f" % (CONFIDENCE * 100, low, high))
+
+
+def MannWhitneyTest(base_times, changed_times):
+    """Two-sided Mann-Whitney U test."""
+    u, pvalue = stats.mann_whitney_u(base_times, changed_times)
+    return (pvalue, "U=%.0f, p=%.4f" % (u, pvalue))
+
+
+# Statistical tests of the --stats option of the compare command: functions
+# taking (base_times, changed_times) and returning a (pvalue, detail) tuple
+STATS_TESTS = {
+    'ttest': StudentTTest,
+    'bootstrap': BootstrapTest,
+    'mannwhitney': MannWhitneyTest,
+}
+
+
+def GetNoiseThreshold(options):
+    """Get the noise threshold of the benchmark options.benchmark_name.
+
+    Returns:
+        The relative change of the median measured by calibrate-noise, or
+        None if the benchmark was not calibrated.
+    """
+    thresholds = getattr(options, 'noise_thresholds', None) or {}
+    return thresholds.get(getattr(options, 'benchmark_name', None))
+
+
 def CompareMultipleRuns(base_times, changed_times, options):
     """Compare multiple control vs experiment runs of the same benchmark.
 
     Args:
         base_times: iterable of float times (control).
         changed_times: iterable of float times (experiment).
-        options: optparse.Values instance.
+        options: optparse.Values instance, options.stats is the name of the
+            statistical test (see STATS_TESTS). The t-test falls back to the
+            Mann-Whitney U test if the number of samples is different. See
+            GetNoiseThreshold() for the threshold of insignificant changes.
 
     Returns:
         A BenchmarkResult object, summarizing the difference between the two
         runs; or a SimpleBenchmarkResult object, if there was only one data
         point per run.
     """
-    assert len(base_times) == len(changed_times)
-    if len(base_times) == 1:
+    if len(base_times) == 1 or len(changed_times) == 1:
         # With only one data point, we can't do any of the interesting stats
         # below.
-        base_time, changed_time = base_times[0], changed_times[0]
+        base_time = statistics.median(base_times)
+        changed_time = statistics.median(changed_times)
         time_delta = TimeDelta(base_time, changed_time)
         return SimpleBenchmarkResult(base_time, changed_time, time_delta)
 
@@ -221,17 +434,55 @@ def CompareMultipleRuns(base_times, changed_times, options):
 
     t_msg = "Not significant\n"
     significant = False
-    # Due to inherent measurement imprecisions, variations of less than 1%
-    # are automatically considered insignificant. This helps present
-    # a clear picture to the user.
-    if abs(avg_base - avg_changed) > (avg_base + avg_changed) * 0.01:
-        significant, t_score = perf.is_significant(base_times, changed_times)
+    pvalue = detail = None
+    threshold = GetNoiseThreshold(options)
+    if threshold is not None:
+        # Variations within the noise floor of the benchmark, measured by
+        # A/A runs, are insignificant
+        noisy = abs(avg_changed - avg_base) <= avg_base * threshold
+    else:
+        # Due to inherent measurement imprecisions, variations of less than
+        # 1% are automatically considered insignificant. This helps present
+        # a clear picture to the user.
+        noisy = abs(avg_base - avg_changed) <= (avg_base + avg_changed) * 0.01
+    if not noisy:
+        test = options.stats
+        if test == 'ttest' and len(base_times) != len(changed_times):
+            # the t-test requires the same number of samples, which is not
+            # the case with --target-precision or --time-budget
+            test = 'mannwhitney'
+        pvalue, detail = STATS_TESTS[test](base_times, changed_times)
+        if test != options.stats:
+            detail += ", t-test not applicable to different sample counts"
+        significant = (pvalue < 1 - CONFIDENCE)
         if significant:
-            t_msg = "Significant (t=%.2f)\n" % t_score
+            t_msg = "Significant (%s)\n" % detail
+
+    result = BenchmarkResult(min_base, min_changed, delta_min, avg_base,
+                             avg_changed, delta_avg, t_msg, std_base,
+                             std_changed, delta_std, significant)
+    result.pvalue = pvalue
+    result.stats_detail = detail
+    return result
+
 
-    return BenchmarkResult(min_base, min_changed, delta_min, avg_base,
-                           avg_changed, delta_avg, t_msg, std_base,
-                           std_changed, delta_std, significant)
+def CorrectPValues(results, method):
+    """Correct the p-values of results for multiple comparisons.
+
+    Only results of the statistical test are corrected: changes smaller than
+    1% (or than the noise threshold) are not tested.
+
+    Args:
+        results: list of BaseBenchmarkResult objects.
+        method: method of stats.adjust_pvalues().
+    """
+    if method == 'none':
+        return
+    tested = [result for result in results if result.pvalue is not None]
+    pvalues = stats.adjust_pvalues([result.pvalue for result in tested],
+                                   method)
+    for result, pvalue in zip(tested, pvalues):
+        result.set_corrected_pvalue(pvalue)
 
 
 # FIXME: remove this function?
@@ -250,42 +501,241 @@ def CompareBenchmarkData(base_data, exp_data, options):
         - SimpleBenchmarkResult: if there was only one data point per run.
         - BenchmarkError: if something went wrong.
     """
-    return CompareMultipleRuns(base_data.runtimes, exp_data.runtimes, options)
+    result = CompareMultipleRuns(base_data.runtimes, exp_data.runtimes,
+                                 options)
+    if base_data.mem_max_rss and exp_data.mem_max_rss:
+        result.set_memory_usage(base_data.mem_max_rss, exp_data.mem_max_rss)
+    if base_data.retained_blocks and exp_data.retained_blocks:
+        result.set_retained_blocks(base_data.retained_blocks,
+                                   exp_data.retained_blocks)
+    if base_data.import_times and exp_data.import_times:
+        result.set_import_times(base_data.import_times, exp_data.import_times)
+    return result
+
+
+def bench_to_raw_data(bench):
+    metadata = bench.get_metadata()
+
+    mem_usage = []
+    timeline = metadata.get('mem_rss_timeline')
+    if timeline:
+        mem_usage = [rss for timestamp, rss in parse_timeline(timeline)]
+
+    mem_max_rss = metadata.get('mem_max_rss')
+    if mem_max_rss:
+        # bytes => kilobytes
+        mem_max_rss = int(mem_max_rss) // 1024
+
+    return RawData(bench.get_samples(), mem_usage, inst_output=None,
+                   mem_max_rss=mem_max_rss,
+                   retained_blocks=RetainedBlocks.from_metadata(metadata),
+                   import_times=ImportTimes.from_metadata(metadata))
 
 
 # FIXME: remove this function
-def bench_to_data(bench1, bench2):
+def bench_to_data(bench1, bench2, options):
     name = bench1.get_name()
     name2 = bench2.get_name()
     if name2 != name:
         raise ValueError("not the same benchmark: %s != %s"
                          % (name, name2))
 
-    class Namespace:
-        pass
-    ns = Namespace()
+    ns = copy.copy(options)
     ns.benchmark_name = name
 
-    bench1 = RawData(bench1.get_samples(), [], inst_output=None)
-    bench2 = RawData(bench2.get_samples(), [], inst_output=None)
+    bench1 = bench_to_raw_data(bench1)
+    bench2 = bench_to_raw_data(bench2)
     result = CompareBenchmarkData(bench1, bench2, ns)
     return (name, result)
 
 
+# Groups of BENCH_GROUPS without geometric mean
+SUMMARY_EXCLUDED_GROUPS = ('2n3', 'deprecated')
+
+
+def load_weights(filename):
+    """Load benchmark weights.
+
+    The file contains one "benchmark weight" line per benchmark. Empty lines
+    and lines starting with "#" are ignored.
+
+    Returns:
+        A dict mapping benchmark names to weights (float).
+    """
+    weights = {}
+    with open(filename) as fp:
+        for lineno, line in enumerate(fp, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                name, weight = line.split()
+                weight = float(weight)
+                if weight < 0:
+                    raise ValueError
+            except ValueError:
+                raise ValueError("%s:%s: invalid line, expected "
+                                 "\"benchmark weight\" with a positive "
+                                 "weight: %r" % (filename, lineno, line))
+            weights[name] = weight
+    return weights
+
+
+def get_weights(options):
+    if not options.weights:
+        return {}
+    try:
+        return load_weights(options.weights)
+    except (IOError, ValueError) as exc:
+        print("ERROR: failed to load weights: %s" % exc)
+        sys.exit(1)
+
+
+def get_noise_thresholds(options):
+    if not options.noise:
+        return {}
+    # noise imports compare
+    from performance.noise import load_noise
+    try:
+        return load_noise(options.noise)
+    except (IOError, ValueError, KeyError) as exc:
+        print("ERROR: failed to load noise thresholds: %s" % exc)
+        sys.exit(1)
+
+
+def group_benchmarks(bench_names):
+    """Get the benchmarks of each group of BENCH_GROUPS.
+
+    Args:
+        bench_names: dict mapping names of benchmarks of a suite to the
+            names of the pyperformance benchmarks which produced them.
+
+    Returns:
+        A dict mapping group names to sorted lists of names of benchmarks of
+        the suite.
+    """
+    # performance.benchmarks imports performance.run which imports this
+    # module
+    from performance.benchmarks import BENCH_GROUPS
+    from performance.run import _ExpandBenchmarkName
+
+    groups = {}
+    for group in BENCH_GROUPS:
+        if group in SUMMARY_EXCLUDED_GROUPS:
+            continue
+        members = set(_ExpandBenchmarkName(group, BENCH_GROUPS))
+        names = sorted(name for name, bm_name in bench_names.items()
+                       if bm_name in members)
+        if names:
+            groups[group] = names
+    return groups
+
+
+def FormatGeometricMean(bootstraps, weights):
+    """Format the geometric mean of the speedups and its confidence
+    interval.
+
+    Args:
+        bootstraps: list of (point, log_ratios) tuples returned by
+            stats.bootstrap_log_ratio().
+        weights: list of weights, one per benchmark.
+    """
+    def format_speedup(ratio):
+        if ratio > 1:
+            return "%.3fx slower" % ratio
+        elif ratio < 1:
+            return "%.3fx faster" % (1 / ratio)
+        else:
+            return "no change"
+
+    geomean, low, high = stats.combine_log_ratios(bootstraps, weights,
+                                                  CONFIDENCE)
+    return ("%s (%.0f%% CI: %s .. %s)"
+            % (format_speedup(geomean), CONFIDENCE * 100,
+               format_speedup(low), format_speedup(high)))
+
+
+def print_suite_summary(samples, bench_names, weights):
+    """Display the geometric mean of the speedups of the suite and of each
+    benchmark group.
+
+    Only groups with at least 2 benchmarks and benchmarks with a non-zero
+    weight are displayed. The bootstrap distribution of each benchmark is
+    computed once, with the benchmark name as seed, and shared by the suite
+    and the groups.
+
+    Args:
+        samples: dict mapping benchmark names to (base_times, changed_times)
+            tuples.
+        bench_names: dict mapping benchmark names to the names of the
+            pyperformance benchmarks.
+        weights: dict mapping benchmark names to weights, the default weight
+            is 1.
+    """
+    bootstraps = {}
+
+    def get_bootstrap(name):
+        if name not in bootstraps:
+            base_times, changed_times = samples[name]
+            bootstraps[name] = stats.bootstrap_log_ratio(base_times,
+                                                         changed_times,
+                                                         seed=name)
+        return bootstraps[name]
+
+    def summary(names):
+        names = [name for name in names if weights.get(name, 1.0)]
+        if len(names) < 2:
+            return None
+        return ("%s benchmarks: %s"
+                % (len(names),
+                   FormatGeometricMean([get_bootstrap(name) for name in names],
+                                       [weights.get(name, 1.0)
+                                        for name in names])))
+
+    text = summary(sorted(samples))
+    if text is None:
+        return
+    title = "Weighted geometric mean" if weights else "Geometric mean"
+    print()
+    print("%s of %s" % (title, text))
+
+    groups = []
+    for group, names in sorted(group_benchmarks(bench_names).items()):
+        text = summary(names)
+        if text is not None:
+            groups.append("- %s, %s" % (group, text))
+    if groups:
+        print()
+        print("%s per group:" % title)
+        for line in groups:
+            print(line)
+
+
 def compare_results(options):
+    changed_filename = options.changed_filenames[0]
     base_label = os.path.basename(options.baseline_filename)
-    changed_label = os.path.basename(options.changed_filename)
-    base_suite = perf.BenchmarkSuite.load(options.baseline_filename)
-    changed_suite = perf.BenchmarkSuite.load(options.changed_filename)
+    changed_label = os.path.basename(changed_filename)
+    base_suite = packed.load_suite(options.baseline_filename)
+    changed_suite = packed.load_suite(changed_filename)
+
+    weights = get_weights(options)
 
     # FIXME: work on suites, not results
     results = []
+    samples = {}
+    bench_names = {}
     common = set(base_suite.get_benchmark_names()) & set(changed_suite.get_benchmark_names())
     for name in sorted(common):
         base_bench = base_suite.get_benchmark(name)
         changed_bench = changed_suite.get_benchmark(name)
-        name, result = bench_to_data(base_bench, changed_bench)
+        samples[name] = (base_bench.get_samples(),
+                         changed_bench.get_samples())
+        # results of old versions don't have the metadata
+        bench_names[name] = base_bench.get_metadata().get(
+            'performance_benchmark', name)
+        name, result = bench_to_data(base_bench, changed_bench, options)
         results.append((name, result))
+    CorrectPValues([result for name, result in results], options.correction)
 
     hidden = []
     if not options.verbose:
@@ -317,6 +767,8 @@ def compare_results(options):
               "use -v to show them:")
         print(", ".join(name for (name, result) in hidden) + ".")
 
+    print_suite_summary(samples, bench_names, weights)
+
     only_base = set(base_suite.get_benchmark_names()) - common
     if only_base:
         print()
@@ -332,7 +784,184 @@ def compare_results(options):
     return results
 
 
+# Marker of the significant changes in the comparison matrix
+SIGNIFICANT_MARKER = "*"
+
+
+def load_samples(filename):
+    """Load the samples of a benchmark suite file.
+
+    Returns:
+        A dict mapping benchmark names to lists of samples.
+    """
+    suite = packed.load_suite(filename)
+    return dict((bench.get_name(), bench.get_samples())
+                for bench in suite.get_benchmarks())
+
+
+def load_all_samples(filenames):
+    """Load the samples of many benchmark suite files.
+
+    Parsing JSON is CPU-bound: with more than two files, files are loaded in
+    parallel in worker processes which only send back the samples, not the
+    whole benchmark suites.
+
+    Returns:
+        A list of dicts mapping benchmark names to lists of samples, one dict
+        per file.
+    """
+    if multiprocessing is None or len(filenames) <= 2:
+        return [load_samples(filename) for filename in filenames]
+
+    pool = multiprocessing.Pool(min(len(filenames),
+                                    multiprocessing.cpu_count()))
+    try:
+        return pool.map(load_samples, filenames)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _compare_column(base, changed, options):
+    """Compare the benchmarks of a column of the comparison matrix.
+
+    P-values are corrected for multiple comparisons per column.
+
+    Returns:
+        A dict mapping names of benchmarks of both suites to
+        BaseBenchmarkResult objects.
+    """
+    results = {}
+    for name in base:
+        if name not in changed:
+            continue
+        ns = copy.copy(options)
+        ns.benchmark_name = name
+        results[name] = CompareMultipleRuns(base[name], changed[name], ns)
+    CorrectPValues(list(results.values()), options.correction)
+    return results
+
+
+def _FormatColumns(table):
+    """Format rows of strings in aligned columns.
+
+    Args:
+        table: list of rows, the first row is the header.
+
+    Returns:
+        A string.
+    """
+    col_widths = [max(len(row[col]) for row in table)
+                  for col in range(len(table[0]))]
+    lines = []
+    for row in table:
+        line = "  ".join(val.ljust(width)
+                         for val, width in zip(row, col_widths))
+        lines.append(line.rstrip())
+    lines.insert(1, "  ".join("-" * width for width in col_widths))
+    return "\n".join(lines)
+
+
+def compare_matrix(options):
+    """Compare N benchmark suite files to the first one.
+
+    Print a matrix: one row per benchmark, one column per file, and a last
+    row with the geometric mean of the speedups.
+
+    Returns:
+        A (labels, suites) tuple: suites is the list of dicts returned by
+        load_all_samples().
+    """
+    filenames = [options.baseline_filename] + options.changed_filenames
+    labels = [os.path.basename(filename) for filename in filenames]
+    weights = get_weights(options)
+    suites = load_all_samples(filenames)
+    base = suites[0]
+
+    # ratios changed/base of the benchmark medians and their weights, one
+    # list per column
+    ratios = [[] for changed in suites[1:]]
+    ratio_weights = [[] for changed in suites[1:]]
+    columns = [_compare_column(base, changed, options)
+               for changed in suites[1:]]
+    shown = []
+    hidden = []
+    for name in sorted(base):
+        base_median = statistics.median(base[name])
+        row = [name, perf._format_timedeltas((base_median,))[0]]
+        display = False
+        for index, changed in enumerate(suites[1:]):
+            if name not in changed:
+                row.append("-")
+                continue
+            text = TimeDelta(base_median, statistics.median(changed[name]))
+            result = columns[index][name]
+            if (isinstance(result, BenchmarkResult)
+                    and result.always_display):
+                text += " " + SIGNIFICANT_MARKER
+            display |= result.always_display
+            row.append(text)
+            ratios[index].append(statistics.median(changed[name])
+                                 / base_median)
+            ratio_weights[index].append(weights.get(name, 1.0))
+        if display or options.verbose:
+            shown.append(row)
+        else:
+            hidden.append(name)
+
+    geomean = ["Geometric mean", "(ref)"]
+    for column, column_weights in zip(ratios, ratio_weights):
+        if any(column_weights):
+            geomean.append(TimeDelta(1.0, stats.geometric_mean(
+                column, column_weights)))
+        else:
+            geomean.append("-")
+
+    table = [["Benchmark"] + labels] + shown + [geomean]
+    if options.output_style == "normal":
+        print(_FormatColumns(table))
+    elif options.output_style == "table":
+        print(_FormatTable(table))
+    else:
+        raise ValueError("Invalid output_style: %r" % options.output_style)
+    print()
+    print("Changes compared to %s, %s: significant change"
+          % (labels[0], SIGNIFICANT_MARKER))
+
+    if hidden:
+        print()
+        print("The following not significant results are hidden, "
+              "use -v to show them:")
+        print(", ".join(hidden) + ".")
+
+    for label, changed in zip(labels[1:], suites[1:]):
+        only_changed = set(changed) - set(base)
+        if only_changed:
+            print()
+            print("Skipped benchmarks only in %s (%s): %s"
+                  % (len(only_changed), label,
+                     ', '.join(sorted(only_changed))))
+
+    return (labels, suites)
+
+
 def cmd_compare(options):
+    options.noise_thresholds = get_noise_thresholds(options)
+
+    if len(options.changed_filenames) > 1:
+        labels, suites = compare_matrix(options)
+
+        if options.csv:
+            with open(options.csv, "w") as f:
+                writer = csv.writer(f)
+                writer.writerow(['Benchmark'] + labels)
+                for name in sorted(suites[0]):
+                    writer.writerow([name] +
+                                    ["%f" % min(suite[name])
+                                     if name in suite else ""
+                                     for suite in suites])
+        return
+
     results = compare_results(options)
 
     if options.csv:
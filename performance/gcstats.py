@@ -0,0 +1,54 @@
+"""Statistics of the garbage collector (--gc-stats).
+
+Metadata, for each generation N:
+
+* gc_genN_collections: number of collections
+* gc_genN_pause_total, gc_genN_pause_max: total and maximum pause in seconds
+* gc_genN_collected: number of collected objects
+
+gc_time_ratio is the ratio of the time spent in the garbage collector to the
+time spent in the benchmark function. Statistics are the sum of all worker
+processes and only count collections while the benchmark function runs.
+"""
+
+from __future__ import division, with_statement, print_function, absolute_import
+
+import json
+
+
+def merge_gc_stats(filenames):
+    """Merge GC statistics written by worker processes into metadata.
+
+    Args:
+        filenames: JSON files written by the --gc-stats option of the
+            instrument script.
+
+    Returns:
+        Metadata as a dict.
+    """
+    generations = {}
+    bench_time = 0.0
+    for filename in filenames:
+        with open(filename) as fp:
+            data = json.load(fp)
+        bench_time += data['bench_time']
+        for generation, stats in data['generations'].items():
+            total = generations.setdefault(int(generation), {
+                'collections': 0, 'pause_total': 0.0, 'pause_max': 0.0,
+                'collected': 0})
+            total['collections'] += stats['collections']
+            total['pause_total'] += stats['pause_total']
+            total['pause_max'] = max(total['pause_max'], stats['pause_max'])
+            total['collected'] += stats['collected']
+
+    metadata = {}
+    for generation, stats in generations.items():
+        prefix = 'gc_gen%s_' % generation
+        metadata[prefix + 'collections'] = str(stats['collections'])
+        metadata[prefix + 'pause_total'] = '%.6f' % stats['pause_total']
+        metadata[prefix + 'pause_max'] = '%.6f' % stats['pause_max']
+        metadata[prefix + 'collected'] = str(stats['collected'])
+    if bench_time:
+        pause = sum(stats['pause_total'] for stats in generations.values())
+        metadata['gc_time_ratio'] = '%.4f' % (pause / bench_time)
+    return metadata
@@ -0,0 +1,443 @@
+"""Local history of benchmark results in a SQLite database.
+
+``history import`` stores the results of perf JSON files: one row per
+benchmark per file with its samples, indexed by benchmark name, interpreter,
+performance version, hostname and date, so time series are queried without
+parsing JSON files again.
+"""
+
+from __future__ import division, with_statement, print_function, absolute_import
+
+import array
+import hashlib
+import os.path
+import sqlite3
+import sys
+import time
+
+import perf
+import statistics
+
+from performance import packed, resultlog, stats
+from performance.compare import TimeDelta, _FormatColumns
+
+
+# Version of the database schema, stored in PRAGMA user_version
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    benchmark TEXT NOT NULL,
+    date TEXT NOT NULL,
+    hostname TEXT NOT NULL,
+    python_version TEXT NOT NULL,
+    python_executable TEXT NOT NULL,
+    performance_version TEXT NOT NULL,
+    median REAL NOT NULL,
+    stdev REAL,
+    nsample INTEGER NOT NULL,
+    samples BLOB NOT NULL,
+    digest TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    UNIQUE (benchmark, digest)
+);
+CREATE INDEX IF NOT EXISTS results_benchmark ON results (benchmark, date);
+CREATE INDEX IF NOT EXISTS results_python ON results (python_version);
+CREATE INDEX IF NOT EXISTS results_performance
+    ON results (performance_version);
+CREATE INDEX IF NOT EXISTS results_hostname ON results (hostname);
+CREATE INDEX IF NOT EXISTS results_date ON results (date);
+"""
+
+_COLUMNS = ('benchmark', 'date', 'hostname', 'python_version',
+            'python_executable', 'performance_version', 'median', 'stdev',
+            'nsample', 'samples', 'digest', 'filename')
+
+
+def pack_samples(samples):
+    """Pack samples into bytes: array of float64 in the native byte order."""
+    samples = array.array('d', samples)
+    if hasattr(samples, 'tobytes'):
+        return samples.tobytes()
+    else:
+        # Python 2
+        return samples.tostring()
+
+
+def unpack_samples(data):
+    samples = array.array('d')
+    if hasattr(samples, 'frombytes'):
+        samples.frombytes(bytes(data))
+    else:
+        # Python 2
+        samples.fromstring(str(data))
+    return samples.tolist()
+
+
+def normalize_date(date):
+    """Normalize an ISO 8601 date to "YYYY-MM-DD HH:MM:SS" so that dates
+    are sorted as strings."""
+    return date.replace('T', ' ')[:19]
+
+
+def get_date(bench):
+    """Get the date of the earliest run of a benchmark.
+
+    The date is per-run metadata: it is only common metadata if all runs
+    have the same date.
+
+    Returns:
+        The normalized date, or None if no run has a date.
+    """
+    dates = [run.get_metadata().get('date') for run in bench.get_runs()]
+    dates = [normalize_date(date) for date in dates if date]
+    if not dates:
+        return None
+    return min(dates)
+
+
+class HistoryEntry(object):
+    """Result of a benchmark stored in the history."""
+
+    def __init__(self, benchmark, date, hostname, python_version,
+                 python_executable, performance_version, median, stdev,
+                 nsample, samples, digest, filename):
+        self.benchmark = benchmark
+        self.date = date
+        self.hostname = hostname
+        self.python_version = python_version
+        self.python_executable = python_executable
+        self.performance_version = performance_version
+        self.median = median
+        # None if there is a single sample
+        self.stdev = stdev
+        self.nsample = nsample
+        self._samples = samples
+        self.digest = digest
+        self.filename = filename
+
+    def get_samples(self):
+        return unpack_samples(self._samples)
+
+
+class ResultHistory(object):
+    """History of benchmark results stored in a SQLite database."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version > SCHEMA_VERSION:
+            raise ValueError("%s: unsupported schema version %s, "
+                             "upgrade performance"
+                             % (filename, version))
+        with self.connection:
+            self.connection.executescript(_SCHEMA)
+            self.connection.execute('PRAGMA user_version = %d'
+                                    % SCHEMA_VERSION)
+
+    def close(self):
+        self.connection.close()
+
+    def import_file(self, filename):
+        """Import the results of a perf JSON file, a packed file or a result
+        log.
+
+        Results already imported (same benchmark and same samples) are
+        ignored. The date of a result is the date of its earliest run, or
+        the modification time of the file if runs have no date.
+
+        Returns:
+            Number of imported results.
+        """
+        suite = packed.load_suite(filename)
+        default_date = time.strftime('%Y-%m-%d %H:%M:%S',
+                                     time.localtime(os.path.getmtime(filename)))
+        filename = os.path.abspath(filename)
+
+        rows = []
+        for bench in suite.get_benchmarks():
+            samples = bench.get_samples()
+            if not samples:
+                continue
+            metadata = bench.get_metadata()
+            stdev = statistics.stdev(samples) if len(samples) > 1 else None
+            data = pack_samples(samples)
+            rows.append((bench.get_name(),
+                         get_date(bench) or default_date,
+                         metadata.get('hostname', ''),
+                         metadata.get('python_version', ''),
+                         metadata.get('python_executable', ''),
+                         metadata.get('performance_version', ''),
+                         statistics.median(samples),
+                         stdev,
+                         len(samples),
+                         sqlite3.Binary(data),
+                         hashlib.sha1(data).hexdigest(),
+                         filename))
+
+        with self.connection:
+            cursor = self.connection.executemany(
+                'INSERT OR IGNORE INTO results (%s) VALUES (%s)'
+                % (', '.join(_COLUMNS), ', '.join('?' * len(_COLUMNS))),
+                rows)
+        return cursor.rowcount
+
+    def get_benchmark_names(self):
+        cursor = self.connection.execute(
+            'SELECT DISTINCT benchmark FROM results ORDER BY benchmark')
+        return [row[0] for row in cursor]
+
+    def get_series(self, benchmark, python_version=None, hostname=None,
+                   performance_version=None, since=None, until=None,
+                   python_executable=None):
+        """Get the results of a benchmark sorted by date.
+
+        Args:
+            benchmark: benchmark name.
+            python_version: if set, only get results of Python versions
+                starting with this string.
+            hostname, performance_version, python_executable: if set, only
+                get results with this value.
+            since, until: if set, only get results with a date in the range
+                [since; until], dates are compared as strings.
+
+        Returns:
+            List of HistoryEntry objects.
+        """
+        conditions = ['benchmark = ?']
+        params = [benchmark]
+        if python_version:
+            conditions.append('substr(python_version, 1, ?) = ?')
+            params.extend((len(python_version), python_version))
+        if hostname:
+            conditions.append('hostname = ?')
+            params.append(hostname)
+        if performance_version:
+            conditions.append('performance_version = ?')
+            params.append(performance_version)
+        if python_executable is not None:
+            conditions.append('python_executable = ?')
+            params.append(python_executable)
+        if since:
+            conditions.append('date >= ?')
+            params.append(normalize_date(since))
+        if until:
+            # "~" is greater than digits: "2016-09" includes the whole month
+            conditions.append('date <= ?')
+            params.append(normalize_date(until) + '~')
+
+        cursor = self.connection.execute(
+            'SELECT %s FROM results WHERE %s ORDER BY date, id'
+            % (', '.join(_COLUMNS), ' AND '.join(conditions)),
+            params)
+        return [HistoryEntry(*row) for row in cursor]
+
+    def get_series_keys(self):
+        """Get the (benchmark, hostname, python_executable) tuples of the
+        time series of the history."""
+        cursor = self.connection.execute(
+            'SELECT DISTINCT benchmark, hostname, python_executable '
+            'FROM results ORDER BY benchmark, hostname, python_executable')
+        return cursor.fetchall()
+
+
+def load_paths(paths):
+    """Load result files into a temporary history in memory.
+
+    Args:
+        paths: list of result files or directories containing JSON files,
+            packed files and result logs (searched recursively).
+    """
+    history = ResultHistory(':memory:')
+    for path in paths:
+        if os.path.isdir(path):
+            filenames = []
+            for dirpath, dirnames, names in os.walk(path):
+                filenames.extend(os.path.join(dirpath, name)
+                                 for name in names
+                                 if name.endswith(('.json',
+                                                   packed.PACKED_SUFFIX,
+                                                   resultlog.LOG_SUFFIX)))
+        else:
+            filenames = [path]
+        for filename in sorted(filenames):
+            history.import_file(filename)
+    return history
+
+
+class Change(object):
+    """Change of the median of a time series.
+
+    Attributes:
+        benchmark, hostname, python_executable: the time series.
+        entry: first HistoryEntry after the change.
+        ratio: median after the change / median before the change.
+        pvalue: p-value of the Mann-Whitney U test.
+        new: True if the change was detected thanks to the newest results
+            (see find_changes()).
+    """
+
+    def __init__(self, benchmark, hostname, python_executable, entry, ratio,
+                 pvalue, new):
+        self.benchmark = benchmark
+        self.hostname = hostname
+        self.python_executable = python_executable
+        self.entry = entry
+        self.ratio = ratio
+        self.pvalue = pvalue
+        self.new = new
+
+    def is_regression(self):
+        return self.ratio > 1
+
+
+def _window_changes(entries, window, alpha, min_change):
+    medians = [entry.median for entry in entries]
+    return stats.window_changes(medians, window=window,
+                                min_size=max(window // 2, 2),
+                                alpha=alpha, min_change=min_change)
+
+
+def find_changes(history, window, alpha, min_change, since=None,
+                 new_since=None):
+    """Detect changes in the time series of the median of each benchmark.
+
+    There is one time series per benchmark, hostname and Python executable.
+    See stats.window_changes() for the parameters; windows must contain at
+    least window // 2 results.
+
+    A change is only detected once window // 2 results were run after it,
+    so a change is new if it is detected thanks to the newest results: it is
+    not detected in the series without them.
+
+    Args:
+        since: if set, only analyze results since this date.
+        new_since: if set, the newest results are the results at or after
+            this date. Otherwise, the newest result is the last result of
+            the series.
+
+    Returns:
+        List of Change objects.
+    """
+    if new_since:
+        new_since = normalize_date(new_since)
+
+    changes = []
+    for benchmark, hostname, executable in history.get_series_keys():
+        entries = history.get_series(benchmark, hostname=hostname,
+                                     python_executable=executable,
+                                     since=since)
+        found = _window_changes(entries, window, alpha, min_change)
+        if not found:
+            continue
+
+        if new_since:
+            old_entries = [entry for entry in entries
+                           if entry.date < new_since]
+        else:
+            old_entries = entries[:-1]
+        # the location of a change can move a little bit with new results
+        old = _window_changes(old_entries, window, alpha, min_change)
+        for index, ratio, pvalue in found:
+            new = not any(abs(old_index - index) <= window // 2
+                          and (old_ratio > 1) == (ratio > 1)
+                          for old_index, old_ratio, old_pvalue in old)
+            changes.append(Change(benchmark, hostname, executable,
+                                  entries[index], ratio, pvalue, new))
+    return changes
+
+
+def display_changes(title, changes):
+    print("%s:" % title)
+    print()
+    for change in changes:
+        entry = change.entry
+        print("- %s (host %s, %s): %s (%+.1f%%, p=%.4f) since %s%s"
+              % (change.benchmark, change.hostname or "-",
+                 change.python_executable or "-",
+                 TimeDelta(1.0, change.ratio), (change.ratio - 1) * 100,
+                 change.pvalue, entry.date,
+                 " [new]" if change.new else ""))
+        print("  first result: Python %s, %s"
+              % (entry.python_version or "-", entry.filename))
+    print()
+
+
+def cmd_detect(history, options):
+    changes = find_changes(history, options.window, options.alpha,
+                           options.min_change / 100.0,
+                           since=options.since,
+                           new_since=options.fail_since)
+    regressions = [change for change in changes if change.is_regression()]
+    improvements = [change for change in changes
+                    if not change.is_regression()]
+    if regressions:
+        display_changes("Regressions", regressions)
+    if improvements:
+        display_changes("Improvements", improvements)
+    if not changes:
+        print("No change detected")
+
+    new = [change for change in regressions if change.new]
+    if new:
+        print("ERROR: %s new regressions" % len(new))
+        sys.exit(1)
+
+
+def display_series(entries):
+    table = [("Date", "Python", "Hostname", "Median +- Std dev",
+              "Change")]
+    previous = None
+    for entry in entries:
+        if entry.stdev is not None:
+            text = ("%s +- %s"
+                    % perf._format_timedeltas((entry.median, entry.stdev)))
+        else:
+            text = perf._format_timedeltas((entry.median,))[0]
+        if previous is not None:
+            change = TimeDelta(previous.median, entry.median)
+        else:
+            change = "-"
+        table.append((entry.date, entry.python_version or "-",
+                      entry.hostname or "-", text, change))
+        previous = entry
+    print(_FormatColumns(table))
+
+
+def cmd_history(options):
+    if options.history_action == 'detect' and options.paths:
+        history = load_paths(options.paths)
+    else:
+        history = ResultHistory(options.database)
+    try:
+        if options.history_action == 'import':
+            total = 0
+            for filename in options.filenames:
+                count = history.import_file(filename)
+                print("%s: %s new results" % (filename, count))
+                total += count
+            print("Imported %s results into %s" % (total, options.database))
+        elif options.history_action == 'show':
+            entries = history.get_series(
+                options.benchmark,
+                python_version=options.python_version,
+                hostname=options.hostname,
+                performance_version=options.performance_version,
+                since=options.since, until=options.until)
+            if not entries:
+                print("ERROR: no result of the benchmark %s"
+                      % options.benchmark)
+                sys.exit(1)
+            display_series(entries)
+        elif options.history_action == 'detect':
+            cmd_detect(history, options)
+        elif options.history_action == 'list':
+            for name in history.get_benchmark_names():
+                print(name)
+        else:
+            raise ValueError("unknown history action: %r"
+                             % options.history_action)
+    finally:
+        history.close()
@@ -0,0 +1,144 @@
+"""Import time breakdown of startup benchmarks using -X importtime.
+
+-X importtime requires Python 3.7 or newer: older versions ignore the option
+and no metadata is stored.
+
+Metadata:
+
+* importtime_total: sum of the self import time of all modules, in
+  microseconds
+* importtime_modules: self and cumulative import time in microseconds of the
+  TOP_MODULES modules with the largest self import time,
+  "module self cumulative" separated by semicolons
+"""
+
+from __future__ import division, with_statement, print_function, absolute_import
+
+import subprocess
+
+from performance.stats import median
+
+
+# Number of runs of the command with -X importtime: median of the runs
+IMPORTTIME_RUNS = 5
+
+# Number of modules stored in the importtime_modules metadata
+TOP_MODULES = 50
+
+_PREFIX = 'import time:'
+
+
+def parse_importtime(text):
+    """Parse the output of -X importtime.
+
+    Returns:
+        A dict mapping module names to (self, cumulative) tuples, times in
+        microseconds.
+    """
+    modules = {}
+    for line in text.splitlines():
+        if not line.startswith(_PREFIX):
+            continue
+        parts = line[len(_PREFIX):].split('|')
+        if len(parts) != 3:
+            continue
+        try:
+            self_time = int(parts[0])
+            cumulative = int(parts[1])
+        except ValueError:
+            # header: "self [us] | cumulative | imported package"
+            continue
+        modules[parts[2].strip()] = (self_time, cumulative)
+    return modules
+
+
+def run_importtime(command, env, runs=IMPORTTIME_RUNS):
+    """Run a Python command with -X importtime.
+
+    Args:
+        command: the command as a list; "-X importtime" is added after the
+            first item (the Python program).
+        env: environment variables.
+
+    Returns:
+        A dict mapping module names to (self, cumulative) tuples: median of
+        the runs in microseconds. The dict is empty if the Python doesn't
+        support -X importtime.
+    """
+    command = command[:1] + ['-X', 'importtime'] + command[1:]
+    results = []
+    for run in range(runs):
+        proc = subprocess.Popen(command,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                env=env,
+                                universal_newlines=True)
+        stderr = proc.communicate()[1]
+        if proc.returncode:
+            raise RuntimeError("%s failed: %s" % (' '.join(command), stderr))
+        results.append(parse_importtime(stderr))
+
+    modules = {}
+    for name in set().union(*results):
+        times = [result[name] for result in results if name in result]
+        modules[name] = (median([item[0] for item in times]),
+                         median([item[1] for item in times]))
+    return modules
+
+
+def importtime_to_metadata(modules):
+    if not modules:
+        return {}
+    top = sorted(modules.items(), key=lambda item: (-item[1][0], item[0]))
+    total = sum(item[0] for item in modules.values())
+    return {
+        'importtime_total': '%.0f' % total,
+        'importtime_modules': '; '.join('%s %.0f %.0f' % (name, self_time,
+                                                          cumulative)
+                                        for name, (self_time, cumulative)
+                                        in top[:TOP_MODULES]),
+    }
+
+
+class ImportTimes(object):
+    """Import times parsed from benchmark metadata."""
+
+    def __init__(self, total, modules):
+        self.total = total
+        # module name => (self, cumulative) in microseconds
+        self.modules = modules
+
+    @classmethod
+    def from_metadata(cls, metadata):
+        """Parse metadata, return None if import times were not measured."""
+        if 'importtime_total' not in metadata:
+            return None
+        modules = {}
+        for item in metadata.get('importtime_modules', '').split(';'):
+            item = item.strip()
+            if not item:
+                continue
+            name, self_time, cumulative = item.rsplit(' ', 2)
+            modules[name] = (float(self_time), float(cumulative))
+        return cls(float(metadata['importtime_total']), modules)
+
+
+def diff_modules(base, changed):
+    """Compare the self import time of modules.
+
+    A module missing in a run counts as 0 (module not imported), unless only
+    the top modules of this run were stored.
+
+    Returns:
+        A list of (module, base_self, changed_self) tuples sorted by
+        decreasing absolute change.
+    """
+    diff = []
+    for name in set(base.modules) | set(changed.modules):
+        if any(name not in times.modules and len(times.modules) >= TOP_MODULES
+               for times in (base, changed)):
+            continue
+        diff.append((name, base.modules.get(name, (0, 0))[0],
+                     changed.modules.get(name, (0, 0))[0]))
+    diff.sort(key=lambda item: (-abs(item[2] - item[1]), item[0]))
+    return diff
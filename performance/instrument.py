@@ -0,0 +1,369 @@
+"""Run a benchmark script with instrumentation.
+
+Usage: python instrument.py [options] bm_script.py [script args]
+
+The sample function passed to TextRunner.bench_sample_func() is wrapped to
+enable instruments (ex: cProfile) only while the function runs, not during the
+perf calibration and bookkeeping code. A function passed to
+TextRunner.bench_func() is first converted to a sample function running the
+same timing loop as perf, so instruments are enabled once per sample, outside
+the timed region, not once per loop. The script is expected to run a single
+perf worker process (--worker).
+Timings of a run instrumented with a profiler or tracemalloc are meaningless
+and are ignored; the GC statistics (--gc-stats) have a low overhead and are
+collected in measured worker processes.
+
+This script is run by its path in the virtual environment and so must only
+depend on the standard library and perf.
+"""
+
+from __future__ import division, with_statement, print_function, absolute_import
+
+import argparse
+import json
+import os.path
+import runpy
+import sys
+import threading
+
+
+class Profiler(object):
+    """Deterministic profiler: cProfile, written as a pstats file."""
+
+    def __init__(self, filename):
+        import cProfile
+
+        self.filename = filename
+        self.profiler = cProfile.Profile()
+
+    def enter(self):
+        self.profiler.enable()
+
+    def exit(self, loops):
+        self.profiler.disable()
+
+    def save(self):
+        self.profiler.dump_stats(self.filename)
+
+
+def format_frame(frame):
+    code = frame.f_code
+    return '%s (%s:%s)' % (code.co_name, os.path.basename(code.co_filename),
+                           code.co_firstlineno)
+
+
+def collapse_stack(frame):
+    """Format the stack of a frame as a line of a collapsed stack file:
+    function names from the root to the leaf separated by semicolons.
+
+    Frames of the instrumentation wrapper and its callers (perf, runpy), and
+    of the sample function created by make_sample_func(), are omitted.
+    """
+    stack = []
+    while frame is not None:
+        if frame.f_code is _WRAPPER_CODE:
+            break
+        if frame.f_code is not _SAMPLE_CODE:
+            stack.append(format_frame(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return ';'.join(stack)
+
+
+class StackSampler(object):
+    """Statistical profiler sampling Python stacks of all threads.
+
+    A thread reads the frames of all other threads using
+    sys._current_frames() at a fixed interval, while the benchmark function
+    runs. Samples are written as a collapsed stack file: one line per
+    distinct stack, "func1;func2;func3 count".
+    """
+
+    def __init__(self, filename, interval):
+        self.filename = filename
+        self.interval = interval
+        # collapsed stack => number of samples
+        self.counts = {}
+        self.enabled = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        ident = threading.current_thread().ident
+        while not self._stop.wait(self.interval):
+            if not self.enabled:
+                continue
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == ident:
+                    continue
+                stack = collapse_stack(frame)
+                if stack:
+                    self.counts[stack] = self.counts.get(stack, 0) + 1
+
+    def enter(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+        self.enabled = True
+
+    def exit(self, loops):
+        self.enabled = False
+
+    def save(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+        with open(self.filename, 'w') as fp:
+            for stack, count in sorted(self.counts.items()):
+                print('%s %s' % (stack, count), file=fp)
+
+
+class AllocationTracer(object):
+    """Trace memory blocks retained by the benchmark function with
+    tracemalloc.
+
+    Traces are cleared when the function is called, so the snapshot taken
+    when it returns only contains memory blocks allocated by the function
+    and not released yet: blocks allocated and released during the call are
+    not in the snapshot. The retained blocks of each call are divided by the
+    number of loops of the call, and the result is the average of all calls.
+    The peak is the maximum size of the traced memory while the function ran.
+
+    Temporary blocks, allocated and released during the call, are measured
+    by the size of the traced memory: clearing the traces also resets its
+    peak, and the peak minus the size still traced when the function returns
+    is the peak size of the temporary blocks. Temporary blocks are released
+    at each loop, so this size is not divided by the number of loops: it is
+    the average of all calls.
+
+    The result is written as JSON: {"traces": [[filename, lineno, blocks,
+    size], ...], "peak": size, "temporary": size}: blocks and sizes in bytes
+    per loop.
+    """
+
+    def __init__(self, filename):
+        import tracemalloc
+
+        self.tracemalloc = tracemalloc
+        self.filename = filename
+        # (filename, lineno) => [blocks, size], sum of the values per loop
+        # of all calls
+        self.traces = {}
+        self.calls = 0
+        self.peak = 0
+        # sum of the peak sizes of temporary blocks of all calls
+        self.temporary = 0
+
+    def enter(self):
+        if not self.tracemalloc.is_tracing():
+            self.tracemalloc.start()
+        self.tracemalloc.clear_traces()
+
+    def exit(self, loops):
+        tracemalloc = self.tracemalloc
+        size, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        self.peak = max(self.peak, peak)
+        self.temporary += peak - size
+
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__)])
+        for stat in snapshot.statistics('lineno'):
+            frame = stat.traceback[0]
+            key = (frame.filename, frame.lineno)
+            entry = self.traces.setdefault(key, [0.0, 0.0])
+            entry[0] += stat.count / loops
+            entry[1] += stat.size / loops
+        self.calls += 1
+
+    def save(self):
+        calls = max(self.calls, 1)
+        traces = [[filename, lineno, blocks / calls, size / calls]
+                  for (filename, lineno), (blocks, size)
+                  in sorted(self.traces.items())]
+        with open(self.filename, 'w') as fp:
+            json.dump({'traces': traces, 'peak': self.peak,
+                       'temporary': self.temporary / calls}, fp)
+
+
+class GcStats(object):
+    """Collect statistics of the garbage collector using gc.callbacks.
+
+    Only collections which complete while the benchmark function runs are
+    counted. The result is written as JSON: {"generations": {generation:
+    {"collections": int, "pause_total": float, "pause_max": float,
+    "collected": int}}, "bench_time": float}, times in seconds.
+    """
+
+    def __init__(self, filename):
+        import gc
+        import time
+
+        self.perf_counter = time.perf_counter
+        self.filename = filename
+        self.enabled = False
+        # generation => stats dict
+        self.generations = {}
+        # time spent in the benchmark function in seconds
+        self.bench_time = 0.0
+        self._start = None
+        self._gc_start = None
+        gc.callbacks.append(self._callback)
+
+    def _callback(self, phase, info):
+        if phase == 'start':
+            self._gc_start = self.perf_counter()
+            return
+        if self._gc_start is None:
+            return
+        pause = self.perf_counter() - self._gc_start
+        self._gc_start = None
+        if not self.enabled:
+            return
+
+        stats = self.generations.get(info['generation'])
+        if stats is None:
+            stats = {'collections': 0, 'pause_total': 0.0,
+                     'pause_max': 0.0, 'collected': 0}
+            self.generations[info['generation']] = stats
+        stats['collections'] += 1
+        stats['pause_total'] += pause
+        stats['pause_max'] = max(stats['pause_max'], pause)
+        stats['collected'] += info['collected']
+
+    def enter(self):
+        self.enabled = True
+        self._start = self.perf_counter()
+
+    def exit(self, loops):
+        self.bench_time += self.perf_counter() - self._start
+        self.enabled = False
+
+    def save(self):
+        with open(self.filename, 'w') as fp:
+            json.dump({'generations': self.generations,
+                       'bench_time': self.bench_time}, fp)
+
+
+def wrap_func(func, instruments, sample_func=False):
+    """Wrap func to enable instruments while it runs.
+
+    Args:
+        func: the benchmark function.
+        instruments: list of instruments.
+        sample_func: if true, func is a sample function of
+            TextRunner.bench_sample_func() running its first argument loops,
+            otherwise func runs a single loop.
+    """
+    def wrapper(*args):
+        loops = args[0] if sample_func else 1
+        for instrument in instruments:
+            instrument.enter()
+        try:
+            return func(*args)
+        finally:
+            for instrument in reversed(instruments):
+                instrument.exit(loops)
+
+    return wrapper
+
+
+def make_sample_func(func, timer):
+    """Convert a function of TextRunner.bench_func() to a sample function of
+    TextRunner.bench_sample_func(): run func(*args) loops times and return
+    the elapsed time, like perf."""
+    def sample_func(loops, *args):
+        range_it = range(loops)
+        t0 = timer()
+        for _ in range_it:
+            func(*args)
+        return timer() - t0
+
+    return sample_func
+
+
+# Code of the wrapper function created by wrap_func()
+_WRAPPER_CODE = wrap_func(None, ()).__code__
+# Code of the sample function created by make_sample_func()
+_SAMPLE_CODE = make_sample_func(None, None).__code__
+
+
+def patch_text_runner(instruments):
+    import perf
+    import perf.text_runner
+
+    cls = perf.text_runner.TextRunner
+    bench_sample_func = cls.bench_sample_func
+
+    def patched_bench_sample_func(self, sample_func, *args, **kw):
+        sample_func = wrap_func(sample_func, instruments, sample_func=True)
+        return bench_sample_func(self, sample_func, *args, **kw)
+
+    def patched_bench_func(self, func, *args, **kw):
+        # Wrapping func itself would run the instruments inside the timed
+        # loop, once per loop
+        sample_func = make_sample_func(func, perf.perf_counter)
+        return patched_bench_sample_func(self, sample_func, *args, **kw)
+
+    cls.bench_sample_func = patched_bench_sample_func
+    cls.bench_func = patched_bench_func
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Run a benchmark script with instrumentation")
+    parser.add_argument("--profile", metavar="FILENAME",
+                        help="Profile the benchmark with cProfile and write "
+                             "statistics into FILENAME (pstats format)")
+    parser.add_argument("--sample-stacks", metavar="FILENAME",
+                        help="Sample Python stacks of all threads and write "
+                             "them into FILENAME (collapsed stack format)")
+    parser.add_argument("--sample-interval", metavar="SECONDS", type=float,
+                        default=0.01,
+                        help="Interval between two stack samples "
+                             "(default: 0.01 second)")
+    parser.add_argument("--trace-alloc", metavar="FILENAME",
+                        help="Trace memory blocks retained by the benchmark "
+                             "with tracemalloc and write them into FILENAME "
+                             "(JSON)")
+    parser.add_argument("--gc-stats", metavar="FILENAME",
+                        help="Collect statistics of the garbage collector "
+                             "and write them into FILENAME (JSON)")
+    parser.add_argument("script")
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    return parser.parse_args()
+
+
+def main():
+    options = parse_args()
+
+    script = os.path.abspath(options.script)
+    sys.argv = [script] + options.args
+    # the benchmark script imports modules of its directory. Replace the
+    # directory of this script: its modules must not shadow stdlib modules.
+    sys.path[0] = os.path.dirname(script)
+
+    instruments = []
+    if options.profile:
+        instruments.append(Profiler(options.profile))
+    if options.sample_stacks:
+        instruments.append(StackSampler(options.sample_stacks,
+                                        options.sample_interval))
+    if options.trace_alloc:
+        instruments.append(AllocationTracer(options.trace_alloc))
+    if options.gc_stats:
+        instruments.append(GcStats(options.gc_stats))
+
+    patch_text_runner(instruments)
+    try:
+        runpy.run_path(script, run_name='__main__')
+    finally:
+        for instrument in instruments:
+            instrument.save()
+
+
+if __name__ == "__main__":
+    main()
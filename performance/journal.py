@@ -0,0 +1,80 @@
+from __future__ import division, with_statement, print_function, absolute_import
+
+import logging
+import os
+import shutil
+
+import perf
+
+
+class Journal(object):
+    """On-disk journal of the benchmarks completed by a run.
+
+    The journal is a directory containing one perf JSON file per completed
+    benchmark. A benchmark is written as soon as it completes, so an
+    interrupted run can be resumed: completed benchmarks are loaded back from
+    the journal instead of being run again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    @staticmethod
+    def get_path(filename):
+        """Get the path of the journal of the result file filename."""
+        return filename + '.journal'
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _get_filename(self, name):
+        return os.path.join(self.path, '%s.json' % name)
+
+    def record(self, name, result):
+        """Write the result (perf.Benchmark or perf.BenchmarkSuite) of the
+        benchmark called name."""
+        if isinstance(result, perf.BenchmarkSuite):
+            suite = result
+        else:
+            suite = perf.BenchmarkSuite()
+            suite.add_benchmark(result)
+
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+
+        # Write into a temporary file and then rename it, to never leave
+        # an incomplete file in the journal
+        filename = self._get_filename(name)
+        tmp_filename = filename + '.tmp'
+        for path in (tmp_filename, filename):
+            if os.path.exists(path):
+                os.unlink(path)
+        suite.dump(tmp_filename)
+        os.rename(tmp_filename, filename)
+
+    def load(self):
+        """Load completed benchmarks.
+
+        Returns:
+            A dict mapping benchmark names to perf.BenchmarkSuite objects.
+        """
+        completed = {}
+        if not self.exists():
+            return completed
+
+        for entry in sorted(os.listdir(self.path)):
+            name, ext = os.path.splitext(entry)
+            if ext != '.json':
+                # ignore temporary files of interrupted writes
+                continue
+            filename = os.path.join(self.path, entry)
+            try:
+                completed[name] = perf.BenchmarkSuite.load(filename)
+            except Exception as exc:
+                logging.warning("Ignore invalid journal file %s: %s",
+                                filename, exc)
+        return completed
+
+    def remove(self):
+        if self.exists():
+            shutil.rmtree(self.path)
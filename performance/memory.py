@@ -0,0 +1,176 @@
+from __future__ import division, with_statement, print_function, absolute_import
+
+import os
+import threading
+import time
+
+
+# Maximum number of points of the RSS timeline stored in metadata
+TIMELINE_SIZE = 200
+
+
+def is_supported():
+    return os.path.exists('/proc/self/status')
+
+
+def _read_ppid(pid):
+    with open('/proc/%s/stat' % pid) as fp:
+        line = fp.read()
+    # the command name can contain spaces and parenthesis
+    fields = line.rpartition(')')[2].split()
+    return int(fields[1])
+
+
+def get_children(root_pid):
+    """Get the list of the descendant processes of the process root_pid."""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        pid = int(entry)
+        try:
+            ppid = _read_ppid(pid)
+        except (IOError, OSError, IndexError, ValueError):
+            # the process completed in the meanwhile
+            continue
+        children.setdefault(ppid, []).append(pid)
+
+    descendants = []
+    pending = [root_pid]
+    while pending:
+        pid = pending.pop()
+        for child in children.get(pid, ()):
+            descendants.append(child)
+            pending.append(child)
+    return descendants
+
+
+def read_memory_usage(pid):
+    """Read the memory usage of a process from /proc/pid/status.
+
+    Returns:
+        (rss, peak_rss) tuple, sizes in kilobytes (VmRSS and VmHWM).
+    """
+    rss = peak_rss = 0
+    with open('/proc/%s/status' % pid) as fp:
+        for line in fp:
+            if line.startswith('VmRSS:'):
+                rss = int(line.split()[1])
+            elif line.startswith('VmHWM:'):
+                peak_rss = int(line.split()[1])
+    return (rss, peak_rss)
+
+
+def downsample(timeline, size=TIMELINE_SIZE):
+    """Reduce a timeline to at most size points, keeping maximum values."""
+    if len(timeline) <= size:
+        return timeline
+    result = []
+    step = len(timeline) / size
+    for index in range(size):
+        bucket = timeline[int(index * step):int((index + 1) * step)]
+        if bucket:
+            result.append(max(bucket, key=lambda point: point[1]))
+    return result
+
+
+def parse_timeline(text):
+    """Parse the mem_rss_timeline metadata.
+
+    Returns:
+        A list of (timestamp, rss) tuples: timestamp in seconds since the
+        benchmark start (float), rss in kilobytes (int).
+    """
+    timeline = []
+    for point in text.split():
+        timestamp, rss = point.split(':')
+        timeline.append((float(timestamp), int(rss)))
+    return timeline
+
+
+def format_timeline(timeline):
+    """Format a list of (timestamp, rss) tuples as mem_rss_timeline
+    metadata."""
+    return ' '.join('%.2f:%s' % point for point in timeline)
+
+
+def merge_metadata(metadata_list):
+    """Merge the memory metadata of benchmarks run one after the other.
+
+    The peak RSS is the maximum of the peaks. The timelines are concatenated:
+    each timeline starts where the previous one ends.
+    """
+    metadata = {}
+    peaks = [int(item['mem_max_rss']) for item in metadata_list
+             if 'mem_max_rss' in item]
+    if peaks:
+        metadata['mem_max_rss'] = str(max(peaks))
+
+    timeline = []
+    for item in metadata_list:
+        text = item.get('mem_rss_timeline')
+        if not text:
+            continue
+        offset = timeline[-1][0] if timeline else 0.0
+        timeline.extend((offset + timestamp, rss)
+                        for timestamp, rss in parse_timeline(text))
+    if timeline:
+        metadata['mem_rss_timeline'] = format_timeline(downsample(timeline))
+    return metadata
+
+
+class MemoryTracker(object):
+    """Sample the memory usage of the worker processes of a benchmark.
+
+    A thread reads VmRSS and VmHWM of all processes spawned by the benchmark
+    process (perf worker processes) at a fixed interval. The benchmark
+    process itself only spawns workers and is ignored.
+    """
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        # pid => peak RSS in kilobytes
+        self.peaks = {}
+        # list of (timestamp, rss) tuples where rss is the maximum RSS
+        # of worker processes in kilobytes
+        self.timeline = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self, root_pid, start_time):
+        max_rss = 0
+        for pid in get_children(root_pid):
+            try:
+                rss, peak_rss = read_memory_usage(pid)
+            except (IOError, OSError, ValueError):
+                continue
+            max_rss = max(max_rss, rss)
+            self.peaks[pid] = max(self.peaks.get(pid, 0), peak_rss, rss)
+        if max_rss:
+            self.timeline.append((time.time() - start_time, max_rss))
+
+    def _run(self, root_pid):
+        start_time = time.time()
+        while True:
+            self._sample(root_pid, start_time)
+            if self._stop.wait(self.interval):
+                break
+
+    def start(self, proc):
+        self._thread = threading.Thread(target=self._run, args=(proc.pid,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, usage=None):
+        self._stop.set()
+        self._thread.join()
+
+    def get_metadata(self):
+        metadata = {}
+        if self.peaks:
+            # in bytes
+            metadata['mem_max_rss'] = str(max(self.peaks.values()) * 1024)
+        if self.timeline:
+            metadata['mem_rss_timeline'] = format_timeline(
+                downsample(self.timeline))
+        return metadata
@@ -0,0 +1,195 @@
+"""Noise floor of benchmarks, calibrated from A/A runs.
+
+``calibrate-noise`` runs the benchmarks several times on the same
+interpreter. Since the code doesn't change, the differences between the
+medians of the runs are noise. The threshold of a benchmark is the relative
+change of the median that two A/A runs don't exceed with 95% probability:
+``compare --noise`` doesn't test smaller changes, instead of the fixed 1%.
+"""
+
+from __future__ import division, with_statement, print_function, absolute_import
+
+import json
+import logging
+import math
+import os.path
+import platform
+import sys
+import time
+
+import statistics
+
+import performance
+from performance import packed
+from performance.compare import _FormatColumns
+
+
+NOISE_VERSION = 1
+
+# Minimum number of A/A runs to estimate the noise of a benchmark
+MIN_RUNS = 3
+
+# 97.5% quantile of the standard normal distribution: two-sided 95% interval
+_Z95 = 1.959963984540054
+
+
+def estimate_threshold(medians):
+    """Estimate the noise threshold of a benchmark from its A/A runs.
+
+    The logarithm of the median of a run is assumed to be normally
+    distributed with a standard deviation s, estimated from the runs. The
+    logarithm of the ratio of the medians of two runs then has a standard
+    deviation of sqrt(2) * s.
+
+    Args:
+        medians: medians of the runs, at least 2.
+
+    Returns:
+        Relative change of the median (ex: 0.003 for 0.3%) not exceeded by
+        two A/A runs with a probability of 95%.
+    """
+    if len(medians) < 2:
+        raise ValueError("at least 2 runs are required")
+    stdev = statistics.stdev([math.log(median) for median in medians])
+    return math.expm1(_Z95 * math.sqrt(2) * stdev)
+
+
+def estimate_noise(medians):
+    """Estimate the noise thresholds of benchmarks.
+
+    Args:
+        medians: dict mapping benchmark names to the list of the medians of
+            their A/A runs.
+
+    Returns:
+        A dict mapping benchmark names to thresholds; benchmarks with less
+        than MIN_RUNS runs are ignored.
+    """
+    return dict((name, estimate_threshold(values))
+                for name, values in medians.items()
+                if len(values) >= MIN_RUNS)
+
+
+def load_noise(filename):
+    """Load the thresholds of a noise file written by calibrate-noise.
+
+    Returns:
+        A dict mapping benchmark names to thresholds.
+    """
+    with open(filename) as fp:
+        data = json.load(fp)
+    if data.get('version') != NOISE_VERSION:
+        raise ValueError("%s: unsupported noise file version %r"
+                         % (filename, data.get('version')))
+    return dict((name, bench['threshold'])
+                for name, bench in data['benchmarks'].items())
+
+
+def dump_noise(filename, thresholds, medians):
+    benchmarks = {}
+    for name, threshold in thresholds.items():
+        benchmarks[name] = {'threshold': threshold,
+                            'runs': len(medians[name]),
+                            'median': statistics.median(medians[name])}
+    data = {'version': NOISE_VERSION,
+            'performance_version': performance.__version__,
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'hostname': platform.node(),
+            'benchmarks': benchmarks}
+    with open(filename, 'w') as fp:
+        json.dump(data, fp, sort_keys=True, indent=4)
+
+
+def load_medians(filenames):
+    """Get the medians of the benchmarks of A/A result files.
+
+    Returns:
+        A dict mapping benchmark names to the list of their medians, one per
+        file.
+    """
+    medians = {}
+    for filename in filenames:
+        suite = packed.load_suite(filename)
+        for bench in suite.get_benchmarks():
+            samples = bench.get_samples()
+            if samples:
+                medians.setdefault(bench.get_name(), []).append(
+                    statistics.median(samples))
+    return medians
+
+
+def run_aa(parser, options, bench_funcs, bench_groups):
+    """Run the benchmarks options.repeat times on the running Python.
+
+    Returns:
+        A dict mapping benchmark names to the list of their medians, one per
+        run.
+    """
+    from performance.run import (FilterBenchmarks, ParseBenchmarksOption,
+                                 prepare_run_options, run_benchmarks)
+
+    for name in ('time_budget', 'worker_server', 'profile', 'flamegraph',
+                 'trace_alloc'):
+        if getattr(options, name):
+            parser.error("--%s is not supported by calibrate-noise"
+                         % name.replace('_', '-'))
+    base_cmd_prefix = prepare_run_options(parser, options)
+
+    logging.basicConfig(level=logging.INFO)
+
+    should_run = ParseBenchmarksOption(options.benchmarks, bench_groups,
+                                       options.fast or options.debug_single_sample)
+    should_run = FilterBenchmarks(should_run, bench_funcs, base_cmd_prefix)
+    to_run = sorted(should_run)
+
+    if options.global_timeout:
+        options.deadline = time.time() + options.global_timeout
+
+    # Run all benchmarks before running them again, so the drift of the
+    # system between two runs of a benchmark is part of the noise
+    medians = {}
+    for index in range(options.repeat):
+        print("A/A run %s/%s" % (index + 1, options.repeat))
+        print()
+        suites, errors = run_benchmarks(bench_funcs, to_run,
+                                        base_cmd_prefix, options)
+        for name, error in errors:
+            print("WARNING: %s failed: %s" % (name, error))
+        for bench in suites[0].get_benchmarks():
+            medians.setdefault(bench.get_name(), []).append(
+                statistics.median(bench.get_samples()))
+    return medians
+
+
+def display_noise(thresholds, medians):
+    table = [("Benchmark", "Runs", "Threshold")]
+    for name in sorted(thresholds):
+        table.append((name, str(len(medians[name])),
+                      "%.2f%%" % (thresholds[name] * 100)))
+    print(_FormatColumns(table))
+
+
+def cmd_calibrate_noise(parser, options, bench_funcs, bench_groups):
+    if options.filenames:
+        medians = load_medians(options.filenames)
+    else:
+        if options.repeat < MIN_RUNS:
+            parser.error("--repeat must be at least %s" % MIN_RUNS)
+        medians = run_aa(parser, options, bench_funcs, bench_groups)
+
+    thresholds = estimate_noise(medians)
+    ignored = sorted(set(medians) - set(thresholds))
+    if ignored:
+        print("Ignored benchmarks with less than %s runs: %s"
+              % (MIN_RUNS, ', '.join(ignored)))
+    if not thresholds:
+        print("ERROR: no benchmark has at least %s runs" % MIN_RUNS)
+        sys.exit(1)
+
+    print()
+    display_noise(thresholds, medians)
+    dump_noise(options.output, thresholds, medians)
+    print()
+    print("Noise thresholds written into %s" % os.path.abspath(options.output))
+    print("Use them with: pyperformance compare --noise %s ..."
+          % options.output)
@@ -0,0 +1,372 @@
+"""Packed result files: compact binary container of perf results.
+
+A packed file stores the same data as a perf JSON file:
+
+* a 32-byte header: magic, format version, number of floats, size of the
+  skeleton;
+* all lists of floats (samples, warmups) as one array of little-endian
+  float64;
+* the skeleton: the JSON data where lists of floats are replaced with
+  {"$f": [offset, count]} references into the array and metadata dicts are
+  replaced with {"$m": index} references into a table of unique metadata.
+
+The loader maps the file with mmap and reads floats through a memoryview
+without parsing them. Converting JSON to packed and back is lossless: the
+JSON data is the same.
+"""
+
+from __future__ import division, with_statement, print_function, absolute_import
+
+import array
+import gzip
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+
+import perf
+
+from performance import resultlog
+
+
+# Suffix of packed result files: "run -o" and "run --append" write packed
+# files if the filename ends with this suffix
+PACKED_SUFFIX = '.pack'
+
+MAGIC = b'PYPERFPK'
+FORMAT_VERSION = 1
+
+# magic, format version, reserved, number of floats, skeleton size
+_HEADER = struct.Struct('<8sIIQQ')
+
+_FLOATS = '$f'
+_METADATA = '$m'
+# dict with keys starting with "$" in the JSON data
+_ESCAPED = '$d'
+
+# Fast path: memoryview of the mapped floats without copy
+_CAST_FLOATS = (hasattr(memoryview, 'cast') and sys.byteorder == 'little')
+
+
+def is_packed(filename):
+    """Check if filename is a packed result file."""
+    with open(filename, 'rb') as fp:
+        return fp.read(len(MAGIC)) == MAGIC
+
+
+def is_packed_filename(filename):
+    """Check if the result file filename uses the packed format: the format
+    of the existing file, or its suffix if it doesn't exist."""
+    if os.path.exists(filename):
+        return is_packed(filename)
+    return filename.endswith(PACKED_SUFFIX)
+
+
+def _is_scalar(value):
+    return value is None or isinstance(value, (bool, int, float,
+                                                type(u''), str))
+
+
+def encode(data):
+    """Split JSON data into a skeleton, a metadata table and floats.
+
+    Returns:
+        (skeleton, metadata, floats) tuple: floats is an array of float64.
+    """
+    floats = array.array('d')
+    metadata = []
+    metadata_index = {}
+
+    def walk(obj):
+        if isinstance(obj, dict):
+            if obj and all(_is_scalar(value) for value in obj.values()):
+                key = json.dumps(obj, sort_keys=True)
+                index = metadata_index.get(key)
+                if index is None:
+                    index = metadata_index[key] = len(metadata)
+                    metadata.append(obj)
+                return {_METADATA: index}
+            result = dict((key, walk(value)) for key, value in obj.items())
+            if any(key.startswith('$') for key in obj):
+                result = {_ESCAPED: result}
+            return result
+        if isinstance(obj, list):
+            if obj and all(type(value) is float for value in obj):
+                offset = len(floats)
+                floats.extend(obj)
+                return {_FLOATS: [offset, len(obj)]}
+            return [walk(value) for value in obj]
+        return obj
+
+    skeleton = walk(data)
+    return (skeleton, metadata, floats)
+
+
+def decode(skeleton, metadata, floats):
+    """Rebuild JSON data from the output of encode().
+
+    floats can be an array or a memoryview of float64.
+    """
+    def walk(obj):
+        if isinstance(obj, dict):
+            if _FLOATS in obj:
+                offset, count = obj[_FLOATS]
+                return floats[offset:offset + count].tolist()
+            if _METADATA in obj:
+                return dict(metadata[obj[_METADATA]])
+            if _ESCAPED in obj:
+                obj = obj[_ESCAPED]
+            return dict((key, walk(value)) for key, value in obj.items())
+        if isinstance(obj, list):
+            return [walk(value) for value in obj]
+        return obj
+
+    return walk(skeleton)
+
+
+def dump(data, filename):
+    """Write JSON data into a packed file."""
+    skeleton, metadata, floats = encode(data)
+    skeleton = json.dumps({'metadata': metadata, 'data': skeleton},
+                          separators=(',', ':'), sort_keys=True)
+    skeleton = skeleton.encode('utf-8')
+    if sys.byteorder != 'little':
+        floats.byteswap()
+
+    with open(filename, 'wb') as fp:
+        fp.write(_HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(floats),
+                              len(skeleton)))
+        floats.tofile(fp)
+        fp.write(skeleton)
+
+
+def load(filename):
+    """Load the JSON data of a packed file."""
+    with open(filename, 'rb') as fp:
+        header = fp.read(_HEADER.size)
+        if len(header) != _HEADER.size or header[:len(MAGIC)] != MAGIC:
+            raise ValueError("%s is not a packed result file" % filename)
+        magic, version, reserved, nfloat, skeleton_size = _HEADER.unpack(header)
+        if version != FORMAT_VERSION:
+            raise ValueError("%s: unsupported packed format version %s"
+                             % (filename, version))
+        mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+    start = _HEADER.size
+    end = start + nfloat * 8
+    try:
+        skeleton = mapped[end:end + skeleton_size]
+        skeleton = json.loads(skeleton.decode('utf-8'))
+        if _CAST_FLOATS:
+            with memoryview(mapped) as view:
+                with view[start:end].cast('d') as floats:
+                    return decode(skeleton['data'], skeleton['metadata'],
+                                  floats)
+        else:
+            floats = array.array('d')
+            data = mapped[start:end]
+            if hasattr(floats, 'frombytes'):
+                floats.frombytes(data)
+            else:
+                # Python 2
+                floats.fromstring(data)
+            if sys.byteorder != 'little':
+                floats.byteswap()
+            return decode(skeleton['data'], skeleton['metadata'], floats)
+    finally:
+        mapped.close()
+
+
+def load_json(filename):
+    if filename.endswith('.gz'):
+        fp = gzip.open(filename, 'rb')
+    else:
+        fp = open(filename, 'rb')
+    with fp:
+        return json.loads(fp.read().decode('utf-8'))
+
+
+def dump_json(data, filename):
+    text = json.dumps(data, sort_keys=True).encode('utf-8')
+    if filename.endswith('.gz'):
+        fp = gzip.open(filename, 'wb')
+    else:
+        fp = open(filename, 'wb')
+    with fp:
+        fp.write(text)
+
+
+class PackedRun(object):
+    """Read-only run of a packed benchmark: subset of the perf.Run API."""
+
+    def __init__(self, data, common_metadata):
+        self._data = data
+        self._common_metadata = common_metadata
+
+    def get_metadata(self):
+        metadata = dict(self._common_metadata)
+        metadata.update(self._data.get('metadata', {}))
+        return metadata
+
+
+class PackedBenchmark(object):
+    """Read-only benchmark of a packed file or of a result log.
+
+    Implement the subset of the perf.Benchmark API used by the compare and
+    history commands.
+    """
+
+    def __init__(self, data):
+        self._data = data
+
+    def get_metadata(self):
+        """Get the metadata common to all runs."""
+        metadata = dict(self._data.get('common_metadata', {}))
+        runs = [run.get('metadata', {}) for run in self._data['runs']]
+        if runs:
+            for key, value in runs[0].items():
+                if all(run.get(key) == value for run in runs[1:]):
+                    metadata.setdefault(key, value)
+        return metadata
+
+    def get_name(self):
+        return self.get_metadata().get('name')
+
+    def get_runs(self):
+        common_metadata = self._data.get('common_metadata', {})
+        return [PackedRun(run, common_metadata) for run in self._data['runs']]
+
+    def get_samples(self):
+        samples = []
+        for run in self._data['runs']:
+            samples.extend(run.get('samples', ()))
+        return samples
+
+    def get_nrun(self):
+        return len(self._data['runs'])
+
+
+class PackedSuite(object):
+    """Read-only benchmark suite of a packed file or of a result log.
+
+    Implement the subset of the perf.BenchmarkSuite API used by the compare
+    and history commands.
+    """
+
+    def __init__(self, data, filename=None):
+        self.filename = filename
+        self._benchmarks = [PackedBenchmark(bench)
+                            for bench in data['benchmarks']]
+
+    def get_benchmarks(self):
+        return list(self._benchmarks)
+
+    def get_benchmark_names(self):
+        return [bench.get_name() for bench in self._benchmarks]
+
+    def get_benchmark(self, name):
+        for bench in self._benchmarks:
+            if bench.get_name() == name:
+                return bench
+        raise KeyError("there is no benchmark called %r" % name)
+
+
+def load_data(filename):
+    """Load the JSON data of a JSON file, a packed file or a result log."""
+    if is_packed(filename):
+        return load(filename)
+    if resultlog.is_log(filename):
+        return resultlog.load(filename)
+    return load_json(filename)
+
+
+def dump_data(data, filename):
+    """Write JSON data into a packed file if filename ends with
+    PACKED_SUFFIX, into a result log if it ends with resultlog.LOG_SUFFIX,
+    or into a JSON file otherwise."""
+    if filename.endswith(PACKED_SUFFIX):
+        dump(data, filename)
+    elif filename.endswith(resultlog.LOG_SUFFIX):
+        resultlog.dump(data, filename)
+    else:
+        dump_json(data, filename)
+
+
+def load_suite(filename):
+    """Load a perf JSON file, a packed file or a result log.
+
+    Returns:
+        perf.BenchmarkSuite for a JSON file, PackedSuite otherwise.
+    """
+    if is_packed(filename):
+        return PackedSuite(load(filename), filename)
+    if resultlog.is_log(filename):
+        return PackedSuite(resultlog.load(filename), filename)
+    return perf.BenchmarkSuite.load(filename)
+
+
+def _replace(tmp_filename, filename):
+    if os.path.exists(filename):
+        os.unlink(filename)
+    os.rename(tmp_filename, filename)
+
+
+def dump_suite(suite, filename):
+    """Write a perf.BenchmarkSuite into a file: see dump_data() for the
+    format."""
+    if filename.endswith((PACKED_SUFFIX, resultlog.LOG_SUFFIX)):
+        dump_data(resultlog.suite_to_data(suite), filename)
+    else:
+        suite.dump(filename)
+
+
+def add_runs(filename, suite):
+    """Add the runs of a perf.BenchmarkSuite to a result file, or create it.
+
+    The runs are appended to a result log as a new record. Packed files stay
+    packed: the file is converted to JSON, perf merges the runs, and the
+    result is packed again.
+    """
+    if resultlog.is_log_filename(filename):
+        resultlog.append(filename, resultlog.suite_to_data(suite))
+        return
+    if not is_packed_filename(filename):
+        perf.add_runs(filename, suite)
+        return
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        json_filename = os.path.join(tmpdir, 'suite.json')
+        if os.path.exists(filename):
+            dump_json(load(filename), json_filename)
+        perf.add_runs(json_filename, suite)
+        tmp_filename = filename + '.tmp'
+        dump(load_json(json_filename), tmp_filename)
+        _replace(tmp_filename, filename)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def cmd_convert(options):
+    """Convert a result file between the JSON, packed and result log
+    formats."""
+    if os.path.exists(options.output_filename):
+        print("ERROR: the output file %s already exists!"
+              % options.output_filename)
+        sys.exit(1)
+
+    data = load_data(options.input_filename)
+    dump_data(data, options.output_filename)
+    if options.output_filename.endswith(PACKED_SUFFIX):
+        kind = "packed file"
+    elif options.output_filename.endswith(resultlog.LOG_SUFFIX):
+        kind = "result log"
+    else:
+        kind = "JSON file"
+    print("%s converted to %s %s (%.1f kB -> %.1f kB)"
+          % (options.input_filename, kind, options.output_filename,
+             os.path.getsize(options.input_filename) / 1024.0,
+             os.path.getsize(options.output_filename) / 1024.0))
@@ -0,0 +1,306 @@
+from __future__ import division, with_statement, print_function, absolute_import
+
+import glob
+import os.path
+import pstats
+import sys
+import zlib
+from xml.sax.saxutils import escape
+
+
+PSTATS_SUFFIX = '.pstats'
+
+
+def list_files(path, suffix):
+    """Get the files of a profile directory with the suffix, or a single
+    file if path is a file.
+
+    Returns:
+        A dict mapping benchmark names to filenames.
+    """
+    if os.path.isdir(path):
+        filenames = glob.glob(os.path.join(path, '*' + suffix))
+    else:
+        filenames = [path]
+    files = {}
+    for filename in filenames:
+        name = os.path.basename(filename)
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+        files[name] = filename
+    return files
+
+
+def list_profiles(path):
+    """Get profiles of a --profile directory, or of a single pstats file."""
+    return list_files(path, PSTATS_SUFFIX)
+
+
+def format_function(func):
+    filename, lineno, name = func
+    if filename == '~':
+        # built-in function
+        return name
+    return '%s:%s(%s)' % (os.path.basename(filename), lineno, name)
+
+
+def load_cumulative_times(filename):
+    """Load the cumulative time of each function of a pstats file, as a
+    fraction of the total profiled time.
+
+    Returns:
+        A dict mapping function names to ratios.
+    """
+    stats = pstats.Stats(filename).stats
+    total = sum(entry[2] for entry in stats.values())
+    if not total:
+        return {}
+    times = {}
+    for func, entry in stats.items():
+        key = format_function(func)
+        times[key] = times.get(key, 0) + entry[3] / total
+    return times
+
+
+def diff_profiles(base_filename, changed_filename):
+    """Compare the cumulative times of two profiles.
+
+    Cumulative times are compared as percents of the total profiled time:
+    the number of loops of two runs can be different.
+
+    Returns:
+        A list of (function, base, changed) tuples sorted by decreasing
+        absolute change, where base and changed are ratios of the total time.
+    """
+    base = load_cumulative_times(base_filename)
+    changed = load_cumulative_times(changed_filename)
+    diff = []
+    for func in set(base) | set(changed):
+        diff.append((func, base.get(func, 0.0), changed.get(func, 0.0)))
+    diff.sort(key=lambda item: (-abs(item[2] - item[1]), item[0]))
+    return diff
+
+
+def display_profile_diff(name, diff, limit):
+    print("### %s ###" % name)
+    print("%8s %8s %8s  %s" % ("Base", "Changed", "Delta", "Function"))
+    for func, base, changed in diff[:limit]:
+        print("%7.1f%% %7.1f%% %+7.1f%%  %s"
+              % (base * 100, changed * 100, (changed - base) * 100, func))
+    print()
+
+
+def match_files(options, suffix):
+    """Match files of the options.baseline and options.changed directories
+    by benchmark name.
+
+    Returns:
+        A list of (name, base_filename, changed_filename) tuples.
+    """
+    base = list_files(options.baseline, suffix)
+    changed = list_files(options.changed, suffix)
+    if len(base) == 1 and len(changed) == 1:
+        # compare two files, whatever their names
+        return [(list(base)[0], list(base.values())[0],
+                 list(changed.values())[0])]
+
+    for name in sorted(set(base) ^ set(changed)):
+        print("Skip %s: missing file in %s"
+              % (name, options.changed if name in base else options.baseline))
+    return [(name, base[name], changed[name])
+            for name in sorted(set(base) & set(changed))]
+
+
+def cmd_profile_diff(options):
+    names = match_files(options, PSTATS_SUFFIX)
+    if not names:
+        print("ERROR: no profile to compare")
+        sys.exit(1)
+
+    print("Cumulative time in percent of the total profiled time")
+    print()
+    for name, base_filename, changed_filename in names:
+        diff = diff_profiles(base_filename, changed_filename)
+        display_profile_diff(name, diff, options.limit)
+
+
+# Flame graphs
+
+COLLAPSED_SUFFIX = '.collapsed'
+
+FLAMEGRAPH_WIDTH = 1200
+FRAME_HEIGHT = 16
+FONT_SIZE = 12
+# Approximative width of a character in pixels
+CHAR_WIDTH = 7
+# Frames narrower than this width in pixels are not drawn
+MIN_FRAME_WIDTH = 0.1
+
+
+def parse_collapsed(lines):
+    """Parse collapsed stacks: "func1;func2;func3 count" lines.
+
+    Returns:
+        A dict mapping stacks (tuples of function names, from the root to the
+        leaf) to numbers of samples.
+    """
+    stacks = {}
+    for line in lines:
+        line = line.rstrip()
+        if not line:
+            continue
+        stack, count = line.rsplit(' ', 1)
+        stack = tuple(stack.split(';'))
+        stacks[stack] = stacks.get(stack, 0) + int(count)
+    return stacks
+
+
+def load_collapsed(filename):
+    with open(filename) as fp:
+        return parse_collapsed(fp)
+
+
+class _Node(object):
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.children = {}
+
+
+def build_tree(stacks):
+    root = _Node('all')
+    for stack, count in stacks.items():
+        root.count += count
+        node = root
+        for name in stack:
+            node = node.children.setdefault(name, _Node(name))
+            node.count += count
+    return root
+
+
+def _hash_color(name):
+    # zlib.crc32() is stable, hash() is randomized
+    value = zlib.crc32(name.encode('utf-8')) & 0xffffffff
+    return 'rgb(%d,%d,%d)' % (205 + value % 50, (value >> 8) % 230,
+                              (value >> 16) % 55)
+
+
+def _delta_color(delta):
+    # delta is a change of the ratio of samples: saturated at 5%
+    intensity = int(255 - min(abs(delta) / 0.05, 1.0) * 200)
+    if delta > 0:
+        return 'rgb(255,%d,%d)' % (intensity, intensity)
+    return 'rgb(%d,%d,255)' % (intensity, intensity)
+
+
+def render_flamegraph(stacks, title, base_stacks=None):
+    """Render stacks as a SVG flame graph.
+
+    Args:
+        stacks: dict mapping stacks to numbers of samples, see
+            parse_collapsed().
+        title: title of the graph.
+        base_stacks: optional; stacks of a reference run. If set, render a
+            differential flame graph: frames are colored in red if their
+            ratio of samples grew compared to base_stacks, and in blue if it
+            decreased.
+
+    Returns:
+        The SVG document as a string.
+    """
+    root = build_tree(stacks)
+    base_root = build_tree(base_stacks) if base_stacks is not None else None
+
+    rects = []
+
+    def layout(node, base_node, depth, x):
+        rects.append((node, base_node, depth, x))
+        for name in sorted(node.children):
+            child = node.children[name]
+            base_child = None
+            if base_node is not None:
+                base_child = base_node.children.get(name)
+            layout(child, base_child, depth + 1, x)
+            x += child.count
+
+    if root.count:
+        layout(root, base_root, 0, 0)
+    max_depth = max([rect[2] for rect in rects] + [0])
+    scale = FLAMEGRAPH_WIDTH / max(root.count, 1)
+    top = FRAME_HEIGHT * 2
+    height = top + (max_depth + 1) * FRAME_HEIGHT + FRAME_HEIGHT
+
+    svg = ['<?xml version="1.0" standalone="no"?>',
+           '<svg version="1.1" width="%s" height="%s" '
+           'xmlns="http://www.w3.org/2000/svg">'
+           % (FLAMEGRAPH_WIDTH, height),
+           '<rect x="0" y="0" width="100%" height="100%" '
+           'fill="rgb(250,250,240)"/>',
+           '<text x="%s" y="%s" font-size="%s" font-family="Verdana" '
+           'text-anchor="middle">%s</text>'
+           % (FLAMEGRAPH_WIDTH // 2, FRAME_HEIGHT, FONT_SIZE + 4,
+              escape(title))]
+
+    for node, base_node, depth, x in rects:
+        width = node.count * scale
+        if width < MIN_FRAME_WIDTH:
+            continue
+        ratio = node.count / root.count
+        info = '%s (%s samples, %.2f%%)' % (node.name, node.count,
+                                             ratio * 100)
+        if base_root is not None:
+            base_ratio = 0.0
+            if base_node is not None and base_root.count:
+                base_ratio = base_node.count / base_root.count
+            color = _delta_color(ratio - base_ratio)
+            info += ', base: %.2f%%' % (base_ratio * 100)
+        else:
+            color = _hash_color(node.name)
+
+        # the root is at the bottom
+        y = top + (max_depth - depth) * FRAME_HEIGHT
+        svg.append('<g><title>%s</title>' % escape(info))
+        svg.append('<rect x="%.1f" y="%s" width="%.1f" height="%s" '
+                   'fill="%s" rx="2" ry="2"/>'
+                   % (x * scale, y, width, FRAME_HEIGHT - 1, color))
+        nchar = int((width - 6) // CHAR_WIDTH)
+        if nchar >= 3:
+            label = node.name
+            if len(label) > nchar:
+                label = label[:nchar - 2] + '..'
+            svg.append('<text x="%.1f" y="%s" font-size="%s" '
+                       'font-family="Verdana">%s</text>'
+                       % (x * scale + 3, y + FRAME_HEIGHT - 4, FONT_SIZE,
+                          escape(label)))
+        svg.append('</g>')
+
+    svg.append('</svg>')
+    return '\n'.join(svg) + '\n'
+
+
+def write_flamegraph(collapsed_filename, svg_filename, title,
+                     base_filename=None):
+    stacks = load_collapsed(collapsed_filename)
+    base_stacks = None
+    if base_filename is not None:
+        base_stacks = load_collapsed(base_filename)
+    svg = render_flamegraph(stacks, title, base_stacks)
+    with open(svg_filename, 'w') as fp:
+        fp.write(svg)
+
+
+def cmd_flamegraph_diff(options):
+    names = match_files(options, COLLAPSED_SUFFIX)
+    if not names:
+        print("ERROR: no collapsed stack file to compare")
+        sys.exit(1)
+
+    if not os.path.isdir(options.output):
+        os.makedirs(options.output)
+    for name, base_filename, changed_filename in names:
+        filename = os.path.join(options.output, name + '.svg')
+        write_flamegraph(changed_filename, filename,
+                         "%s: %s vs %s" % (name, options.changed,
+                                           options.baseline),
+                         base_filename=base_filename)
+        print("Differential flame graph written into %s" % filename)
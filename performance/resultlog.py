@@ -0,0 +1,204 @@
+"""Result logs: append-only result files.
+
+A result log is a text file:
+
+* a header line: {"pyperformance_log": VERSION, "compacted_size": SIZE}
+* one line per record: the JSON data of a perf benchmark suite, usually the
+  results of one run.
+
+Appending a run writes one line at the end of the file, whatever the size of
+the file. Readers merge the runs of all records. The file is compacted into a
+single record when the records appended since the last compaction are larger
+than the compacted record (and than COMPACT_MIN_SIZE), so the cost of the
+compactions is proportional to the size of the appended records.
+"""
+
+from __future__ import division, with_statement, print_function, absolute_import
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+
+# Suffix of result logs: "run -o" and "run --append" write result logs if
+# the filename ends with this suffix
+LOG_SUFFIX = '.jsonl'
+
+LOG_VERSION = 1
+
+_HEADER_PREFIX = b'{"pyperformance_log": '
+
+# Don't compact logs smaller than 1 MiB
+COMPACT_MIN_SIZE = 1024 * 1024
+
+
+def is_log(filename):
+    """Check if filename is a result log."""
+    with open(filename, 'rb') as fp:
+        return fp.read(len(_HEADER_PREFIX)) == _HEADER_PREFIX
+
+
+def is_log_filename(filename):
+    """Check if the result file filename is a result log: the format of the
+    existing file, or its suffix if it doesn't exist."""
+    if os.path.exists(filename):
+        return is_log(filename)
+    return filename.endswith(LOG_SUFFIX)
+
+
+def _format_header(compacted_size):
+    return (_HEADER_PREFIX
+            + ('%d, "compacted_size": %d}\n'
+               % (LOG_VERSION, compacted_size)).encode('ascii'))
+
+
+def _read_header(fp, filename):
+    line = fp.readline()
+    if not line.startswith(_HEADER_PREFIX):
+        raise ValueError("%s is not a result log" % filename)
+    header = json.loads(line.decode('ascii'))
+    if header['pyperformance_log'] != LOG_VERSION:
+        raise ValueError("%s: unsupported result log version %s"
+                         % (filename, header['pyperformance_log']))
+    return (header, len(line))
+
+
+def _format_record(data):
+    return json.dumps(data, sort_keys=True,
+                      separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+def suite_to_data(suite):
+    """Get the JSON data of a perf.BenchmarkSuite."""
+    tmpdir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tmpdir, 'suite.json')
+        suite.dump(filename)
+        with open(filename, 'rb') as fp:
+            return json.loads(fp.read().decode('utf-8'))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def _get_name(bench):
+    name = bench.get('common_metadata', {}).get('name')
+    if name is None:
+        for run in bench['runs']:
+            name = run.get('metadata', {}).get('name')
+            if name is not None:
+                break
+    return name
+
+
+def _merge_benchmark(bench, other):
+    # Metadata which are not common to the two benchmarks are moved to the
+    # metadata of their runs
+    metadata1 = bench.get('common_metadata', {})
+    metadata2 = other.get('common_metadata', {})
+    common = dict((key, value) for key, value in metadata1.items()
+                  if key in metadata2 and metadata2[key] == value)
+    for metadata, runs in ((metadata1, bench['runs']),
+                           (metadata2, other['runs'])):
+        specific = dict((key, value) for key, value in metadata.items()
+                        if key not in common)
+        if not specific:
+            continue
+        for run in runs:
+            run_metadata = dict(specific)
+            run_metadata.update(run.get('metadata', {}))
+            run['metadata'] = run_metadata
+    if common:
+        bench['common_metadata'] = common
+    else:
+        bench.pop('common_metadata', None)
+    bench['runs'].extend(other['runs'])
+
+
+def merge(data, record):
+    """Merge the benchmarks of the JSON data record into data.
+
+    Runs of a benchmark already present in data are appended to its runs,
+    other benchmarks are added.
+    """
+    benchmarks = dict((_get_name(bench), bench)
+                      for bench in data['benchmarks'])
+    for bench in record['benchmarks']:
+        name = _get_name(bench)
+        if name in benchmarks:
+            _merge_benchmark(benchmarks[name], bench)
+        else:
+            data['benchmarks'].append(bench)
+            benchmarks[name] = bench
+
+
+def load(filename):
+    """Load the JSON data of a result log: merge the data of all records.
+
+    Invalid records, like the last record of an interrupted write, are
+    ignored.
+    """
+    data = None
+    with open(filename, 'rb') as fp:
+        _read_header(fp, filename)
+        for lineno, line in enumerate(fp, 2):
+            try:
+                record = json.loads(line.decode('utf-8'))
+            except ValueError as exc:
+                logging.warning("Ignore invalid record at line %s of %s: %s",
+                                lineno, filename, exc)
+                continue
+            if data is None:
+                data = record
+            else:
+                merge(data, record)
+    if data is None:
+        raise ValueError("%s: the result log is empty" % filename)
+    return data
+
+
+def dump(data, filename):
+    """Write JSON data into a compacted result log: a single record."""
+    record = _format_record(data)
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'wb') as fp:
+        fp.write(_format_header(len(record)))
+        fp.write(record)
+    if os.path.exists(filename):
+        os.unlink(filename)
+    os.rename(tmp_filename, filename)
+
+
+def compact(filename):
+    """Merge the records of a result log into a single record."""
+    dump(load(filename), filename)
+
+
+def append(filename, data, compact_min_size=COMPACT_MIN_SIZE):
+    """Append JSON data to a result log as a new record, or create it.
+
+    Returns:
+        True if the result log was compacted.
+    """
+    if not os.path.exists(filename):
+        dump(data, filename)
+        return False
+
+    with open(filename, 'rb') as fp:
+        header, header_size = _read_header(fp, filename)
+        fp.seek(-1, os.SEEK_END)
+        truncated = (fp.read(1) != b'\n')
+    with open(filename, 'ab') as fp:
+        if truncated:
+            # don't merge the record with the partial record of an
+            # interrupted write
+            fp.write(b'\n')
+        fp.write(_format_record(data))
+
+    appended = (os.path.getsize(filename) - header_size
+                - header['compacted_size'])
+    if appended <= max(header['compacted_size'], compact_min_size):
+        return False
+    compact(filename)
+    return True
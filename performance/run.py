@@ -1,10 +1,16 @@
 from __future__ import division, with_statement, print_function, absolute_import
 
+import copy
 import logging
+import os
 import os.path
 import platform
+import shutil
 import subprocess
 import sys
+import tempfile
+import threading
+import time
 try:
     import multiprocessing
 except ImportError:
@@ -13,8 +19,21 @@ except ImportError:
 import perf
 
 import performance
-from performance.venv import interpreter_version, which
+from performance.venv import get_virtualenv_python, interpreter_version, which
 from performance.compare import BaseBenchmarkResult, compare_results
+from performance import allocations, memory, packed, rusage, stats
+from performance.gcstats import merge_gc_stats
+from performance.importtime import importtime_to_metadata, run_importtime
+from performance.warmup import WarmupDetector
+from performance.budget import (DurationHistory, format_duration,
+                                get_default_history_filename, plan_budget)
+from performance.journal import Journal
+from performance.profiling import write_flamegraph
+from performance.watchdog import (Watchdog, new_process_group_kwargs,
+                                  watchdog_env)
+from performance.worker_server import WorkerPool
+from performance.scheduler import (BenchmarkScheduler, get_available_cpus,
+                                   parse_cpu_list, split_cpus)
 
 
 class BenchmarkError(BaseBenchmarkResult):
@@ -27,6 +46,15 @@ class BenchmarkError(BaseBenchmarkResult):
         return self.msg
 
 
+class BenchmarkTimeout(RuntimeError):
+    """Raised when a benchmark is killed by the watchdog."""
+
+
+# Number of lines of stderr of a benchmark killed by the watchdog included
+# in the error message: faulthandler tracebacks of the hung processes
+TIMEOUT_STDERR_LINES = 50
+
+
 ### Utility functions
 
 
@@ -72,7 +100,27 @@ def BuildEnv(env=None, inherit_env=[]):
     return fixed_env
 
 
-def CallAndCaptureOutput(command, env=None, inherit_env=[], hide_stderr=True):
+def _ReadOutput(proc):
+    """Read stdout and stderr of a process until EOF, without waiting for
+    the process completion."""
+    stderr = []
+    thread = None
+    if proc.stderr is not None:
+        thread = threading.Thread(
+            target=lambda: stderr.append(proc.stderr.read()))
+        thread.daemon = True
+        thread.start()
+    stdout = proc.stdout.read()
+    proc.stdout.close()
+    if thread is not None:
+        thread.join()
+        proc.stderr.close()
+        return (stdout, stderr[0])
+    return (stdout, None)
+
+
+def CallAndCaptureOutput(command, env=None, inherit_env=[], hide_stderr=True,
+                         monitors=(), timeout=None):
     """Run the given command, capturing stdout.
 
     Args:
@@ -80,6 +128,13 @@ def CallAndCaptureOutput(command, env=None, inherit_env=[], hide_stderr=True):
         env: optional; environment variables to set.
         inherit_env: optional; iterable of strings, each the name of an
             environment variable to inherit from os.environ.
+        monitors: optional; iterable of objects with start(proc) and
+            stop(usage) methods, called when the process is spawned and when
+            it completes. usage is the resource usage of the process and its
+            children (see performance.rusage), or None if it is not available.
+        timeout: optional; timeout in seconds. The command runs in its own
+            process group with faulthandler enabled: on timeout, the whole
+            process group is killed (see performance.watchdog).
 
     Returns:
         stdout where stdout is the captured stdout as a string.
@@ -87,6 +142,8 @@ def CallAndCaptureOutput(command, env=None, inherit_env=[], hide_stderr=True):
     Raises:
         RuntimeError: if the command failed. The value of the exception will
         be the error message from the command.
+        BenchmarkTimeout: if the command was killed by the watchdog. The
+        message contains the end of stderr, if stderr is hidden.
     """
     if hasattr(subprocess, 'DEVNULL'):
         stderr = subprocess.DEVNULL
@@ -96,12 +153,45 @@ def CallAndCaptureOutput(command, env=None, inherit_env=[], hide_stderr=True):
         kw = {'stderr': subprocess.PIPE}
     else:
         kw = {}
+    env = BuildEnv(env, inherit_env)
+    watchdog = None
+    if timeout is not None:
+        if timeout <= 0:
+            raise BenchmarkTimeout("Benchmark timed out before it started")
+        env = watchdog_env(env)
+        kw.update(new_process_group_kwargs())
+        watchdog = Watchdog(timeout)
+        monitors = [watchdog] + list(monitors)
     proc = subprocess.Popen(LogCall(command),
                                stdout=subprocess.PIPE,
-                               env=BuildEnv(env, inherit_env),
+                               env=env,
                                universal_newlines=True,
                                **kw)
-    stdout, stderr = proc.communicate()
+    started = []
+    usage = None
+    try:
+        for monitor in monitors:
+            monitor.start(proc)
+            started.append(monitor)
+        if rusage.is_supported():
+            stdout, stderr = _ReadOutput(proc)
+            usage = rusage.wait_process(proc)
+        else:
+            stdout, stderr = proc.communicate()
+    except BaseException:
+        if watchdog is not None:
+            # the process group doesn't get Ctrl+C from the terminal
+            watchdog.kill()
+        raise
+    finally:
+        for monitor in started:
+            monitor.stop(usage)
+    if watchdog is not None and watchdog.expired:
+        msg = "Benchmark timed out after %.1f sec" % timeout
+        if hide_stderr and stderr:
+            lines = stderr.splitlines()[-TIMEOUT_STDERR_LINES:]
+            msg += "; end of stderr:\n%s" % '\n'.join(lines)
+        raise BenchmarkTimeout(msg)
     if proc.returncode != 0:
         if hide_stderr:
             sys.stderr.flush()
@@ -111,7 +201,119 @@ def CallAndCaptureOutput(command, env=None, inherit_env=[], hide_stderr=True):
     return stdout
 
 
+# Number of processes spawned by perf.text_runner.TextRunner: keep in sync
+# with the defaults of the perf module
+PERF_PROCESSES = 20
+
+
+def get_nprocess(options):
+    """Get the number of perf worker processes used by a benchmark."""
+    if options.processes:
+        return options.processes
+    elif options.debug_single_sample:
+        return 1
+    elif options.rigorous:
+        return PERF_PROCESSES * 2
+    elif options.fast:
+        return PERF_PROCESSES // 2
+    else:
+        return PERF_PROCESSES
+
+
+def get_timeout(options):
+    """Get the timeout in seconds of the next process of the current
+    benchmark, or None if there is no timeout."""
+    deadline = getattr(options, 'bench_deadline', None)
+    if deadline is None:
+        return None
+    return deadline - time.time()
+
+
+def merge_benchmarks(benchmarks):
+    """Merge runs of a list of perf.Benchmark into the first benchmark."""
+    bench = benchmarks[0]
+    for other in benchmarks[1:]:
+        for run in other.get_runs():
+            bench.add_run(run)
+    return bench
+
+
+def merge_steps(benchmarks):
+    """Merge benchmarks of worker processes run one after the other.
+
+    The resource usage and memory usage metadata differ between the
+    benchmarks and so are not common metadata of the merged benchmark: store
+    the total resource usage and the maximum peak memory usage.
+    """
+    metadata = [bench.get_metadata() for bench in benchmarks]
+    bench = merge_benchmarks(benchmarks)
+    bench.update_metadata(rusage.merge_metadata(metadata))
+    bench.update_metadata(memory.merge_metadata(metadata))
+    return bench
+
+
+def _run_perf_workers(run_script, bench_args, extra_args, nprocess):
+    """Spawn perf worker processes (--worker) ourselves, instead of letting
+    the benchmark script spawn them.
+
+    run_script(argv) runs a worker process and returns an (exitcode, stdout,
+    usage) tuple.
+    """
+    benchmarks = []
+    loops_args = []
+    total_usage = None
+    for process in range(nprocess):
+        argv = bench_args + ['--worker', '--stdout'] + loops_args + extra_args
+        exitcode, stdout, usage = run_script(argv)
+        if exitcode:
+            raise RuntimeError("Benchmark died")
+        bench = perf.Benchmark.loads(stdout)
+        benchmarks.append(bench)
+        if usage is not None:
+            if total_usage is not None:
+                usage = rusage.add_rusage(total_usage, usage)
+            total_usage = usage
+
+        if not loops_args:
+            # The first worker calibrated the number of loops: reuse it
+            loops = bench.get_metadata().get('loops')
+            if loops:
+                loops_args = ['--loops=%s' % loops]
+
+    bench = merge_benchmarks(benchmarks)
+    if total_usage is not None:
+        bench.update_metadata(rusage.rusage_to_metadata(total_usage))
+    return bench
+
+
+# Script running a benchmark with instrumentation: see performance.instrument
+INSTRUMENT_PATH = os.path.join(os.path.dirname(__file__), 'instrument.py')
+
+
+def run_instrumented(python, options, bm_path, extra_args):
+    """Run a single unmeasured perf worker process with instrumentation.
+
+    options.instrument is the list of command line options of the instrument
+    script. The worker computes a single sample using options.loops loops.
+    """
+    args = [INSTRUMENT_PATH] + options.instrument + [bm_path, '--worker',
+                                                      '--samples=1',
+                                                      '--warmups=0']
+    if options.loops:
+        args.append('--loops=%s' % options.loops)
+    else:
+        args.append('--debug-single-sample')
+    if options.affinity:
+        args.append('--affinity=%s' % options.affinity)
+    CallAndCaptureOutput(python + args + extra_args,
+                         hide_stderr=not options.verbose,
+                         timeout=get_timeout(options))
+
+
 def run_perf_script(python, options, bm_path, extra_args=[]):
+    if options.instrument:
+        return run_instrumented(python, options, bm_path, extra_args)
+
     bench_args = [bm_path]
 
     if options.debug_single_sample:
@@ -121,22 +323,185 @@ def run_perf_script(python, options, bm_path, extra_args=[]):
     elif options.fast:
         bench_args.append('--fast')
 
-    if options.verbose:
-        bench_args.append('--verbose')
-
     if options.affinity:
         bench_args.append('--affinity=%s' % options.affinity)
 
-    bench_args.append("--stdout")
-
-    command = python + bench_args + extra_args
-    stdout = CallAndCaptureOutput(command, hide_stderr=not options.verbose)
+    if options.loops:
+        bench_args.append('--loops=%s' % options.loops)
+
+    detector = None
+    if options.auto_warmups:
+        # warmup samples are detected and removed afterwards
+        bench_args.extend(('--warmups=0',
+                           '--samples=%s' % options.auto_warmups))
+        detector = WarmupDetector()
+
+    if (options.worker_pool is not None or options.gc_stats
+       or detector is not None):
+        tmpdir = tempfile.mkdtemp()
+        gc_files = []
+
+        def spawn_worker(argv):
+            if options.gc_stats:
+                filename = os.path.join(tmpdir, 'gc-%s.json' % len(gc_files))
+                gc_files.append(filename)
+                argv = [INSTRUMENT_PATH, '--gc-stats', filename] + argv
+            if options.worker_pool is not None:
+                logging.info("Running `%s` in a worker server",
+                             " ".join(argv))
+                return options.worker_pool.run_script(argv)
+
+            monitors = []
+            if rusage.is_supported():
+                monitors.append(rusage.ResourceUsageMonitor())
+            stdout = CallAndCaptureOutput(python + argv,
+                                          hide_stderr=not options.verbose,
+                                          monitors=monitors,
+                                          timeout=get_timeout(options))
+            usage = monitors[0].usage if monitors else None
+            return (0, stdout, usage)
+
+        def run_script(argv):
+            exitcode, stdout, usage = spawn_worker(argv)
+            if detector is not None and not exitcode:
+                stdout = detector.process_stdout(stdout)
+            return (exitcode, stdout, usage)
+
+        try:
+            bench = _run_perf_workers(run_script, bench_args, extra_args,
+                                      get_nprocess(options))
+            if gc_files:
+                bench.update_metadata(merge_gc_stats(gc_files))
+            if detector is not None:
+                metadata = bench.get_metadata()
+                loops = (int(metadata.get('loops', 1))
+                         * int(metadata.get('inner_loops', 1)))
+                bench.update_metadata(detector.get_metadata(loops))
+        finally:
+            shutil.rmtree(tmpdir)
+    else:
+        if options.verbose:
+            bench_args.append('--verbose')
+        if options.processes:
+            bench_args.append('--processes=%s' % options.processes)
+        bench_args.append("--stdout")
+
+        monitors = []
+        if rusage.is_supported():
+            monitors.append(rusage.ResourceUsageMonitor())
+        if options.track_memory:
+            monitors.append(memory.MemoryTracker())
+
+        command = python + bench_args + extra_args
+        stdout = CallAndCaptureOutput(command,
+                                      hide_stderr=not options.verbose,
+                                      monitors=monitors,
+                                      timeout=get_timeout(options))
+        bench = perf.Benchmark.loads(stdout)
+        for monitor in monitors:
+            bench.update_metadata(monitor.get_metadata())
 
-    bench = perf.Benchmark.loads(stdout)
     bench.update_metadata({'performance_version': performance.__version__})
     return bench
 
 
+def run_interleaved(func, base_python, changed_python, options):
+    """Run a benchmark on two interpreters, alternating worker processes.
+
+    Each perf worker process runs on the base interpreter and then on the
+    changed interpreter (ABAB...), so a drift of the system (temperature, CPU
+    frequency) affects both interpreters the same way. The number of loops
+    calibrated by the first process is reused by all processes of both
+    interpreters.
+
+    Returns:
+        (base_bench, changed_bench) tuple.
+    """
+    nprocess = get_nprocess(options)
+    options = copy.copy(options)
+    options.processes = 1
+
+    base = []
+    changed = []
+    for process in range(nprocess):
+        base.append(func(base_python, options))
+        changed.append(func(changed_python, options))
+
+        if isinstance(base[0], perf.BenchmarkSuite):
+            # pybench doesn't support --processes: it already ran
+            # all processes
+            return (base[0], changed[0])
+
+        if not options.loops:
+            loops = base[0].get_metadata().get('loops')
+            if loops:
+                options.loops = int(loops)
+
+    return (merge_steps(base), merge_steps(changed))
+
+
+# Number of perf worker processes spawned per step in adaptive sampling mode
+ADAPTIVE_PROCESSES = 3
+
+
+def run_adaptive(func, python, options):
+    """Spawn worker processes until the median is precise enough.
+
+    Run ADAPTIVE_PROCESSES worker processes at each step, until the relative
+    half-width of the confidence interval of the median is smaller than
+    options.target_precision, or until the next step would exceed
+    options.max_bench_time seconds.
+
+    The stop reason and the final precision are stored in metadata.
+    """
+    options = copy.copy(options)
+    options.processes = ADAPTIVE_PROCESSES
+
+    start_time = time.time()
+    benchmarks = []
+    while True:
+        step_start = time.time()
+        bench = func(python, options)
+        if isinstance(bench, perf.BenchmarkSuite):
+            # pybench doesn't support --processes
+            return bench
+        benchmarks.append(bench)
+
+        if not options.loops:
+            loops = bench.get_metadata().get('loops')
+            if loops:
+                options.loops = int(loops)
+
+        samples = []
+        for bench in benchmarks:
+            samples.extend(bench.get_samples())
+        if len(samples) >= 2:
+            precision = stats.relative_precision(samples)
+        else:
+            precision = float('inf')
+
+        now = time.time()
+        if precision <= options.target_precision:
+            reason = 'precision'
+        elif (now - start_time) + (now - step_start) > options.max_bench_time:
+            reason = 'time_limit'
+        else:
+            continue
+        break
+
+    bench = merge_steps(benchmarks)
+    nprocess = len(benchmarks) * ADAPTIVE_PROCESSES
+    logging.info("%s: stop after %s processes (%s), precision: +/- %.2f%%",
+                 options.benchmark_name, nprocess, reason, precision * 100)
+    bench.update_metadata({
+        'adaptive_target_precision': '%.4f' % options.target_precision,
+        'adaptive_precision': '%.4f' % precision,
+        'adaptive_stop_reason': reason,
+        'adaptive_processes': str(nprocess),
+    })
+    return bench
+
+
 def _ExpandBenchmarkName(bm_name, bench_groups):
     """Recursively expand name benchmark names.
 
@@ -192,6 +557,10 @@ def ParseBenchmarksOption(benchmarks_opt, bench_groups, fast=False):
     return should_run
 
 
+def _parse_version(version):
+    return tuple(int(part) for part in version.split('.'))
+
+
 def FilterBenchmarks(benchmarks, bench_funcs, python):
     """Filters out benchmarks not supported by both Pythons.
 
@@ -206,7 +575,9 @@ def FilterBenchmarks(benchmarks, bench_funcs, python):
     basever = interpreter_version(python)
     for bm in list(benchmarks):
         minver, maxver = getattr(bench_funcs[bm], '_range', ('2.0', '4.0'))
-        if not minver <= basever <= maxver:
+        # compare tuples of integers: "3.10" is newer than "3.8"
+        if not (_parse_version(minver) <= _parse_version(basever)
+                <= _parse_version(maxver)):
             benchmarks.discard(bm)
             logging.info("Skipping benchmark %s; not compatible with "
                          "Python %s" % (bm, basever))
@@ -227,53 +598,428 @@ def check_existing(filename):
         sys.exit(1)
 
 
-def cmd_run(parser, options, bench_funcs, bench_groups):
-    print("Python benchmark suite %s" % performance.__version__)
-    print()
+def add_bench(dest_suite, bench, name):
+    """Add the results of the benchmark name to dest_suite.
+
+    The name is stored in the performance_benchmark metadata, to find the
+    benchmark groups of results (a benchmark can produce results with
+    different names).
+    """
+    if isinstance(bench, perf.BenchmarkSuite):
+        benchmarks = bench.get_benchmarks()
+    else:
+        benchmarks = [bench]
+    for bench in benchmarks:
+        bench.update_metadata({'performance_benchmark': name})
+        dest_suite.add_benchmark(bench)
+
+
+def run_instrumentation(func, python, options, bench, instrument):
+    """Run an extra unmeasured process of a benchmark with instrumentation.
+
+    The process reuses the number of loops calibrated by the measured run.
 
-    base = sys.executable
+    Returns:
+        True on success, False if the process failed.
+    """
+    options = copy.copy(options)
+    options.instrument = instrument
+    loops = bench.get_metadata().get('loops')
+    options.loops = int(loops) if loops else None
+    try:
+        func(python, options)
+    except RuntimeError as exc:
+        # instrumentation must not make the benchmark fail
+        logging.error("%s: instrumented run failed: %s",
+                      options.benchmark_name, exc)
+        return False
+    return True
+
+
+def trace_allocations(func, python, options, bench):
+    """Trace memory blocks retained by a benchmark in an extra unmeasured
+    process and store them as metadata of bench."""
+    tmpdir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tmpdir, 'traces.json')
+        if not run_instrumentation(func, python, options, bench,
+                                   ['--trace-alloc', filename]):
+            return
+        # the instrument script already divides by the number of loops
+        inner_loops = int(bench.get_metadata().get('inner_loops', 1))
+        bench.update_metadata(allocations.load_traces(filename, inner_loops))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def measure_import_times(func, python, options, bench):
+    """Measure the import time of each module of a startup benchmark in an
+    unmeasured pass and store it as metadata of bench.
+
+    The pass runs once per benchmark, after the measured worker processes of
+    all steps (--target-precision) or of all interleaved processes
+    (--changed-python). Benchmarks declare the arguments of the measured
+    command with the ImportTime() decorator: "python args -c pass", where
+    python is the full command prefix of the interpreter (with the -a
+    arguments).
+    """
+    command = python + func._importtime_args + ["-c", "pass"]
+    try:
+        modules = run_importtime(command,
+                                 BuildEnv(inherit_env=options.inherit_env))
+    except RuntimeError as exc:
+        # the import time pass must not make the benchmark fail
+        logging.error("%s: import time pass failed: %s",
+                      options.benchmark_name, exc)
+        return
+    bench.update_metadata(importtime_to_metadata(modules))
+
+
+def get_cpu_groups(options):
+    """Get the CPU groups of the jobs: one affinity per job.
+
+    With a single job, the --affinity option is used unchanged.
+    """
+    if options.jobs == 1:
+        if options.affinity:
+            return [parse_cpu_list(options.affinity)]
+        return [None]
+
+    if options.affinity:
+        cpus = parse_cpu_list(options.affinity)
+    else:
+        cpus = get_available_cpus()
+    return split_cpus(cpus, options.jobs)
+
+
+def run_benchmarks(bench_funcs, to_run, python, options, on_result=None,
+                   completed=None, changed_python=None, history=None):
+    """Run benchmarks and merge their results into a suite.
+
+    Args:
+        bench_funcs: dict mapping benchmark names to functions.
+        to_run: list of benchmark names, in the order of the suite.
+        python: the interpreter command (as a list).
+        options: command line options.
+        on_result: optional callback called with (name, result) as soon as
+            a benchmark completes.
+        completed: optional dict mapping benchmark names to results of
+            benchmarks which already completed. These benchmarks are not run
+            again, but their results are merged into the suite.
+        changed_python: optional; command of a second interpreter. If set,
+            worker processes of each benchmark alternate between the two
+            interpreters, and results are (base, changed) tuples.
+        history: optional; DurationHistory updated with the duration of
+            each benchmark.
+
+    Returns:
+        (suites, errors) tuple. suites is a list of perf.BenchmarkSuite:
+        [base_suite], or [base_suite, changed_suite] if changed_python is
+        set. errors is a list of (name, BenchmarkError) tuples of the
+        benchmarks which failed or timed out; they are not in the suites.
+    """
+    if completed is None:
+        completed = {}
 
+    def make_task(name):
+        func = bench_funcs[name]
+
+        def task(options):
+            if options.process_plan:
+                options.processes = options.process_plan[name]
+
+            start_time = time.time()
+            deadlines = []
+            if options.timeout:
+                deadlines.append(start_time + options.timeout)
+            if options.deadline is not None:
+                if start_time >= options.deadline:
+                    return BenchmarkError("Skipped: the global timeout "
+                                          "expired")
+                deadlines.append(options.deadline)
+            options.bench_deadline = min(deadlines) if deadlines else None
+
+            try:
+                if changed_python is not None:
+                    result = run_interleaved(func, python, changed_python,
+                                             options)
+                elif options.target_precision:
+                    result = run_adaptive(func, python, options)
+                else:
+                    result = func(python, options)
+            except BenchmarkTimeout as exc:
+                logging.error("%s: %s", name, exc)
+                return BenchmarkError(exc)
+
+            if history is not None and isinstance(result, perf.Benchmark):
+                history.record(name, time.time() - start_time,
+                               len(result.get_runs()))
+
+            # pybench doesn't use perf worker processes
+            if options.profile and isinstance(result, perf.Benchmark):
+                filename = os.path.join(options.profile, name + '.pstats')
+                run_instrumentation(func, python, options, result,
+                                    ['--profile', filename])
+            if options.flamegraph and isinstance(result, perf.Benchmark):
+                filename = os.path.join(options.flamegraph,
+                                        name + '.collapsed')
+                interval = options.sample_interval / 1000.0
+                if run_instrumentation(func, python, options, result,
+                                       ['--sample-stacks', filename,
+                                        '--sample-interval=%s' % interval]):
+                    write_flamegraph(filename,
+                                     os.path.join(options.flamegraph,
+                                                  name + '.svg'),
+                                     name)
+            if options.trace_alloc and isinstance(result, perf.Benchmark):
+                trace_allocations(func, python, options, result)
+            if hasattr(func, '_importtime_args'):
+                if changed_python is not None:
+                    pairs = zip((python, changed_python), result)
+                else:
+                    pairs = [(python, result)]
+                for cmd_prefix, bench in pairs:
+                    if isinstance(bench, perf.Benchmark):
+                        measure_import_times(func, cmd_prefix, options,
+                                             bench)
+            return result
+
+        return (name, task)
+
+    tasks = [make_task(name) for name in to_run if name not in completed]
+    scheduler = BenchmarkScheduler(get_cpu_groups(options))
+    results = scheduler.run(tasks, options, on_result)
+    results = dict(zip([task[0] for task in tasks], results))
+    results.update(completed)
+
+    suites = [perf.BenchmarkSuite()]
+    if changed_python is not None:
+        suites.append(perf.BenchmarkSuite())
+    errors = []
+    for name in to_run:
+        result = results[name]
+        if isinstance(result, BenchmarkError):
+            errors.append((name, result))
+            continue
+        if not isinstance(result, tuple):
+            result = (result,)
+        for suite, bench in zip(suites, result):
+            add_bench(suite, bench, name)
+    return (suites, errors)
+
+
+def prepare_run_options(parser, options):
+    """Check the options added by cli._add_run_options() and set the
+    performance options which are not exposed on the command line.
+
+    Used by the run and calibrate-noise commands.
+
+    Returns:
+        Command prefix to run the running Python: list of str.
+    """
     # Get the full path since child processes are run in an empty environment
     # without the PATH variable
-    base = which(base)
+    options.base_binary = which(sys.executable)
+
+    # performance options which are not exposed on the command line
+    options.processes = None
+    options.loops = None
+    options.process_plan = None
+    options.deadline = None
+    options.instrument = None
+    options.worker_pool = None
+
+    if options.target_precision is not None:
+        if options.target_precision <= 0:
+            parser.error("--target-precision must be greater than 0")
+        if options.debug_single_sample:
+            parser.error("--target-precision is incompatible "
+                         "with --debug-single-sample")
+
+    if options.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    try:
+        get_cpu_groups(options)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    if options.timeout is not None and options.timeout <= 0:
+        parser.error("--timeout must be greater than 0")
+    if ((options.timeout or options.global_timeout)
+       and options.worker_server):
+        parser.error("--timeout and --global-timeout are not supported "
+                     "with --worker-server")
+
+    for directory in (options.profile, options.flamegraph):
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+    if options.trace_alloc and sys.version_info < (3, 4):
+        parser.error("--trace-alloc requires Python 3.4 or newer "
+                     "(tracemalloc)")
+    if options.gc_stats:
+        if sys.version_info < (3, 3):
+            parser.error("--gc-stats requires Python 3.3 or newer "
+                         "(gc.callbacks)")
+        if options.track_memory:
+            parser.error("--gc-stats is incompatible with --track_memory")
+    if options.auto_warmups is not None:
+        if options.auto_warmups < 2:
+            parser.error("--auto-warmups must be at least 2")
+        if options.track_memory:
+            parser.error("--auto-warmups is incompatible with --track_memory")
+    if options.sample_interval <= 0:
+        parser.error("--sample-interval must be greater than 0")
+
+    if options.track_memory and not memory.is_supported():
+        parser.error("--track_memory only works on Linux")
+
+    if options.worker_server:
+        if not hasattr(os, 'fork'):
+            parser.error("--worker-server requires os.fork()")
+        if options.track_memory:
+            parser.error("--track_memory is not supported "
+                         "with --worker-server")
+
+    return [options.base_binary] + options.args.split()
+
+
+def cmd_run(parser, options, bench_funcs, bench_groups):
+    print("Python benchmark suite %s" % performance.__version__)
+    print()
 
     if options.output:
         check_existing(options.output)
 
-    options.base_binary = base
+    for directory in (options.profile, options.flamegraph):
+        if directory and options.changed_python:
+            parser.error("--profile and --flamegraph are incompatible "
+                         "with --changed-python")
+    if options.trace_alloc and options.changed_python:
+        parser.error("--trace-alloc is incompatible "
+                     "with --changed-python")
+    if options.target_precision is not None and options.changed_python:
+        parser.error("--target-precision is incompatible "
+                     "with --changed-python")
+
+    base_cmd_prefix = prepare_run_options(parser, options)
+
+    changed_cmd_prefix = None
+    if options.changed_python:
+        if not options.output or not options.changed_output:
+            parser.error("--changed-python requires --output "
+                         "and --changed-output")
+        if options.append or options.worker_server:
+            parser.error("--changed-python is incompatible with --append "
+                         "and --worker-server")
+        check_existing(options.changed_output)
+        # run the changed Python in its own virtual environment
+        changed = get_virtualenv_python(options.changed_python)
+        changed_cmd_prefix = [changed] + options.args.split()
+    elif options.changed_output:
+        parser.error("--changed-output requires --changed-python")
 
     if not options.control_label:
         options.control_label = options.base_binary
 
-    base_args = options.args.split()
-    base_cmd_prefix = [base] + base_args
-
     logging.basicConfig(level=logging.INFO)
 
     should_run = ParseBenchmarksOption(options.benchmarks, bench_groups,
                                        options.fast or options.debug_single_sample)
 
     should_run = FilterBenchmarks(should_run, bench_funcs, base_cmd_prefix)
+    if changed_cmd_prefix is not None:
+        should_run = FilterBenchmarks(should_run, bench_funcs,
+                                      changed_cmd_prefix)
+
+    history = None
+    if not (options.changed_python or options.worker_server):
+        # durations of other modes are not comparable
+        history = DurationHistory(get_default_history_filename())
+
+    to_run = sorted(should_run)
+    if options.time_budget is not None:
+        if history is None or options.target_precision:
+            parser.error("--time-budget is incompatible with "
+                         "--changed-python, --worker-server and "
+                         "--target-precision")
+        # jobs run in parallel
+        budget = options.time_budget * len(get_cpu_groups(options))
+        plan, dropped, estimated = plan_budget(to_run, history, budget,
+                                               get_nprocess(options))
+        options.process_plan = plan
+        to_run = [name for name in to_run if name in plan]
+
+        print("Time budget: %s, estimated duration: %s"
+              % (format_duration(options.time_budget),
+                 format_duration(estimated / len(get_cpu_groups(options)))))
+        for name in to_run:
+            print("- %s: %s processes" % (name, plan[name]))
+        if dropped:
+            print("Dropped benchmarks (not enough time): %s"
+                  % ', '.join(dropped))
+        print()
 
-    base_suite = perf.BenchmarkSuite()
-    to_run = list(sorted(should_run))
-    run_count = str(len(to_run))
-    for index, name in enumerate(to_run):
-        func = bench_funcs[name]
-        print("[%s/%s] %s..." %
-              (str(index+1).rjust(len(run_count)), run_count, name))
-        options.benchmark_name = name  # Easier than threading this everywhere.
-
-        def add_bench(dest_suite, bench):
-            if isinstance(bench, perf.BenchmarkSuite):
-                benchmarks = bench.get_benchmarks()
-                for bench in benchmarks:
-                    dest_suite.add_benchmark(bench)
-            else:
-                dest_suite.add_benchmark(bench)
-
-        bench = func(base_cmd_prefix, options)
-        add_bench(base_suite, bench)
+    if options.worker_server:
+        options.worker_pool = WorkerPool(base_cmd_prefix, options.jobs,
+                                         env=BuildEnv())
+
+    # one journal per output file
+    journals = []
+    if options.output or options.append:
+        journals.append(Journal(Journal.get_path(options.output
+                                                 or options.append)))
+        if options.changed_output:
+            journals.append(Journal(Journal.get_path(options.changed_output)))
+
+    completed = {}
+    if options.resume:
+        if not journals:
+            parser.error("--resume requires --output or --append")
+        loaded = [journal.load() for journal in journals]
+        for name in to_run:
+            if all(name in results for results in loaded):
+                results = tuple(results[name] for results in loaded)
+                if len(results) == 1:
+                    results = results[0]
+                completed[name] = results
+        print("Resume the run: %s benchmarks already completed (%s)"
+              % (len(completed),
+                 ', '.join(journal.path for journal in journals)))
+        print()
+    else:
+        for journal in journals:
+            if journal.exists():
+                print("ERROR: the journal %s of an interrupted run "
+                      "already exists!" % journal.path)
+                print("Use --resume to resume the run, "
+                      "or remove the journal.")
+                sys.exit(1)
+
+    def record(name, result):
+        if isinstance(result, BenchmarkError):
+            # run the benchmark again on resume
+            return
+        if not isinstance(result, tuple):
+            result = (result,)
+        for journal, bench in zip(journals, result):
+            journal.record(name, bench)
+
+    if options.global_timeout:
+        options.deadline = time.time() + options.global_timeout
+
+    try:
+        suites, errors = run_benchmarks(bench_funcs, to_run,
+                                base_cmd_prefix, options,
+                                on_result=record if journals else None,
+                                completed=completed,
+                                changed_python=changed_cmd_prefix,
+                                history=history)
+    finally:
+        if options.worker_pool is not None:
+            options.worker_pool.close()
+        if history is not None:
+            history.save()
+    base_suite = suites[0]
 
     print()
     print("Report on %s" % " ".join(platform.uname()))
@@ -281,12 +1027,30 @@ def cmd_run(parser, options, bench_funcs, bench_groups):
         print("Total CPU cores:", multiprocessing.cpu_count())
 
     if options.output:
-        base_suite.dump(options.output)
+        packed.dump_suite(base_suite, options.output)
 
     if options.append:
-        perf.add_runs(options.append, base_suite)
+        packed.add_runs(options.append, base_suite)
 
-    display_suite(base_suite)
+    if options.changed_output:
+        packed.dump_suite(suites[1], options.changed_output)
+
+    for journal in journals:
+        journal.remove()
+
+    if options.changed_output:
+        print()
+        print("Compare results with: pyperformance compare %s %s"
+              % (options.output, options.changed_output))
+    else:
+        display_suite(base_suite)
+
+    if errors:
+        print()
+        print("%s benchmarks failed:" % len(errors))
+        for name, error in errors:
+            print("- %s: %s" % (name, error))
+        sys.exit(1)
 
 
 def cmd_list(options, bench_funcs, bench_groups):
@@ -0,0 +1,119 @@
+from __future__ import division, with_statement, print_function, absolute_import
+
+import os
+
+
+# Fields of the resource usage stored in metadata
+RUSAGE_FIELDS = ('ru_utime', 'ru_stime', 'ru_minflt', 'ru_majflt',
+                 'ru_nvcsw', 'ru_nivcsw')
+
+
+def is_supported():
+    return hasattr(os, 'wait4')
+
+
+def rusage_to_dict(rusage):
+    """Convert a resource.struct_rusage to a dict of RUSAGE_FIELDS."""
+    return dict((field, getattr(rusage, field)) for field in RUSAGE_FIELDS)
+
+
+def add_rusage(usage1, usage2):
+    """Sum two resource usage dicts."""
+    return dict((field, usage1[field] + usage2[field])
+                for field in RUSAGE_FIELDS)
+
+
+def wait_process(proc):
+    """Wait until the process completes using os.wait4().
+
+    Set proc.returncode.
+
+    Returns:
+        The resource usage of the process and of all its descendants that
+        it waited for, as a dict of RUSAGE_FIELDS.
+    """
+    status, rusage = os.wait4(proc.pid, 0)[1:]
+    if os.WIFSIGNALED(status):
+        proc.returncode = -os.WTERMSIG(status)
+    else:
+        proc.returncode = os.WEXITSTATUS(status)
+    return rusage_to_dict(rusage)
+
+
+def rusage_to_metadata(usage):
+    """Format a resource usage dict as benchmark metadata.
+
+    Metadata:
+
+    * cpu_user_time, cpu_system_time: CPU time in seconds spent in user mode
+      and in kernel mode (syscalls)
+    * page_faults_minor, page_faults_major: page faults without/with I/O
+    * ctx_switches_voluntary, ctx_switches_involuntary: context switches
+      because the process waited for a resource or because it was preempted
+    """
+    return {
+        'cpu_user_time': '%.6f' % usage['ru_utime'],
+        'cpu_system_time': '%.6f' % usage['ru_stime'],
+        'page_faults_minor': str(usage['ru_minflt']),
+        'page_faults_major': str(usage['ru_majflt']),
+        'ctx_switches_voluntary': str(usage['ru_nvcsw']),
+        'ctx_switches_involuntary': str(usage['ru_nivcsw']),
+    }
+
+
+def metadata_to_rusage(metadata):
+    """Parse the metadata written by rusage_to_metadata().
+
+    Returns:
+        A dict of RUSAGE_FIELDS, or None if the metadata has no resource
+        usage.
+    """
+    try:
+        return {
+            'ru_utime': float(metadata['cpu_user_time']),
+            'ru_stime': float(metadata['cpu_system_time']),
+            'ru_minflt': int(metadata['page_faults_minor']),
+            'ru_majflt': int(metadata['page_faults_major']),
+            'ru_nvcsw': int(metadata['ctx_switches_voluntary']),
+            'ru_nivcsw': int(metadata['ctx_switches_involuntary']),
+        }
+    except KeyError:
+        return None
+
+
+def merge_metadata(metadata_list):
+    """Sum the resource usage metadata of benchmarks run one after the other.
+
+    Returns:
+        The metadata of the total resource usage, or an empty dict if one
+        benchmark has no resource usage.
+    """
+    total = None
+    for metadata in metadata_list:
+        usage = metadata_to_rusage(metadata)
+        if usage is None:
+            return {}
+        if total is not None:
+            usage = add_rusage(total, usage)
+        total = usage
+    if total is None:
+        return {}
+    return rusage_to_metadata(total)
+
+
+class ResourceUsageMonitor(object):
+    """Monitor storing the resource usage of a process tree as metadata."""
+
+    def __init__(self):
+        self.usage = None
+
+    def start(self, proc):
+        pass
+
+    def stop(self, usage):
+        self.usage = usage
+
+    def get_metadata(self):
+        if self.usage is None:
+            return {}
+        return rusage_to_metadata(self.usage)
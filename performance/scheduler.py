@@ -0,0 +1,221 @@
+from __future__ import division, with_statement, print_function, absolute_import
+
+import copy
+import os
+import sys
+import threading
+try:
+    import queue
+except ImportError:
+    # Python 2
+    import Queue as queue
+try:
+    import multiprocessing
+except ImportError:
+    multiprocessing = None
+
+from performance import watchdog
+
+
+def parse_cpu_list(cpu_list):
+    """Parse a CPU list like "0-3,8,10-11".
+
+    Returns:
+        A sorted list of CPU numbers (int), without duplicates.
+    """
+    cpus = set()
+    for part in cpu_list.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            first = int(first)
+            last = int(last)
+            if last < first:
+                raise ValueError("invalid CPU range: %s" % part)
+            cpus.update(range(first, last + 1))
+        else:
+            cpus.add(int(part))
+    if not cpus:
+        raise ValueError("empty CPU list: %r" % cpu_list)
+    return sorted(cpus)
+
+
+def format_cpu_list(cpus):
+    """Format a list of CPU numbers using ranges: [0, 1, 2, 5] => "0-2,5"."""
+    parts = []
+    cpus = sorted(cpus)
+    first = last = cpus[0]
+    for cpu in cpus[1:] + [None]:
+        if cpu is not None and cpu == last + 1:
+            last = cpu
+            continue
+        if first == last:
+            parts.append(str(first))
+        else:
+            parts.append('%s-%s' % (first, last))
+        first = last = cpu
+    return ','.join(parts)
+
+
+def get_available_cpus():
+    """Get the list of CPUs the current process is allowed to run on."""
+    if hasattr(os, 'sched_getaffinity'):
+        # Python 3.3
+        return sorted(os.sched_getaffinity(0))
+    if multiprocessing is not None:
+        return list(range(multiprocessing.cpu_count()))
+    return [0]
+
+
+def split_cpus(cpus, jobs):
+    """Split CPUs into *jobs* groups of contiguous CPUs of the same size.
+
+    All groups get the same number of CPUs to keep jobs comparable: extra CPUs
+    are left unused.
+    """
+    if jobs < 1:
+        raise ValueError("the number of jobs must be at least 1")
+    if jobs > len(cpus):
+        raise ValueError("cannot run %s jobs on %s CPUs (%s)"
+                         % (jobs, len(cpus), format_cpu_list(cpus)))
+    size = len(cpus) // jobs
+    return [cpus[index * size:(index + 1) * size] for index in range(jobs)]
+
+
+class BenchmarkScheduler(object):
+    """Run benchmarks concurrently, each job pinned to its own CPU group.
+
+    Each job is a thread running one benchmark at a time; the benchmark
+    function spawns its own processes, the thread only waits for them. Jobs
+    get a copy of the options with the affinity set to their CPU group.
+
+    Results are returned in the order of the tasks, whatever the completion
+    order, so the merged suite doesn't depend on the scheduling.
+    """
+
+    def __init__(self, cpu_groups):
+        # cpu_groups: list of affinities, one per job. An affinity is a list
+        # of CPUs or None to not pin the job.
+        self.cpu_groups = cpu_groups
+        self._print_lock = threading.Lock()
+
+    def log_start(self, index, ntask, name, affinity):
+        ntask = str(ntask)
+        msg = "[%s/%s] %s..." % (str(index + 1).rjust(len(ntask)), ntask, name)
+        if affinity is not None and len(self.cpu_groups) > 1:
+            msg = "%s (CPU %s)" % (msg, affinity)
+        with self._print_lock:
+            print(msg)
+            sys.stdout.flush()
+
+    def _run_task(self, index, ntask, task, affinity, options):
+        name, func = task
+        options = copy.copy(options)
+        if affinity is not None:
+            options.affinity = affinity
+        # Easier than threading this everywhere.
+        options.benchmark_name = name
+        self.log_start(index, ntask, name, affinity)
+        return func(options)
+
+    def run(self, tasks, options, on_result=None):
+        """Run tasks.
+
+        Args:
+            tasks: list of (name, func) tuples where func is called with
+                the options of the job and returns the benchmark result.
+            options: options, copied for each task.
+            on_result: optional callback called in the calling thread with
+                (name, result) when a task completes.
+
+        Returns:
+            The list of results, in the order of tasks.
+        """
+        affinities = [format_cpu_list(cpus) if cpus else None
+                      for cpus in self.cpu_groups]
+        if len(affinities) == 1:
+            return self._run_sequential(tasks, options, affinities[0],
+                                        on_result)
+
+        ntask = len(tasks)
+        task_queue = queue.Queue()
+        for index, task in enumerate(tasks):
+            task_queue.put((index, task))
+        result_queue = queue.Queue()
+        stop = threading.Event()
+
+        def worker(affinity):
+            while not stop.is_set():
+                try:
+                    index, task = task_queue.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    result = self._run_task(index, ntask, task, affinity,
+                                            options)
+                except BaseException as exc:
+                    result_queue.put((index, None, exc))
+                else:
+                    result_queue.put((index, result, None))
+
+        threads = []
+        for affinity in affinities:
+            thread = threading.Thread(target=worker, args=(affinity,))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        results = [None] * ntask
+        errors = []
+        pending = ntask
+        try:
+            while pending:
+                try:
+                    # Use a timeout to not block signals (CTRL+c)
+                    index, result, exc = result_queue.get(timeout=1.0)
+                except queue.Empty:
+                    if any(thread.is_alive() for thread in threads):
+                        continue
+                    # A job can put its result and exit just after the
+                    # timeout: drain the queue before giving up
+                    try:
+                        index, result, exc = result_queue.get_nowait()
+                    except queue.Empty:
+                        # jobs were stopped after an error
+                        break
+                pending -= 1
+                if exc is not None:
+                    # Don't start new benchmarks, but wait until running
+                    # benchmarks complete
+                    stop.set()
+                    errors.append((index, exc))
+                    continue
+                results[index] = result
+                if on_result is not None:
+                    on_result(tasks[index][0], result)
+        except BaseException:
+            stop.set()
+            # On CTRL+c, benchmarks of other jobs are still running in
+            # daemon threads which are not interrupted: kill their process
+            # groups, which don't get the signal of the terminal
+            watchdog.kill_all()
+            raise
+
+        if errors:
+            errors.sort(key=lambda item: item[0])
+            raise errors[0][1]
+        if pending:
+            raise RuntimeError("%s benchmarks didn't complete" % pending)
+        return results
+
+    def _run_sequential(self, tasks, options, affinity, on_result):
+        results = []
+        for index, task in enumerate(tasks):
+            result = self._run_task(index, len(tasks), task, affinity,
+                                    options)
+            results.append(result)
+            if on_result is not None:
+                on_result(task[0], result)
+        return results
@@ -0,0 +1,552 @@
+"""Statistics helpers.
+
+Pure Python implementations: this module doesn't depend on perf, so it can be
+used outside the virtual environment.
+"""
+
+from __future__ import division, with_statement, print_function, absolute_import
+
+import math
+import random
+
+
+# Number of bootstrap resamples
+BOOTSTRAP_RESAMPLES = 2000
+
+
+def median(values):
+    values = sorted(values)
+    size = len(values)
+    if not size:
+        raise ValueError("no value")
+    middle = size // 2
+    if size % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2
+
+
+def geometric_mean(values, weights=None):
+    if not values:
+        raise ValueError("no value")
+    if weights is None:
+        weights = [1.0] * len(values)
+    total = math.fsum(weights)
+    if total <= 0:
+        raise ValueError("the sum of weights must be positive")
+    return math.exp(math.fsum(weight * math.log(value)
+                              for value, weight in zip(values, weights))
+                    / total)
+
+
+def normal_cdf(x):
+    """Cumulative distribution function of the standard normal
+    distribution."""
+    return 0.5 * math.erfc(-x / math.sqrt(2))
+
+
+def normal_ppf(p):
+    """Quantile function (inverse of the CDF) of the standard normal
+    distribution.
+
+    Rational approximation of Peter J. Acklam, relative error smaller than
+    1.2e-9.
+    """
+    if not 0.0 < p < 1.0:
+        raise ValueError("p must be in the range ]0; 1[")
+
+    a = (-3.969683028665376e+01, 2.209460984245205e+02,
+         -2.759285104469687e+02, 1.383577518672690e+02,
+         -3.066479806614716e+01, 2.506628277459239e+00)
+    b = (-5.447609879822406e+01, 1.615858368580409e+02,
+         -1.556989798598866e+02, 6.680131188771972e+01,
+         -1.328068155288572e+01)
+    c = (-7.784894002430293e-03, -3.223964580411365e-01,
+         -2.400758277161838e+00, -2.549732539343734e+00,
+         4.374664141464968e+00, 2.938163982698783e+00)
+    d = (7.784695709041462e-03, 3.224671290700398e-01,
+         2.445134137142996e+00, 3.754408661907416e+00)
+
+    p_low = 0.02425
+    if p < p_low:
+        q = math.sqrt(-2 * math.log(p))
+        return ((((((c[0] * q + c[1]) * q + c[2]) * q + c[3]) * q + c[4]) * q
+                 + c[5])
+                / ((((d[0] * q + d[1]) * q + d[2]) * q + d[3]) * q + 1))
+    if p > 1 - p_low:
+        return -normal_ppf(1 - p)
+
+    q = p - 0.5
+    r = q * q
+    return ((((((a[0] * r + a[1]) * r + a[2]) * r + a[3]) * r + a[4]) * r
+             + a[5]) * q
+            / (((((b[0] * r + b[1]) * r + b[2]) * r + b[3]) * r + b[4]) * r
+               + 1))
+
+
+def median_confidence_interval(values, confidence=0.95):
+    """Distribution-free confidence interval of the median.
+
+    The bounds are order statistics of the values: the rank of the bounds
+    comes from the normal approximation of the binomial distribution.
+
+    Returns:
+        (low, high) tuple.
+    """
+    values = sorted(values)
+    size = len(values)
+    if size < 2:
+        raise ValueError("need at least 2 values")
+    z = normal_ppf(0.5 + confidence / 2)
+    delta = z * math.sqrt(size) / 2
+    low = int(math.floor(size / 2 - delta))
+    high = int(math.ceil(size / 2 + delta))
+    low = max(low, 0)
+    high = min(high, size - 1)
+    return (values[low], values[high])
+
+
+def relative_precision(values, confidence=0.95):
+    """Relative half-width of the confidence interval of the median.
+
+    For example, 0.01 means that the median is known with a precision
+    of +/- 1%.
+    """
+    low, high = median_confidence_interval(values, confidence)
+    return (high - low) / 2 / median(values)
+
+
+def _beta_continued_fraction(x, a, b):
+    """Continued fraction of the incomplete beta function (modified Lentz's
+    method)."""
+    tiny = 1e-300
+    c = 1.0
+    d = 1.0 - (a + b) * x / (a + 1)
+    if abs(d) < tiny:
+        d = tiny
+    d = 1.0 / d
+    result = d
+    for m in range(1, 301):
+        m2 = 2 * m
+        for numerator in (m * (b - m) * x / ((a + m2 - 1) * (a + m2)),
+                          -(a + m) * (a + b + m) * x
+                          / ((a + m2) * (a + m2 + 1))):
+            d = 1.0 + numerator * d
+            if abs(d) < tiny:
+                d = tiny
+            c = 1.0 + numerator / c
+            if abs(c) < tiny:
+                c = tiny
+            d = 1.0 / d
+            delta = c * d
+            result *= delta
+        if abs(delta - 1.0) < 1e-15:
+            break
+    return result
+
+
+def regularized_beta(x, a, b):
+    """Regularized incomplete beta function I_x(a, b)."""
+    if not 0.0 <= x <= 1.0:
+        raise ValueError("x must be in the range [0; 1]")
+    if x == 0.0 or x == 1.0:
+        return x
+    log_front = (math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b)
+                 + a * math.log(x) + b * math.log(1 - x))
+    if x < (a + 1) / (a + b + 2):
+        return math.exp(log_front) * _beta_continued_fraction(x, a, b) / a
+    return 1.0 - (math.exp(log_front)
+                  * _beta_continued_fraction(1 - x, b, a) / b)
+
+
+def student_t_pvalue(t, df):
+    """Two-sided p-value of Student's t distribution with df degrees of
+    freedom."""
+    return regularized_beta(df / (df + t * t), df / 2, 0.5)
+
+
+def adjust_pvalues(pvalues, method):
+    """Adjust p-values for multiple comparisons.
+
+    Args:
+        pvalues: list of p-values.
+        method: "none", "holm" (Holm-Bonferroni, controls the family-wise
+            error rate) or "bh" (Benjamini-Hochberg, controls the false
+            discovery rate).
+
+    Returns:
+        List of adjusted p-values, in the order of pvalues.
+    """
+    size = len(pvalues)
+    order = sorted(range(size), key=lambda index: pvalues[index])
+    adjusted = [None] * size
+    if method == 'none':
+        return list(pvalues)
+    elif method == 'holm':
+        previous = 0.0
+        for rank, index in enumerate(order):
+            previous = max(previous, min((size - rank) * pvalues[index], 1.0))
+            adjusted[index] = previous
+    elif method == 'bh':
+        previous = 1.0
+        for rank in range(size - 1, -1, -1):
+            index = order[rank]
+            previous = min(previous, size * pvalues[index] / (rank + 1))
+            adjusted[index] = previous
+    else:
+        raise ValueError("unknown method: %r" % method)
+    return adjusted
+
+
+def mann_whitney_u(values1, values2):
+    """Two-sided Mann-Whitney U test.
+
+    Normal approximation with tie and continuity corrections.
+
+    Returns:
+        (u, pvalue) tuple: u is the U statistic of values1.
+    """
+    size1 = len(values1)
+    size2 = len(values2)
+    if not size1 or not size2:
+        raise ValueError("no value")
+    size = size1 + size2
+    combined = sorted([(value, 0) for value in values1]
+                      + [(value, 1) for value in values2])
+
+    rank_sum = 0.0
+    ties = 0
+    start = 0
+    while start < size:
+        end = start + 1
+        while end < size and combined[end][0] == combined[start][0]:
+            end += 1
+        # average rank of tied values, ranks start at 1
+        rank = (start + end + 1) / 2
+        count = end - start
+        ties += count ** 3 - count
+        rank_sum += rank * sum(1 for value, group in combined[start:end]
+                               if group == 0)
+        start = end
+
+    u = rank_sum - size1 * (size1 + 1) / 2
+    variance = size1 * size2 / 12 * ((size + 1) - ties / (size * (size - 1)))
+    if variance <= 0:
+        return (u, 1.0)
+    z = max(abs(u - size1 * size2 / 2) - 0.5, 0) / math.sqrt(variance)
+    return (u, min(math.erfc(z / math.sqrt(2)), 1.0))
+
+
+def _bootstrap_medians(values, resamples, rng):
+    """Medians of resamples (with replacement) of values.
+
+    A resample draws indexes of the sorted values uniformly: the median of
+    the resample is the value at the median index, and the k-th smallest of
+    n uniform numbers follows the Beta(k, n - k + 1) distribution. Drawing
+    the order statistics directly gives the exact bootstrap distribution of
+    the median in O(1) per resample, instead of resampling and sorting
+    len(values) values.
+    """
+    values = sorted(values)
+    size = len(values)
+    middle = size // 2
+    betavariate = rng.betavariate
+
+    def value_at(number):
+        return values[min(int(number * size), size - 1)]
+
+    medians = []
+    for _ in range(resamples):
+        if size % 2:
+            number = betavariate(middle + 1, size - middle)
+            medians.append(value_at(number))
+        else:
+            low = betavariate(middle, size - middle + 1)
+            # smallest of the size - middle numbers greater than low
+            high = low + (1 - low) * betavariate(1, size - middle)
+            medians.append((value_at(low) + value_at(high)) / 2)
+    return medians
+
+
+def _bootstrap_ratios(values1, values2, resamples, rng):
+    """Ratios median(values2) / median(values1) of resamples."""
+    medians1 = _bootstrap_medians(values1, resamples, rng)
+    medians2 = _bootstrap_medians(values2, resamples, rng)
+    return [median2 / median1
+            for median1, median2 in zip(medians1, medians2)]
+
+
+def _percentile_interval(values, confidence):
+    values = sorted(values)
+    size = len(values)
+    alpha = 1 - confidence
+    return (values[int(alpha / 2 * size)],
+            values[max(int(math.ceil((1 - alpha / 2) * size)) - 1, 0)])
+
+
+def bootstrap_ratio(values1, values2, confidence=0.95,
+                    resamples=BOOTSTRAP_RESAMPLES, seed=0):
+    """Percentile bootstrap of the ratio median(values2) / median(values1).
+
+    The random generator uses a fixed seed to get reproducible results.
+    The p-value counts the observed ratio as one of the resamples:
+    (k + 1) / (resamples + 1), where k is twice the number of resamples on
+    the other side of 1, so it is never 0.
+
+    Returns:
+        (low, high, pvalue) tuple: bounds of the confidence interval of the
+        ratio, and the two-sided p-value of the ratio being equal to 1.
+    """
+    if not values1 or not values2:
+        raise ValueError("no value")
+    rng = random.Random(seed)
+    ratios = _bootstrap_ratios(values1, values2, resamples, rng)
+
+    low, high = _percentile_interval(ratios, confidence)
+    below = sum(1 for ratio in ratios if ratio <= 1.0)
+    above = sum(1 for ratio in ratios if ratio >= 1.0)
+    pvalue = min((2 * min(below, above) + 1) / (resamples + 1), 1.0)
+    return (low, high, pvalue)
+
+
+def bootstrap_log_ratio(values1, values2, resamples=BOOTSTRAP_RESAMPLES,
+                        seed=0):
+    """Bootstrap distribution of the logarithm of the ratio
+    median(values2) / median(values1) of a benchmark.
+
+    The result only depends on the values and on the seed: it can be
+    computed once per benchmark and combined into the geometric means of
+    several sets of benchmarks with combine_log_ratios().
+
+    Args:
+        seed: seed of the random generator, use a different seed per
+            benchmark so the resamples of benchmarks are independent.
+
+    Returns:
+        (point, log_ratios) tuple: logarithm of the ratio of the medians,
+        and list of the logarithms of the ratios of resamples.
+    """
+    if not values1 or not values2:
+        raise ValueError("no value")
+    rng = random.Random(seed)
+    point = math.log(median(values2) / median(values1))
+    log_ratios = [math.log(ratio)
+                  for ratio in _bootstrap_ratios(values1, values2,
+                                                 resamples, rng)]
+    return (point, log_ratios)
+
+
+def combine_log_ratios(bootstraps, weights=None, confidence=0.95):
+    """Weighted geometric mean of the ratios of benchmarks, with a
+    percentile bootstrap confidence interval.
+
+    Args:
+        bootstraps: list of (point, log_ratios) tuples returned by
+            bootstrap_log_ratio(), one per benchmark, with the same number
+            of resamples.
+        weights: optional list of weights, one per benchmark (default: 1).
+
+    Returns:
+        (geomean, low, high) tuple.
+    """
+    if weights is None:
+        weights = [1.0] * len(bootstraps)
+    total = math.fsum(weights)
+    if not bootstraps or total <= 0:
+        raise ValueError("no benchmark with a positive weight")
+
+    point_sum = 0.0
+    log_sums = None
+    for (point, log_ratios), weight in zip(bootstraps, weights):
+        if not weight:
+            continue
+        point_sum += weight * point
+        if log_sums is None:
+            log_sums = [0.0] * len(log_ratios)
+        for index, log_ratio in enumerate(log_ratios):
+            log_sums[index] += weight * log_ratio
+
+    low, high = _percentile_interval(log_sums, confidence)
+    return (math.exp(point_sum / total),
+            math.exp(low / total),
+            math.exp(high / total))
+
+
+def _sse(prefix, prefix2, start, end):
+    """Sum of squared errors of values[start:end] around their mean, computed
+    from prefix sums."""
+    size = end - start
+    total = prefix[end] - prefix[start]
+    return (prefix2[end] - prefix2[start]) - total * total / size
+
+
+def noise_stdev(values):
+    """Robust estimate of the standard deviation of the noise, insensitive to
+    shifts of the mean: median absolute difference of consecutive values."""
+    diffs = [abs(values[index + 1] - values[index])
+             for index in range(len(values) - 1)]
+    if not diffs:
+        return 0.0
+    # the difference of two normal variables has a stdev of sigma*sqrt(2),
+    # and the median absolute deviation of a normal variable is 0.6745*sigma
+    return median(diffs) / (0.6745 * math.sqrt(2))
+
+
+def changepoints(values, penalty=None, min_size=1):
+    """Detect changes of the mean using binary segmentation.
+
+    A segment is split at the index which reduces the most the sum of squared
+    errors, if the reduction divided by the noise variance is larger than
+    penalty (default: 4*log(n), a conservative BIC penalty).
+
+    Returns:
+        Sorted list of indexes: each changepoint is the index of the first
+        value of a new segment.
+    """
+    size = len(values)
+    sigma = noise_stdev(values)
+    if size < 2 * min_size or not sigma:
+        return []
+    if penalty is None:
+        penalty = 4 * math.log(size)
+    variance = sigma ** 2
+
+    prefix = [0.0]
+    prefix2 = [0.0]
+    for value in values:
+        prefix.append(prefix[-1] + value)
+        prefix2.append(prefix2[-1] + value * value)
+
+    result = []
+    pending = [(0, size)]
+    while pending:
+        start, end = pending.pop()
+        if end - start < 2 * min_size:
+            continue
+        cost = _sse(prefix, prefix2, start, end)
+        best_gain = 0.0
+        best_index = None
+        for index in range(start + min_size, end - min_size + 1):
+            gain = cost - (_sse(prefix, prefix2, start, index)
+                           + _sse(prefix, prefix2, index, end))
+            if gain > best_gain:
+                best_gain = gain
+                best_index = index
+        if best_index is not None and best_gain / variance > penalty:
+            result.append(best_index)
+            pending.append((start, best_index))
+            pending.append((best_index, end))
+    return sorted(result)
+
+
+def steady_state_start(values, min_steady=5):
+    """Find the index of the first value of the steady state.
+
+    The steady state is the last segment found by changepoints() (ignoring
+    trailing outliers: segments of 1 or 2 values), extended backwards with
+    segments whose mean is within the noise (2 standard deviations) of the
+    steady state mean. Short segments (outliers) inside the steady state are
+    skipped. At least min_steady values are kept.
+    """
+    size = len(values)
+    if size <= min_steady:
+        return 0
+    points = changepoints(values)
+    if not points:
+        return 0
+
+    bounds = [0] + points + [size]
+    segments = [values[bounds[index]:bounds[index + 1]]
+                for index in range(len(bounds) - 1)]
+    tolerance = 2 * noise_stdev(values)
+    start = len(segments) - 1
+    while start > 0 and len(segments[start]) <= 2:
+        start -= 1
+    steady_mean = sum(segments[start]) / len(segments[start])
+
+    index = start - 1
+    while index >= 0:
+        segment = segments[index]
+        mean = sum(segment) / len(segment)
+        if abs(mean - steady_mean) <= tolerance:
+            start = index
+        elif len(segment) > 2 or index == 0:
+            break
+        index -= 1
+
+    cut = bounds[start]
+    return min(cut, size - min_steady)
+
+
+def _locate_change(values, start, end):
+    """Find the index in ]start; end[ which splits values[start:end] in two
+    parts with the minimum sum of absolute deviations from their medians."""
+    def deviation(part):
+        middle = median(part)
+        return math.fsum(abs(value - middle) for value in part)
+
+    best = None
+    for index in range(start + 1, end):
+        cost = (deviation(values[start:index])
+                + deviation(values[index:end]))
+        if best is None or cost < best[0]:
+            best = (cost, index)
+    return best[1]
+
+
+def window_changes(values, window=12, min_size=6, alpha=0.001,
+                   min_change=0.01):
+    """Detect shifts of the median in a series with a sliding window
+    Mann-Whitney U test.
+
+    For each index i, the window values[i-window:i] before i is compared to
+    the window values[i:i+window] after i; windows are truncated at the
+    series bounds but must contain at least min_size values. An index is a
+    candidate if the test is significant at the alpha level and the ratio of
+    the medians of the windows changed by at least min_change. Among
+    candidates closer than window, the most significant one is kept, and
+    the change is then located precisely inside its windows.
+
+    Returns:
+        List of (index, ratio, pvalue) tuples sorted by index: index is the
+        first value after the change, ratio is median(after) /
+        median(before) of the windows around index.
+    """
+    size = len(values)
+
+    def compare(index):
+        before = values[max(index - window, 0):index]
+        after = values[index:index + window]
+        before_median = median(before)
+        if not before_median:
+            return None
+        ratio = median(after) / before_median
+        if abs(ratio - 1) < min_change:
+            return None
+        pvalue = mann_whitney_u(before, after)[1]
+        if pvalue >= alpha:
+            return None
+        return (ratio, pvalue)
+
+    candidates = []
+    for index in range(min_size, size - min_size + 1):
+        result = compare(index)
+        if result is not None:
+            ratio, pvalue = result
+            candidates.append((pvalue, -abs(math.log(ratio)), index))
+
+    changes = []
+    for pvalue, _, index in sorted(candidates):
+        if any(abs(index - other) < window for other in changes):
+            continue
+        changes.append(index)
+
+    located = []
+    for index in sorted(changes):
+        start = max(index - window, 0)
+        end = min(index + window, size)
+        index = _locate_change(values, start, end)
+        index = min(max(index, min_size), size - min_size)
+        result = compare(index)
+        if result is not None:
+            located.append((index,) + result)
+    return located
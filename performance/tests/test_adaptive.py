@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import unittest
+
+import perf
+
+from performance.run import ADAPTIVE_PROCESSES, run_adaptive
+
+
+def make_bench(samples, metadata):
+    common_metadata = {'name': 'nbody', 'loops': 16}
+    common_metadata.update(metadata)
+    data = {'benchmarks': [{'common_metadata': common_metadata,
+                            'runs': [{'samples': samples}]}],
+            'version': 4}
+    return perf.Benchmark.loads(json.dumps(data))
+
+
+class AdaptiveTests(unittest.TestCase):
+    def test_merge_metadata(self):
+        steps = []
+
+        def func(python, options):
+            steps.append(options.loops)
+            step = len(steps)
+            samples = [1.0, 1.0 + 0.5 ** step, 1.0 - 0.5 ** step]
+            return make_bench(samples, {'cpu_user_time': '%.6f' % step,
+                                        'cpu_system_time': '0.000000',
+                                        'page_faults_minor': '1',
+                                        'page_faults_major': '0',
+                                        'ctx_switches_voluntary': '1',
+                                        'ctx_switches_involuntary': '0',
+                                        'mem_max_rss': str(step * 1024)})
+
+        options = argparse.Namespace(processes=None, loops=None,
+                                     target_precision=0.05,
+                                     max_bench_time=60.0,
+                                     benchmark_name='nbody')
+        bench = run_adaptive(func, ['python'], options)
+
+        # the loops calibrated by the first step are reused
+        self.assertEqual(steps[:2], [None, 16])
+        metadata = bench.get_metadata()
+        self.assertEqual(metadata['adaptive_stop_reason'], 'precision')
+        self.assertEqual(int(metadata['adaptive_processes']),
+                         len(steps) * ADAPTIVE_PROCESSES)
+        # the resource usage of steps is summed, the peak RSS is the maximum
+        self.assertAlmostEqual(float(metadata['cpu_user_time']),
+                               sum(range(1, len(steps) + 1)))
+        self.assertEqual(int(metadata['page_faults_minor']), len(steps))
+        self.assertEqual(int(metadata['mem_max_rss']), len(steps) * 1024)
+
+
+if __name__ == "__main__":
+    unittest.main()
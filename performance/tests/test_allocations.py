@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from performance.allocations import RetainedBlocks, diff_lines, load_traces
+from performance.instrument import AllocationTracer, wrap_func
+
+
+KEPT = []
+
+
+def allocate(loops):
+    for _ in range(loops):
+        KEPT.append([object() for _ in range(10)])
+
+
+def allocate_once():
+    allocate(1)
+
+
+def allocate_temporary(loops):
+    for _ in range(loops):
+        # like the Point objects of bm_float: released at the next loop
+        points = [object() for _ in range(1000)]
+    del points
+
+
+@unittest.skipIf(sys.version_info < (3, 4), 'need tracemalloc')
+class AllocationsTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.addCleanup(KEPT.clear)
+
+    def test_tracer(self):
+        filename = os.path.join(self.tmpdir, 'traces.json')
+        tracer = AllocationTracer(filename)
+        wrap_func(allocate, [tracer], sample_func=True)(100)
+        tracer.save()
+
+        metadata = load_traces(filename)
+        retained = RetainedBlocks.from_metadata(metadata)
+        # 10 objects and a list per loop
+        self.assertGreaterEqual(retained.blocks, 11)
+        self.assertLess(retained.blocks, 13)
+        self.assertGreater(int(metadata['alloc_peak_size']), 0)
+        self.assertTrue(any(key.startswith('tests/test_allocations.py:')
+                            for key in retained.lines))
+
+    def test_tracer_calls(self):
+        # bench_func() calls the benchmark function once per loop: the
+        # retained blocks are averaged over the calls
+        filename = os.path.join(self.tmpdir, 'traces.json')
+        tracer = AllocationTracer(filename)
+        func = wrap_func(allocate_once, [tracer])
+        for _ in range(50):
+            func()
+        tracer.save()
+
+        retained = RetainedBlocks.from_metadata(load_traces(filename, 2))
+        # 11 blocks per call, 2 inner loops per call
+        self.assertGreaterEqual(retained.blocks, 5.5)
+        self.assertLess(retained.blocks, 6.5)
+
+    def test_tracer_temporary(self):
+        filename = os.path.join(self.tmpdir, 'traces.json')
+        tracer = AllocationTracer(filename)
+        wrap_func(allocate_temporary, [tracer], sample_func=True)(10)
+        tracer.save()
+
+        metadata = load_traces(filename)
+        retained = RetainedBlocks.from_metadata(metadata)
+        # temporary blocks are not retained, but they are in the peak
+        self.assertLess(retained.blocks, 1)
+        self.assertGreater(retained.temporary_size, 1000 * 16)
+        self.assertGreaterEqual(int(metadata['alloc_peak_size']),
+                                retained.temporary_size)
+
+    def test_no_metadata(self):
+        self.assertIsNone(RetainedBlocks.from_metadata({}))
+
+    def test_diff_lines(self):
+        base = RetainedBlocks.from_metadata({
+            'alloc_retained_blocks': '3.00', 'alloc_retained_size': '96.0',
+            'alloc_retained_lines': 'json/encoder.py:10 2.00 64.0; '
+                                    'json/encoder.py:20 1.00 32.0'})
+        changed = RetainedBlocks.from_metadata({
+            'alloc_retained_blocks': '1.00', 'alloc_retained_size': '32.0',
+            'alloc_retained_lines': 'json/encoder.py:20 1.00 32.0'})
+        self.assertEqual(diff_lines(base, changed),
+                         [('json/encoder.py:10', 2.0, 0.0)])
+        # results of older versions
+        self.assertIsNone(base.temporary_size)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    # Python 2: mock is a third-party package
+    try:
+        import mock
+    except ImportError:
+        mock = None
+
+from performance.benchmarks import BENCH_GROUPS
+from performance.benchmarks import bm_app_startup
+
+
+class AppStartupTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def test_imports(self):
+        expected = []
+        for app in bm_app_startup.IMPORTS:
+            expected.extend(('%s_startup' % app, '%s_startup_cold' % app))
+        self.assertEqual(sorted(BENCH_GROUPS['app_startup']),
+                         sorted(expected))
+
+    def test_bench_startup(self):
+        filename = os.path.join(self.tmpdir, 'runs')
+        command = [sys.executable, '-c',
+                   'open(%r, "a").write("x")' % filename]
+        dt = bm_app_startup.bench_startup(3, command, dict(os.environ))
+        self.assertGreater(dt, 0)
+        with open(filename) as fp:
+            self.assertEqual(fp.read(), 'xxx')
+
+    def import_module(self, cold):
+        with open(os.path.join(self.tmpdir, 'app.py'), 'w') as fp:
+            fp.write('VALUE = 1\n')
+        env, cache_dir = bm_app_startup.make_env(cold)
+        try:
+            subprocess.check_call([sys.executable, '-c', 'import app'],
+                                  cwd=self.tmpdir, env=env)
+            if cache_dir is not None:
+                self.assertEqual(os.listdir(cache_dir), [])
+        finally:
+            if cache_dir is not None:
+                shutil.rmtree(cache_dir)
+        return os.path.exists(os.path.join(self.tmpdir, '__pycache__'))
+
+    @unittest.skipIf(mock is None, 'need mock')
+    @unittest.skipIf(sys.version_info < (3, 8), 'need PYTHONPYCACHEPREFIX')
+    def test_cold(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop('PYTHONDONTWRITEBYTECODE', None)
+            # cold mode: the bytecode cache stays empty
+            self.assertFalse(self.import_module(cold=True))
+            self.assertTrue(self.import_module(cold=False))
+
+
+if __name__ == "__main__":
+    unittest.main()
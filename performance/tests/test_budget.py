@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import os
+import shutil
+import tempfile
+import unittest
+
+from performance.budget import DurationHistory, parse_duration, plan_budget
+
+
+class BudgetTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        filename = os.path.join(self.tmpdir, 'durations.json')
+        self.history = DurationHistory(filename)
+        self.history.record('fast', 10.0, 20)
+        self.history.record('medium', 100.0, 20)
+        self.history.record('slow', 400.0, 20)
+
+    def test_parse_duration(self):
+        self.assertEqual(parse_duration('90'), 90)
+        self.assertEqual(parse_duration('90s'), 90)
+        self.assertEqual(parse_duration('20m'), 1200)
+        self.assertEqual(parse_duration('1h30m'), 5400)
+        self.assertRaises(ValueError, parse_duration, '')
+        self.assertRaises(ValueError, parse_duration, '20 minutes')
+
+    def test_history(self):
+        self.history.save()
+        history = DurationHistory(self.history.filename)
+        self.assertEqual(history.get_process_duration('medium'), 5.0)
+        self.assertIsNone(history.get_process_duration('unknown'))
+
+    def test_plan(self):
+        to_run = ['fast', 'medium', 'slow']
+        plan, dropped, estimated = plan_budget(to_run, self.history,
+                                               10000, 20)
+        self.assertEqual(plan, {'fast': 20, 'medium': 20, 'slow': 20})
+        self.assertEqual(dropped, [])
+
+        plan, dropped, estimated = plan_budget(to_run, self.history, 100, 20)
+        self.assertEqual(dropped, [])
+        self.assertLessEqual(estimated, 100)
+        self.assertEqual(plan['slow'], 3)
+        self.assertGreater(plan['fast'], plan['slow'])
+
+    def test_plan_drop(self):
+        # 3 processes of slow cost 60 seconds
+        plan, dropped, estimated = plan_budget(['fast', 'medium', 'slow'],
+                                               self.history, 30, 20)
+        self.assertEqual(dropped, ['slow'])
+        self.assertEqual(sorted(plan), ['fast', 'medium'])
+        self.assertLessEqual(estimated, 30)
+
+
+if __name__ == "__main__":
+    unittest.main()
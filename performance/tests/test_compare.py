@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import argparse
 import io
 import os.path
 import subprocess
@@ -7,6 +8,8 @@ import tempfile
 import textwrap
 import unittest
 
+from performance.compare import CompareMultipleRuns, _compare_column
+
 
 DATA_DIR = os.path.realpath(os.path.join(os.path.dirname(__file__), 'data'))
 
@@ -32,10 +35,11 @@ class CompareTests(unittest.TestCase):
         cmd = [sys.executable, '-m', 'performance', 'venv', 'create']
         run_cmd(cmd)
 
-    def compare(self, *args):
-        cmd = [sys.executable, '-m', 'performance', 'compare',
-               os.path.join(DATA_DIR, 'py2.json'),
-               os.path.join(DATA_DIR, 'py3.json')]
+    def compare(self, *args, **kw):
+        filenames = kw.get('filenames', ('py2.json', 'py3.json'))
+        cmd = [sys.executable, '-m', 'performance', 'compare']
+        cmd.extend(os.path.join(DATA_DIR, filename)
+                   for filename in filenames)
         cmd.extend(args)
         proc = subprocess.Popen(cmd,
                                 stdout=subprocess.PIPE,
@@ -73,6 +77,51 @@ class CompareTests(unittest.TestCase):
             +-------------+----------+----------+--------------+-----------------------+
         ''').lstrip())
 
+    def test_stats(self):
+        stdout = self.compare("--stats", "mannwhitney")
+        self.assertIn("Significant (U=52, p=0.0001)", stdout)
+
+        stdout = self.compare("--stats", "bootstrap")
+        self.assertIn("Significant (ratio 95% CI: 1.1732..1.2087)", stdout)
+
+    def test_correction(self):
+        # a single benchmark: the corrected p-value is the p-value
+        stdout = self.compare("--correction", "holm")
+        self.assertIn("Significant (t=-3.38, corrected p=0.0017)", stdout)
+
+    def test_compare_matrix(self):
+        stdout = self.compare(filenames=('py2.json', 'py3.json', 'py2.json'))
+        self.assertEqual(stdout, textwrap.dedent('''
+            Benchmark       py2.json  py3.json        py2.json
+            --------------  --------  --------------  ---------
+            call_simple     11.4 ms   1.19x slower *  no change
+            Geometric mean  (ref)     1.19x slower    no change
+
+            Changes compared to py2.json, *: significant change
+        ''').lstrip())
+
+
+class CompareMultipleRunsTests(unittest.TestCase):
+    def test_ttest_sample_counts(self):
+        # --target-precision and --time-budget produce different numbers of
+        # samples: the t-test falls back to the Mann-Whitney U test
+        base = [1.0, 1.01, 0.99, 1.005, 0.995] * 4
+        changed = [value * 1.2 for value in base[:15]]
+        options = argparse.Namespace(stats='ttest', benchmark_name='nbody')
+        result = CompareMultipleRuns(base, changed, options)
+        self.assertTrue(result.always_display)
+        self.assertIn("t-test not applicable", result.stats_detail)
+        self.assertIn("U=", str(result))
+
+    def test_matrix_sample_counts(self):
+        # the matrix tests the same pairs as the comparison of two files
+        base = {'nbody': [1.0, 1.01, 0.99, 1.005, 0.995] * 4}
+        changed = {'nbody': [value * 1.2 for value in base['nbody'][:15]]}
+        options = argparse.Namespace(stats='ttest', correction='none')
+        result = _compare_column(base, changed, options)['nbody']
+        self.assertTrue(result.always_display)
+        self.assertIn("t-test not applicable", result.stats_detail)
+
 
 if __name__ == "__main__":
     unittest.main()
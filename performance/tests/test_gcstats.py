@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+from performance.gcstats import merge_gc_stats
+from performance.instrument import GcStats, make_sample_func, wrap_func
+
+
+def create_cycles(loops):
+    for _ in range(loops):
+        a = []
+        b = [a]
+        a.append(b)
+    gc.collect()
+
+
+class CountCalls(object):
+    def __init__(self):
+        self.calls = []
+
+    def enter(self):
+        self.calls.append('enter')
+
+    def exit(self, loops):
+        self.calls.append(('exit', loops))
+
+
+class GcStatsTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def run_worker(self, index):
+        filename = os.path.join(self.tmpdir, 'gc-%s.json' % index)
+        stats = GcStats(filename)
+        self.addCleanup(gc.callbacks.remove, stats._callback)
+        # collections outside the benchmark function are ignored
+        gc.collect()
+        wrap_func(create_cycles, [stats])(1000)
+        stats.save()
+        return filename
+
+    @unittest.skipIf(sys.version_info < (3, 3), 'need gc.callbacks')
+    def test_merge(self):
+        filenames = [self.run_worker(index) for index in range(2)]
+        metadata = merge_gc_stats(filenames)
+
+        self.assertGreaterEqual(int(metadata['gc_gen2_collections']), 2)
+        # 2 lists per loop, in each worker process
+        self.assertGreaterEqual(int(metadata['gc_gen2_collected']) +
+                                int(metadata.get('gc_gen0_collected', 0)) +
+                                int(metadata.get('gc_gen1_collected', 0)),
+                                3000)
+        self.assertGreater(float(metadata['gc_gen2_pause_total']), 0)
+        self.assertLessEqual(float(metadata['gc_gen2_pause_max']),
+                             float(metadata['gc_gen2_pause_total']))
+        ratio = float(metadata['gc_time_ratio'])
+        self.assertTrue(0 < ratio <= 1, ratio)
+
+    @unittest.skipIf(sys.version_info < (3, 3), 'need gc.callbacks')
+    def test_sample_func(self):
+        # bench_func(): instruments are enabled once per sample, outside the
+        # timed loop
+        loops = []
+        instrument = CountCalls()
+        sample_func = make_sample_func(loops.append, time.perf_counter)
+        dt = wrap_func(sample_func, [instrument], sample_func=True)(100, 'x')
+        self.assertEqual(loops, ['x'] * 100)
+        self.assertEqual(instrument.calls, ['enter', ('exit', 100)])
+        self.assertGreaterEqual(dt, 0)
+
+    def test_empty(self):
+        self.assertEqual(merge_gc_stats([]), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
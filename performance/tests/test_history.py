@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os.path
+import random
+import shutil
+import tempfile
+import unittest
+
+from performance import packed
+from performance.history import (ResultHistory, cmd_detect, find_changes,
+                                 load_paths, pack_samples, unpack_samples)
+
+
+def write_suite(filename, benchmarks, date, python_version='3.6.0'):
+    data = {'benchmarks': [], 'version': 4}
+    for name, samples in benchmarks.items():
+        metadata = {'name': name, 'date': date, 'hostname': 'bench-host',
+                    'python_version': python_version,
+                    'performance_version': '0.2.1'}
+        data['benchmarks'].append({'common_metadata': metadata,
+                                   'runs': [{'samples': samples}]})
+    with open(filename, 'w') as fp:
+        json.dump(data, fp)
+
+
+class HistoryTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.history = ResultHistory(os.path.join(self.tmpdir, 'history.db'))
+        self.addCleanup(self.history.close)
+
+    def write_suite(self, name, *args, **kw):
+        filename = os.path.join(self.tmpdir, name)
+        write_suite(filename, *args, **kw)
+        return filename
+
+    def test_pack_samples(self):
+        samples = [1.5, 0.25, 3.0]
+        self.assertEqual(unpack_samples(pack_samples(samples)), samples)
+
+    def test_import(self):
+        day1 = self.write_suite('day1.json',
+                                {'nbody': [1.0, 1.2, 1.1],
+                                 'float': [2.0, 2.0]},
+                                '2016-09-01T02:00:00')
+        day2 = self.write_suite('day2.json', {'nbody': [0.9, 1.0]},
+                                '2016-09-02T02:00:00', python_version='3.7')
+
+        self.assertEqual(self.history.import_file(day2), 1)
+        self.assertEqual(self.history.import_file(day1), 2)
+        # results are only imported once
+        self.assertEqual(self.history.import_file(day1), 0)
+
+        self.assertEqual(self.history.get_benchmark_names(),
+                         ['float', 'nbody'])
+
+        entries = self.history.get_series('nbody')
+        self.assertEqual([entry.date for entry in entries],
+                         ['2016-09-01 02:00:00', '2016-09-02 02:00:00'])
+        entry = entries[0]
+        self.assertEqual(entry.median, 1.1)
+        self.assertAlmostEqual(entry.stdev, 0.1)
+        self.assertEqual(entry.nsample, 3)
+        self.assertEqual(entry.get_samples(), [1.0, 1.2, 1.1])
+        self.assertEqual(entry.hostname, 'bench-host')
+        self.assertEqual(entry.filename, day1)
+
+        # filters
+        series = self.history.get_series('nbody', python_version='3.7')
+        self.assertEqual([entry.python_version for entry in series], ['3.7'])
+        series = self.history.get_series('nbody', since='2016-09-02')
+        self.assertEqual(len(series), 1)
+        series = self.history.get_series('nbody', until='2016-09-01')
+        self.assertEqual(len(series), 1)
+        series = self.history.get_series('nbody', until='2016-09')
+        self.assertEqual(len(series), 2)
+        self.assertEqual(self.history.get_series('nbody',
+                                                 hostname='other'), [])
+
+    def test_import_run_dates(self):
+        # the date is per-run metadata: worker processes have different
+        # dates, so it is not common metadata
+        runs = [{'metadata': {'date': '2016-09-01T02:00:%02d' % run},
+                 'samples': [1.0 + run / 10.0]}
+                for run in (3, 1, 2)]
+        data = {'benchmarks': [{'common_metadata': {'name': 'nbody'},
+                                'runs': runs}],
+                'version': 4}
+        for name in ('runs.json', 'runs' + packed.PACKED_SUFFIX):
+            filename = os.path.join(self.tmpdir, name)
+            packed.dump_data(data, filename)
+            # the file was copied after the benchmark
+            os.utime(filename, (0, 0))
+            self.history.import_file(filename)
+            runs.append({'metadata': {}, 'samples': [2.0]})
+
+        entries = self.history.get_series('nbody')
+        self.assertEqual([entry.date for entry in entries],
+                         ['2016-09-01 02:00:01'] * 2)
+
+    def test_find_changes(self):
+        rng = random.Random(4)
+        for day in range(40):
+            mean = 1.0 if day < 30 else 1.05
+            samples = [rng.gauss(mean, 0.005) for _ in range(3)]
+            self.write_suite('day%02d.json' % day, {'nbody': samples},
+                             '2016-09-%02dT02:00:00' % (day // 2 + 1))
+
+        history = load_paths([self.tmpdir])
+        self.addCleanup(history.close)
+        self.assertEqual(len(history.get_series('nbody')), 40)
+
+        changes = find_changes(history, window=12, alpha=0.001,
+                               min_change=0.01)
+        self.assertEqual(len(changes), 1)
+        change = changes[0]
+        self.assertTrue(change.is_regression())
+        self.assertAlmostEqual(change.ratio, 1.05, delta=0.01)
+        self.assertEqual(os.path.basename(change.entry.filename),
+                         'day30.json')
+        # already detected without the last result
+        self.assertFalse(change.new)
+
+        # only 2 results after the change before 2016-09-17: the change is
+        # detected thanks to the results since 2016-09-17
+        changes = find_changes(history, window=12, alpha=0.001,
+                               min_change=0.01, new_since='2016-09-17')
+        self.assertTrue(changes[0].new)
+
+    def detect(self, fail_since):
+        history = load_paths([self.tmpdir])
+        self.addCleanup(history.close)
+        options = argparse.Namespace(window=12, alpha=0.001, min_change=1.0,
+                                     since=None, fail_since=fail_since)
+        with contextlib.redirect_stdout(io.StringIO()) as stdout:
+            try:
+                cmd_detect(history, options)
+            except SystemExit as exc:
+                return (exc.code, stdout.getvalue())
+        return (0, stdout.getvalue())
+
+    def test_detect_nightly(self):
+        # nightly job: the regression of 2016-10-01 is detected with the
+        # result of 2016-10-06, its 6th result (window // 2)
+        rng = random.Random(5)
+        for day in range(36):
+            mean = 1.0 if day < 30 else 1.05
+            samples = [rng.gauss(mean, 0.005) for _ in range(3)]
+            date = datetime.date(2016, 9, 1) + datetime.timedelta(days=day)
+            self.write_suite('day%02d.json' % day, {'nbody': samples},
+                             date.isoformat() + 'T02:00:00')
+
+        exitcode, stdout = self.detect('2016-10-06')
+        self.assertEqual(exitcode, 1, stdout)
+        self.assertIn('since 2016-10-01 02:00:00 [new]', stdout)
+
+        # the next night, the regression was already detected
+        self.write_suite('day36.json', {'nbody': [1.05, 1.05, 1.05]},
+                         '2016-10-07T02:00:00')
+        exitcode, stdout = self.detect('2016-10-07')
+        self.assertEqual(exitcode, 0, stdout)
+        self.assertIn('since 2016-10-01 02:00:00', stdout)
+        self.assertNotIn('[new]', stdout)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import sys
+import unittest
+
+from performance.importtime import (ImportTimes, diff_modules,
+                                    importtime_to_metadata, parse_importtime,
+                                    run_importtime)
+from performance.run import measure_import_times
+
+
+OUTPUT = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:        50 |        300 | encodings
+import time:        30 |         30 |     encodings.aliases
+"""
+
+
+class ImportTimeTests(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(parse_importtime(OUTPUT),
+                         {'_io': (120, 120),
+                          'encodings': (50, 300),
+                          'encodings.aliases': (30, 30)})
+
+    def test_metadata(self):
+        metadata = importtime_to_metadata(parse_importtime(OUTPUT))
+        self.assertEqual(metadata['importtime_total'], '200')
+        self.assertEqual(metadata['importtime_modules'],
+                         '_io 120 120; encodings 50 300; '
+                         'encodings.aliases 30 30')
+        times = ImportTimes.from_metadata(metadata)
+        self.assertEqual(times.total, 200)
+        self.assertEqual(times.modules['encodings'], (50, 300))
+
+        self.assertEqual(importtime_to_metadata({}), {})
+        self.assertIsNone(ImportTimes.from_metadata({}))
+
+    def test_diff(self):
+        base = ImportTimes(150, {'_io': (120, 120), 'encodings': (30, 30)})
+        changed = ImportTimes(300, {'_io': (100, 100), 'encodings': (30, 30),
+                                    'json': (170, 170)})
+        self.assertEqual(diff_modules(base, changed),
+                         [('json', 0, 170), ('_io', 120, 100),
+                          ('encodings', 30, 30)])
+
+    @unittest.skipIf(sys.version_info < (3, 7), 'need -X importtime')
+    def test_run(self):
+        modules = run_importtime([sys.executable, '-c', 'import json'],
+                                 dict(os.environ), runs=2)
+        self.assertIn('json', modules)
+
+    @unittest.skipIf(sys.version_info < (3, 7), 'need -X importtime')
+    def test_measure_import_times(self):
+        class Bench(object):
+            metadata = {}
+
+            def update_metadata(self, metadata):
+                self.metadata.update(metadata)
+
+        def func(python, options):
+            pass
+
+        func._importtime_args = []
+        options = argparse.Namespace(inherit_env=[], benchmark_name='startup')
+        # the arguments of the command prefix (-a option) are kept
+        bench = Bench()
+        measure_import_times(func, [sys.executable, '-S'], options, bench)
+        import_times = ImportTimes.from_metadata(bench.metadata)
+        self.assertNotIn('site', import_times.modules)
+        self.assertGreater(import_times.total, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
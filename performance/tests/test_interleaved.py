@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import unittest
+
+import perf
+
+from performance.run import run_interleaved
+
+
+def make_bench(python, loops):
+    data = {'benchmarks': [{'common_metadata': {'name': 'nbody',
+                                                'loops': loops},
+                            'runs': [{'samples': [float(len(python))]}]}],
+            'version': 4}
+    return perf.Benchmark.loads(json.dumps(data))
+
+
+class InterleavedTests(unittest.TestCase):
+    def test_order(self):
+        calls = []
+
+        def func(python, options):
+            calls.append((python[0], options.processes, options.loops))
+            return make_bench(python, 16)
+
+        options = argparse.Namespace(processes=3, loops=None)
+        base, changed = run_interleaved(func, ['base'], ['changed', '-E'],
+                                        options)
+
+        # ABAB...: one worker process per call, the loops calibrated by the
+        # first process are reused by all processes
+        self.assertEqual(calls, [('base', 1, None), ('changed', 1, None),
+                                 ('base', 1, 16), ('changed', 1, 16),
+                                 ('base', 1, 16), ('changed', 1, 16)])
+        self.assertEqual(base.get_samples(), [1.0] * 3)
+        self.assertEqual(changed.get_samples(), [2.0] * 3)
+        # the options of the caller are unchanged
+        self.assertEqual(options.processes, 3)
+        self.assertIsNone(options.loops)
+
+    def test_merge_metadata(self):
+        # rusage and memory metadata differ between worker processes
+        steps = iter(range(1, 7))
+
+        def func(python, options):
+            step = next(steps)
+            bench = make_bench(python, 16)
+            bench.update_metadata({'cpu_user_time': '%.6f' % step,
+                                   'cpu_system_time': '0.000000',
+                                   'page_faults_minor': str(step),
+                                   'page_faults_major': '0',
+                                   'ctx_switches_voluntary': '1',
+                                   'ctx_switches_involuntary': '0',
+                                   'mem_max_rss': str(step * 1024)})
+            return bench
+
+        options = argparse.Namespace(processes=3, loops=None)
+        base, changed = run_interleaved(func, ['base'], ['changed'], options)
+
+        metadata = base.get_metadata()
+        self.assertAlmostEqual(float(metadata['cpu_user_time']), 9.0)
+        self.assertEqual(int(metadata['page_faults_minor']), 9)
+        self.assertEqual(int(metadata['ctx_switches_voluntary']), 3)
+        self.assertEqual(int(metadata['mem_max_rss']), 5 * 1024)
+        metadata = changed.get_metadata()
+        self.assertAlmostEqual(float(metadata['cpu_user_time']), 12.0)
+        self.assertEqual(int(metadata['mem_max_rss']), 6 * 1024)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import perf
+
+from performance.journal import Journal
+from performance.run import run_benchmarks
+
+
+def make_bench(name, samples):
+    data = {'benchmarks': [{'common_metadata': {'name': name},
+                            'runs': [{'samples': samples}]}],
+            'version': 4}
+    return perf.Benchmark.loads(json.dumps(data))
+
+
+class JournalTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        filename = os.path.join(self.tmpdir, 'results.json')
+        self.journal = Journal(Journal.get_path(filename))
+
+    def test_record_load(self):
+        self.assertFalse(self.journal.exists())
+        self.assertEqual(self.journal.load(), {})
+
+        self.journal.record('nbody', make_bench('nbody', [1.0, 1.5]))
+        self.journal.record('float', make_bench('float', [2.0]))
+        # temporary file of an interrupted write
+        with open(os.path.join(self.journal.path, 'json_dumps.json.tmp'),
+                  'w') as fp:
+            fp.write('{"benchmarks": [')
+
+        completed = self.journal.load()
+        self.assertEqual(sorted(completed), ['float', 'nbody'])
+        bench = completed['nbody'].get_benchmarks()[0]
+        self.assertEqual(bench.get_samples(), [1.0, 1.5])
+
+        self.journal.remove()
+        self.assertFalse(self.journal.exists())
+
+    def test_resume(self):
+        # first run interrupted after nbody completed
+        self.journal.record('nbody', make_bench('nbody', [1.0]))
+
+        called = []
+
+        def bench_func(name):
+            def func(python, options):
+                called.append(name)
+                return make_bench(name, [2.0])
+            return func
+
+        bench_funcs = dict((name, bench_func(name))
+                           for name in ('float', 'nbody'))
+        options = argparse.Namespace(jobs=1, affinity=None,
+                                     process_plan=None, timeout=None,
+                                     deadline=None, target_precision=None,
+                                     profile=None, flamegraph=None,
+                                     trace_alloc=False)
+        suites, errors = run_benchmarks(bench_funcs, ['float', 'nbody'],
+                                        ['python'], options,
+                                        on_result=self.journal.record,
+                                        completed=self.journal.load())
+
+        # nbody is loaded from the journal, not run again
+        self.assertEqual(called, ['float'])
+        self.assertEqual(errors, [])
+        benchmarks = suites[0].get_benchmarks()
+        self.assertEqual([bench.get_name() for bench in benchmarks],
+                         ['float', 'nbody'])
+        self.assertEqual(benchmarks[1].get_samples(), [1.0])
+        self.assertEqual(sorted(self.journal.load()), ['float', 'nbody'])
+
+
+if __name__ == "__main__":
+    unittest.main()
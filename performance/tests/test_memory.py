@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+import subprocess
+import sys
+import unittest
+
+from performance import memory
+
+
+class MemoryTests(unittest.TestCase):
+    def test_downsample(self):
+        timeline = [(float(index), index % 7) for index in range(1000)]
+        result = memory.downsample(timeline, 10)
+        self.assertEqual(len(result), 10)
+        # the maximum of each bucket is kept
+        self.assertEqual([rss for timestamp, rss in result], [6] * 10)
+
+        short = timeline[:5]
+        self.assertEqual(memory.downsample(short, 10), short)
+
+    def test_parse_timeline(self):
+        self.assertEqual(memory.parse_timeline('0.00:1024 0.10:2048'),
+                         [(0.0, 1024), (0.1, 2048)])
+
+    def test_merge_metadata(self):
+        metadata = memory.merge_metadata([
+            {'mem_max_rss': '2048', 'mem_rss_timeline': '0.00:1 1.00:2'},
+            {'mem_max_rss': '4096', 'mem_rss_timeline': '0.00:4 0.50:3'},
+            {}])
+        self.assertEqual(metadata['mem_max_rss'], '4096')
+        self.assertEqual(memory.parse_timeline(metadata['mem_rss_timeline']),
+                         [(0.0, 1), (1.0, 2), (1.0, 4), (1.5, 3)])
+        self.assertEqual(memory.merge_metadata([{}]), {})
+
+    @unittest.skipUnless(memory.is_supported(), 'need /proc')
+    def test_tracker(self):
+        code = ('import subprocess, sys; '
+                'subprocess.call([sys.executable, "-c", '
+                '"x = bytearray(32 * 1024 * 1024); '
+                'import time; time.sleep(0.3)"])')
+        tracker = memory.MemoryTracker(interval=0.01)
+        proc = subprocess.Popen([sys.executable, '-c', code])
+        tracker.start(proc)
+        proc.wait()
+        tracker.stop(None)
+
+        metadata = tracker.get_metadata()
+        self.assertGreaterEqual(int(metadata['mem_max_rss']),
+                                32 * 1024 * 1024)
+        self.assertTrue(memory.parse_timeline(metadata['mem_rss_timeline']))
+
+
+if __name__ == "__main__":
+    unittest.main()
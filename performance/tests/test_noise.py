@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+import argparse
+import contextlib
+import io
+import json
+import math
+import os.path
+import shutil
+import sys
+import tempfile
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    # Python 2: mock is a third-party package
+    try:
+        import mock
+    except ImportError:
+        mock = None
+
+from performance import cli, noise
+from performance.compare import CompareMultipleRuns
+
+
+class NoiseTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def test_estimate_threshold(self):
+        self.assertEqual(noise.estimate_threshold([1.0, 1.0, 1.0]), 0.0)
+        # stdev of the logarithms: 0.01
+        medians = [math.exp(0.01), 1.0, math.exp(-0.01)]
+        self.assertAlmostEqual(noise.estimate_threshold(medians),
+                               math.expm1(1.959963984540054 * 0.01
+                                          * math.sqrt(2)))
+        self.assertRaises(ValueError, noise.estimate_threshold, [1.0])
+
+    def test_calibrate_files(self):
+        filenames = []
+        for run, scale in enumerate((1.0, 1.002, 0.999, 1.001)):
+            benchmarks = [{'common_metadata': {'name': 'nbody'},
+                           'runs': [{'samples': [0.5 * scale, 0.5 * scale]}]},
+                          {'common_metadata': {'name': 'pathlib'},
+                           'runs': [{'samples': [0.1 * scale ** 20]}]}]
+            if run < 2:
+                benchmarks.append({'common_metadata': {'name': 'float'},
+                                   'runs': [{'samples': [1.0]}]})
+            filename = os.path.join(self.tmpdir, 'run%s.json' % run)
+            with open(filename, 'w') as fp:
+                json.dump({'benchmarks': benchmarks, 'version': 4}, fp)
+            filenames.append(filename)
+
+        medians = noise.load_medians(filenames)
+        self.assertEqual(len(medians['nbody']), 4)
+        thresholds = noise.estimate_noise(medians)
+        # float only has 2 runs
+        self.assertEqual(sorted(thresholds), ['nbody', 'pathlib'])
+        self.assertLess(thresholds['nbody'], 0.01)
+        self.assertGreater(thresholds['pathlib'], 0.02)
+
+        filename = os.path.join(self.tmpdir, 'noise.json')
+        noise.dump_noise(filename, thresholds, medians)
+        self.assertEqual(noise.load_noise(filename), thresholds)
+
+    def test_compare_threshold(self):
+        base = [1.0, 1.001, 0.999, 1.0005, 0.9995] * 4
+        changed = [value * 0.995 for value in base]
+        options = argparse.Namespace(stats='mannwhitney',
+                                     noise_thresholds={'nbody': 0.003},
+                                     benchmark_name='nbody')
+        # 0.5% faster: larger than the noise threshold
+        result = CompareMultipleRuns(base, changed, options)
+        self.assertTrue(result.always_display)
+
+        # benchmark not calibrated: changes smaller than 1% are ignored
+        options.benchmark_name = 'pathlib'
+        result = CompareMultipleRuns(base, changed, options)
+        self.assertFalse(result.always_display)
+        self.assertIsNone(result.pvalue)
+
+    @unittest.skipIf(mock is None, 'need mock')
+    @unittest.skipIf(sys.version_info < (3, 5),
+                     'need contextlib.redirect_stderr')
+    def test_run_aa_options(self):
+        # calibrate-noise checks the options like the run command
+        for args in (['--timeout', '0'],
+                     ['--gc-stats', '--track_memory'],
+                     ['--auto-warmups', '5', '--track_memory'],
+                     ['--jobs', '0']):
+            argv = ['pyperformance', 'calibrate-noise'] + args
+            with mock.patch('sys.argv', argv):
+                parser, options = cli.parse_args()
+            stderr = io.StringIO()
+            with contextlib.redirect_stderr(stderr):
+                with self.assertRaises(SystemExit):
+                    noise.run_aa(parser, options, {}, {})
+            self.assertIn('error:', stderr.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
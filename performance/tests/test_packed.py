@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+import json
+import os.path
+import shutil
+import tempfile
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    # Python 2: mock is a third-party package
+    try:
+        import mock
+    except ImportError:
+        mock = None
+
+from performance import packed
+
+
+def suite_data():
+    benchmarks = []
+    for name, samples in (('nbody', [0.125, 0.13, 0.1275]),
+                          ('float', [1.5, 1.25])):
+        metadata = {'name': name, 'hostname': 'bench-host',
+                    'python_version': '3.6.0', 'loops': 8}
+        runs = [{'samples': samples[:1], 'warmups': [0.2],
+                 'metadata': {'date': '2016-09-01T02:00:00', 'load': 0.5}},
+                {'samples': samples[1:],
+                 'metadata': {'date': '2016-09-01T02:00:00', 'load': 0.25}}]
+        benchmarks.append({'common_metadata': metadata, 'runs': runs})
+    return {'benchmarks': benchmarks, 'version': 4}
+
+
+class PackedTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def test_encode(self):
+        data = suite_data()
+        data['$ref'] = {'$f': [1.0], 'nested': [{'$m': 1}]}
+        skeleton, metadata, floats = packed.encode(data)
+        # run metadata are shared by the two benchmarks
+        self.assertEqual(len(metadata), 2 + 2 + 1)
+        self.assertEqual(len(floats), 3 + 2 + 2 + 1)
+        self.assertEqual(packed.decode(skeleton, metadata, floats), data)
+
+    def test_dump_load(self):
+        data = suite_data()
+        filename = os.path.join(self.tmpdir, 'results.pack')
+        packed.dump(data, filename)
+        self.assertTrue(packed.is_packed(filename))
+        self.assertEqual(packed.load(filename), data)
+        # array fallback when memoryview.cast() is not available (always
+        # used on Python 2)
+        if mock is not None:
+            with mock.patch.object(packed, '_CAST_FLOATS', False):
+                self.assertEqual(packed.load(filename), data)
+
+        # timings have 16 or 17 significant digits in JSON
+        data['benchmarks'][0]['runs'] = [
+            {'samples': [0.1 + (run * 3 + index) / 997.0
+                         for index in range(3)]}
+            for run in range(20)]
+        packed.dump(data, filename)
+        json_filename = os.path.join(self.tmpdir, 'results.json')
+        packed.dump_json(data, json_filename)
+        self.assertFalse(packed.is_packed(json_filename))
+        self.assertLess(os.path.getsize(filename),
+                        os.path.getsize(json_filename))
+
+    def test_json_gz(self):
+        data = suite_data()
+        filename = os.path.join(self.tmpdir, 'results.json.gz')
+        packed.dump_json(data, filename)
+        self.assertEqual(packed.load_json(filename), data)
+
+    def test_packed_suite(self):
+        filename = os.path.join(self.tmpdir, 'results.pack')
+        packed.dump(suite_data(), filename)
+
+        suite = packed.load_suite(filename)
+        self.assertEqual(suite.filename, filename)
+        self.assertEqual(suite.get_benchmark_names(), ['nbody', 'float'])
+        bench = suite.get_benchmark('nbody')
+        self.assertEqual(bench.get_samples(), [0.125, 0.13, 0.1275])
+        self.assertEqual(bench.get_nrun(), 2)
+        metadata = bench.get_metadata()
+        self.assertEqual(metadata['loops'], 8)
+        self.assertEqual(metadata['date'], '2016-09-01T02:00:00')
+        self.assertNotIn('load', metadata)
+        self.assertRaises(KeyError, suite.get_benchmark, 'unknown')
+
+    def test_not_packed(self):
+        filename = os.path.join(self.tmpdir, 'results.json')
+        with open(filename, 'w') as fp:
+            json.dump(suite_data(), fp)
+        self.assertRaises(ValueError, packed.load, filename)
+
+
+if __name__ == "__main__":
+    unittest.main()
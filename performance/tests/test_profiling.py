@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+import cProfile
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from performance.instrument import StackSampler, wrap_func
+from performance.profiling import (diff_profiles, list_profiles,
+                                   parse_collapsed, render_flamegraph)
+
+
+def fast():
+    return sum(range(100))
+
+
+def slow():
+    return sum(range(100000))
+
+
+def bench(func):
+    for _ in range(20):
+        func()
+
+
+class ProfilingTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def profile(self, name, func):
+        filename = os.path.join(self.tmpdir, name + '.pstats')
+        profiler = cProfile.Profile()
+        profiler.runcall(bench, func)
+        profiler.dump_stats(filename)
+        return filename
+
+    def test_list_profiles(self):
+        filename = self.profile('richards', fast)
+        self.assertEqual(list_profiles(self.tmpdir), {'richards': filename})
+        self.assertEqual(list_profiles(filename), {'richards': filename})
+
+    def test_diff(self):
+        base = self.profile('base', fast)
+        changed = self.profile('changed', slow)
+        diff = diff_profiles(base, changed)
+
+        funcs = [item[0] for item in diff]
+        self.assertIn('test_profiling.py:%s(fast)'
+                      % fast.__code__.co_firstlineno, funcs)
+        self.assertIn('test_profiling.py:%s(slow)'
+                      % slow.__code__.co_firstlineno, funcs)
+
+        # the benchmark function runs during the whole profile
+        func, base_time, changed_time = [
+            item for item in diff if item[0].endswith('(bench)')][0]
+        self.assertAlmostEqual(base_time, 1.0, places=1)
+        self.assertAlmostEqual(changed_time, 1.0, places=1)
+
+        # the biggest changes come first
+        changes = [abs(item[2] - item[1]) for item in diff]
+        self.assertEqual(changes, sorted(changes, reverse=True))
+
+
+def busy(duration):
+    start = time.time()
+    while time.time() - start < duration:
+        pass
+
+
+class FlameGraphTests(unittest.TestCase):
+    def test_sampler(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        filename = os.path.join(tmpdir, 'busy.collapsed')
+
+        sampler = StackSampler(filename, 0.001)
+        wrap_func(busy, [sampler])(0.2)
+        sampler.save()
+
+        with open(filename) as fp:
+            stacks = parse_collapsed(fp)
+        self.assertTrue(stacks)
+        for stack in stacks:
+            # frames of the wrapper and its callers are omitted
+            self.assertTrue(stack[0].startswith('busy (test_profiling.py:'),
+                            stack)
+
+    def test_parse_collapsed(self):
+        stacks = parse_collapsed(['main;a 3\n', 'main;b 1\n', 'main;a 2\n'])
+        self.assertEqual(stacks, {('main', 'a'): 5, ('main', 'b'): 1})
+
+    def test_render(self):
+        stacks = {('main', 'a'): 3, ('main', 'b<x>'): 1}
+        svg = render_flamegraph(stacks, 'title')
+        self.assertIn('<svg', svg)
+        self.assertIn('main (4 samples, 100.00%)', svg)
+        self.assertIn('b&lt;x&gt; (1 samples, 25.00%)', svg)
+
+        # differential flame graph
+        svg = render_flamegraph(stacks, 'title', {('main', 'a'): 1,
+                                                  ('main', 'b<x>'): 1})
+        self.assertIn('a (3 samples, 75.00%), base: 50.00%', svg)
+        # a grew: red
+        self.assertIn('fill="rgb(255,55,55)"', svg)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from performance import resultlog
+
+
+def run_data(samples, date, **metadata):
+    benchmarks = []
+    for name in sorted(samples):
+        common = {'name': name, 'date': date}
+        common.update(metadata)
+        benchmarks.append({'common_metadata': common,
+                           'runs': [{'samples': samples[name]}]})
+    return {'benchmarks': benchmarks, 'version': 4}
+
+
+class ResultLogTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.filename = os.path.join(self.tmpdir, 'results.jsonl')
+
+    def count_lines(self):
+        with open(self.filename, 'rb') as fp:
+            return len(fp.readlines())
+
+    def test_merge(self):
+        data = run_data({'nbody': [1.0, 1.1]}, '2016-09-01', loops=8)
+        resultlog.merge(data, run_data({'nbody': [1.2], 'float': [2.0]},
+                                       '2016-09-02', loops=8))
+        self.assertEqual([bench['common_metadata']['name']
+                          for bench in data['benchmarks']],
+                         ['nbody', 'float'])
+        nbody = data['benchmarks'][0]
+        self.assertEqual(nbody['common_metadata'],
+                         {'name': 'nbody', 'loops': 8})
+        self.assertEqual(nbody['runs'],
+                         [{'samples': [1.0, 1.1],
+                           'metadata': {'date': '2016-09-01'}},
+                          {'samples': [1.2],
+                           'metadata': {'date': '2016-09-02'}}])
+
+    def test_append(self):
+        first = run_data({'nbody': [1.0]}, '2016-09-01')
+        self.assertFalse(resultlog.append(self.filename, first))
+        self.assertTrue(resultlog.is_log(self.filename))
+        self.assertEqual(resultlog.load(self.filename), first)
+
+        for day in range(2, 5):
+            resultlog.append(self.filename,
+                             run_data({'nbody': [float(day)]},
+                                      '2016-09-%02d' % day))
+        # header + one record per run
+        self.assertEqual(self.count_lines(), 5)
+
+        data = resultlog.load(self.filename)
+        runs = data['benchmarks'][0]['runs']
+        self.assertEqual([run['samples'] for run in runs],
+                         [[1.0], [2.0], [3.0], [4.0]])
+
+    def test_compact(self):
+        for day in range(1, 4):
+            compacted = resultlog.append(
+                self.filename,
+                run_data({'nbody': [float(day)]}, '2016-09-%02d' % day),
+                compact_min_size=0)
+        # the third record doubles the size of the records
+        self.assertTrue(compacted)
+        self.assertEqual(self.count_lines(), 2)
+        runs = resultlog.load(self.filename)['benchmarks'][0]['runs']
+        self.assertEqual([run['samples'] for run in runs],
+                         [[1.0], [2.0], [3.0]])
+
+    def test_interrupted_write(self):
+        resultlog.append(self.filename, run_data({'nbody': [1.0]}, 'day1'))
+        with open(self.filename, 'ab') as fp:
+            fp.write(b'{"benchmarks":[{"com')
+        resultlog.append(self.filename, run_data({'nbody': [2.0]}, 'day2'))
+
+        runs = resultlog.load(self.filename)['benchmarks'][0]['runs']
+        self.assertEqual([run['samples'] for run in runs], [[1.0], [2.0]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+import signal
+import subprocess
+import sys
+import unittest
+
+from performance import rusage
+
+
+BURN_CPU = """\
+import os, sys
+start = os.times()[0]
+while os.times()[0] - start < 0.1:
+    pass
+sys.exit(3)
+"""
+
+
+class ResourceUsageTests(unittest.TestCase):
+    def test_add_rusage(self):
+        usage1 = dict((field, 1) for field in rusage.RUSAGE_FIELDS)
+        usage2 = dict((field, 2) for field in rusage.RUSAGE_FIELDS)
+        usage2['ru_utime'] = 0.5
+        usage = rusage.add_rusage(usage1, usage2)
+        self.assertEqual(usage['ru_utime'], 1.5)
+        self.assertEqual(usage['ru_nivcsw'], 3)
+        self.assertEqual(sorted(usage), sorted(rusage.RUSAGE_FIELDS))
+
+        metadata = rusage.rusage_to_metadata(usage)
+        self.assertEqual(metadata['cpu_user_time'], '1.500000')
+        self.assertEqual(metadata['ctx_switches_involuntary'], '3')
+
+    def test_merge_metadata(self):
+        usage = dict((field, 1) for field in rusage.RUSAGE_FIELDS)
+        metadata = rusage.rusage_to_metadata(usage)
+        self.assertEqual(rusage.metadata_to_rusage(metadata), usage)
+
+        merged = rusage.merge_metadata([metadata, metadata])
+        self.assertEqual(merged['cpu_system_time'], '2.000000')
+        self.assertEqual(merged['page_faults_minor'], '2')
+        # the resource usage of a benchmark is unknown
+        self.assertEqual(rusage.merge_metadata([metadata, {}]), {})
+
+    @unittest.skipUnless(rusage.is_supported(), 'need os.wait4()')
+    def test_wait_process(self):
+        proc = subprocess.Popen([sys.executable, '-c', BURN_CPU])
+        usage = rusage.wait_process(proc)
+        self.assertEqual(proc.returncode, 3)
+        self.assertGreater(usage['ru_utime'] + usage['ru_stime'], 0.05)
+
+        proc = subprocess.Popen([sys.executable, '-c',
+                                 'import os, signal; '
+                                 'os.kill(os.getpid(), signal.SIGKILL)'])
+        rusage.wait_process(proc)
+        self.assertEqual(proc.returncode, -signal.SIGKILL)
+
+
+if __name__ == "__main__":
+    unittest.main()
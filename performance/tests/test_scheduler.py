@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import unittest
+
+from performance import scheduler as scheduler_module
+from performance.scheduler import (BenchmarkScheduler, format_cpu_list,
+                                   parse_cpu_list, split_cpus)
+from performance.watchdog import Watchdog, new_process_group_kwargs
+
+
+class Options(object):
+    affinity = None
+
+
+class CpuListTests(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(parse_cpu_list('0-3,8,10-11'),
+                         [0, 1, 2, 3, 8, 10, 11])
+        self.assertEqual(parse_cpu_list('3,1,1'), [1, 3])
+        self.assertRaises(ValueError, parse_cpu_list, '3-1')
+        self.assertRaises(ValueError, parse_cpu_list, '')
+
+    def test_format(self):
+        self.assertEqual(format_cpu_list([0, 1, 2, 5, 7, 8]), '0-2,5,7-8')
+        self.assertEqual(format_cpu_list([4]), '4')
+
+    def test_split(self):
+        self.assertEqual(split_cpus(list(range(8)), 4),
+                         [[0, 1], [2, 3], [4, 5], [6, 7]])
+        # extra CPUs are left unused
+        self.assertEqual(split_cpus(list(range(5)), 2), [[0, 1], [2, 3]])
+        self.assertRaises(ValueError, split_cpus, [0, 1], 3)
+
+
+class SchedulerTests(unittest.TestCase):
+    def test_parallel_order(self):
+        lock = threading.Lock()
+        completed = []
+
+        def task(name, delay):
+            def func(options):
+                time.sleep(delay)
+                with lock:
+                    completed.append(name)
+                return (name, options.affinity, options.benchmark_name)
+            return (name, func)
+
+        tasks = [task('a', 0.3), task('b', 0.0), task('c', 0.0)]
+        scheduler = BenchmarkScheduler([[0, 1], [2, 3]])
+        results = scheduler.run(tasks, Options())
+
+        # results are in the order of tasks, not in the completion order
+        self.assertEqual([result[0] for result in results], ['a', 'b', 'c'])
+        self.assertEqual(completed[-1], 'a')
+        self.assertEqual(results[0][1], '0-1')
+        self.assertEqual(results[1][1], '2-3')
+        self.assertEqual([result[2] for result in results], ['a', 'b', 'c'])
+
+    def test_error(self):
+        def fail(options):
+            raise RuntimeError("Benchmark died")
+
+        tasks = [('ok', lambda options: 1), ('fail', fail)]
+        scheduler = BenchmarkScheduler([[0], [1]])
+        self.assertRaises(RuntimeError, scheduler.run, tasks, Options())
+
+    def test_result_after_timeout(self):
+        nthread = threading.active_count()
+        real_queue = scheduler_module.queue
+
+        class LateQueue(real_queue.Queue):
+            # The first get() with a timeout times out just before the jobs
+            # put their results and exit
+            timed_out = False
+
+            def get(self, block=True, timeout=None):
+                if timeout is not None and not LateQueue.timed_out:
+                    LateQueue.timed_out = True
+                    while threading.active_count() > nthread:
+                        time.sleep(0.01)
+                    raise real_queue.Empty
+                return real_queue.Queue.get(self, block, timeout)
+
+        class FakeQueueModule(object):
+            Queue = LateQueue
+            Empty = real_queue.Empty
+
+        scheduler_module.queue = FakeQueueModule
+        self.addCleanup(setattr, scheduler_module, 'queue', real_queue)
+
+        names = []
+        tasks = [('a', lambda options: 1), ('b', lambda options: 2)]
+        scheduler = BenchmarkScheduler([[0], [1]])
+        results = scheduler.run(tasks, Options(),
+                                lambda name, result: names.append(name))
+        self.assertTrue(LateQueue.timed_out)
+        self.assertEqual(results, [1, 2])
+        self.assertEqual(sorted(names), ['a', 'b'])
+
+    @unittest.skipUnless(os.name == 'posix', 'need process groups')
+    def test_interrupt(self):
+        procs = []
+        returncodes = []
+        done = threading.Event()
+
+        def hang(options):
+            proc = subprocess.Popen([sys.executable, '-c',
+                                     'import time; time.sleep(60)'],
+                                    **new_process_group_kwargs())
+            procs.append(proc)
+            watchdog = Watchdog(60.0)
+            watchdog.start(proc)
+            try:
+                returncodes.append(proc.wait())
+            finally:
+                watchdog.stop()
+                done.set()
+
+        def interrupt(name, result):
+            # CTRL+c in the main thread while the other job is running
+            while not procs:
+                time.sleep(0.01)
+            raise KeyboardInterrupt
+
+        tasks = [('ok', lambda options: 1), ('hang', hang)]
+        scheduler = BenchmarkScheduler([[0], [1]])
+        self.assertRaises(KeyboardInterrupt,
+                          scheduler.run, tasks, Options(), interrupt)
+        # the process group of the running benchmark was killed: only the
+        # job thread waits for the process
+        self.assertTrue(done.wait(10.0))
+        self.assertEqual(returncodes, [-signal.SIGKILL])
+
+
+if __name__ == "__main__":
+    unittest.main()
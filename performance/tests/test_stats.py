@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+from __future__ import division
+
+import math
+import random
+import unittest
+
+from performance import stats
+
+
+class StatsTests(unittest.TestCase):
+    def test_median(self):
+        self.assertEqual(stats.median([3, 1, 2]), 2)
+        self.assertEqual(stats.median([4, 1, 2, 3]), 2.5)
+        self.assertRaises(ValueError, stats.median, [])
+
+    def test_geometric_mean(self):
+        self.assertAlmostEqual(stats.geometric_mean([2.0, 8.0]), 4.0)
+        self.assertAlmostEqual(stats.geometric_mean([0.5, 2.0]), 1.0)
+        self.assertRaises(ValueError, stats.geometric_mean, [])
+        self.assertAlmostEqual(stats.geometric_mean([2.0, 8.0], [3, 0]), 2.0)
+        self.assertRaises(ValueError, stats.geometric_mean, [2.0], [0])
+
+    def test_normal(self):
+        self.assertAlmostEqual(stats.normal_ppf(0.975), 1.959964, places=6)
+        self.assertAlmostEqual(stats.normal_ppf(0.005), -2.575829, places=6)
+        self.assertAlmostEqual(stats.normal_cdf(1.959964), 0.975, places=6)
+
+    def test_median_confidence_interval(self):
+        values = list(range(1, 101))
+        low, high = stats.median_confidence_interval(values)
+        self.assertLess(low, stats.median(values))
+        self.assertGreater(high, stats.median(values))
+        self.assertEqual((low, high), (41, 61))
+
+    def test_relative_precision(self):
+        rng = random.Random(5)
+        narrow = [rng.gauss(10.0, 0.01) for index in range(200)]
+        wide = [rng.gauss(10.0, 1.0) for index in range(200)]
+        self.assertLess(stats.relative_precision(narrow), 0.001)
+        self.assertGreater(stats.relative_precision(wide), 0.01)
+
+    def test_student_t_pvalue(self):
+        self.assertAlmostEqual(stats.student_t_pvalue(2.228139, 10), 0.05,
+                               places=6)
+        self.assertAlmostEqual(stats.student_t_pvalue(-2.228139, 10), 0.05,
+                               places=6)
+        self.assertAlmostEqual(stats.student_t_pvalue(0, 5), 1.0)
+
+    def test_adjust_pvalues(self):
+        pvalues = [0.01, 0.04, 0.03, 0.005]
+        self.assertEqual(stats.adjust_pvalues(pvalues, 'none'), pvalues)
+        for method, expected in (('holm', [0.03, 0.06, 0.06, 0.02]),
+                                 ('bh', [0.02, 0.04, 0.04, 0.02])):
+            adjusted = stats.adjust_pvalues(pvalues, method)
+            for pvalue, expected_pvalue in zip(adjusted, expected):
+                self.assertAlmostEqual(pvalue, expected_pvalue)
+        self.assertEqual(stats.adjust_pvalues([0.5, 0.9], 'holm'),
+                         [1.0, 1.0])
+        self.assertEqual(stats.adjust_pvalues([], 'bh'), [])
+
+    def test_mann_whitney_u(self):
+        values1 = [1, 2, 3, 4, 5]
+        values2 = [6, 7, 8, 9, 10]
+        u, pvalue = stats.mann_whitney_u(values1, values2)
+        self.assertEqual(u, 0)
+        self.assertLess(pvalue, 0.05)
+
+        u, pvalue = stats.mann_whitney_u(values1, values1)
+        self.assertEqual(u, 12.5)
+        self.assertAlmostEqual(pvalue, 1.0)
+
+        # all values tied
+        self.assertEqual(stats.mann_whitney_u([1, 1], [1, 1]), (2.0, 1.0))
+
+    def test_bootstrap_ratio(self):
+        rng = random.Random(5)
+        values1 = [rng.gauss(1.0, 0.02) for _ in range(50)]
+        values2 = [value * 1.05 for value in values1]
+
+        low, high, pvalue = stats.bootstrap_ratio(values1, values2)
+        self.assertTrue(low < 1.05 < high, (low, high))
+        self.assertGreater(low, 1.0)
+        self.assertLess(pvalue, 0.05)
+        # reproducible
+        self.assertEqual(stats.bootstrap_ratio(values1, values2),
+                         (low, high, pvalue))
+
+        # no resample below 1: smallest p-value
+        self.assertEqual(pvalue, 1 / (stats.BOOTSTRAP_RESAMPLES + 1))
+        low, high, pvalue = stats.bootstrap_ratio(values1, values2,
+                                                  resamples=99)
+        self.assertEqual(pvalue, 0.01)
+
+        low, high, pvalue = stats.bootstrap_ratio(values1, values1[::-1])
+        self.assertTrue(low <= 1.0 <= high, (low, high))
+        self.assertEqual(pvalue, 1.0)
+
+    def test_bootstrap_log_ratio(self):
+        rng = random.Random(5)
+        values = [rng.gauss(1.0, 0.02) for _ in range(20)]
+        point, log_ratios = stats.bootstrap_log_ratio(
+            values, [value * 2 for value in values], resamples=100)
+        self.assertAlmostEqual(point, math.log(2))
+        self.assertEqual(len(log_ratios), 100)
+        self.assertTrue(min(log_ratios) < point < max(log_ratios))
+        self.assertRaises(ValueError, stats.bootstrap_log_ratio, [], values)
+
+    def test_combine_log_ratios(self):
+        rng = random.Random(5)
+        base = [[rng.gauss(1.0, 0.02) for _ in range(20)] for _ in range(3)]
+        bootstraps = [stats.bootstrap_log_ratio(values,
+                                                [value * factor
+                                                 for value in values],
+                                                seed=name)
+                      for values, factor, name in zip(base, (1.1, 1.1, 0.5),
+                                                      ('a', 'b', 'c'))]
+        # the bootstrap of a benchmark only depends on its seed
+        self.assertEqual(stats.bootstrap_log_ratio(base[0],
+                                                   [value * 1.1
+                                                    for value in base[0]],
+                                                   seed='a'),
+                         bootstraps[0])
+
+        geomean, low, high = stats.combine_log_ratios(bootstraps)
+        self.assertAlmostEqual(geomean, (1.1 * 1.1 * 0.5) ** (1 / 3))
+        self.assertTrue(low < geomean < high, (low, geomean, high))
+
+        # group of the first two benchmarks
+        geomean, low, high = stats.combine_log_ratios(bootstraps[:2])
+        self.assertAlmostEqual(geomean, 1.1)
+        self.assertTrue(low < 1.1 < high, (low, high))
+
+        # weights: a benchmark with a weight of 0 is ignored
+        geomean, low, high = stats.combine_log_ratios(bootstraps, [1, 1, 0])
+        self.assertAlmostEqual(geomean, 1.1)
+        self.assertTrue(low < 1.1 < high, (low, high))
+        geomean, low, high = stats.combine_log_ratios(bootstraps, [1, 0, 2])
+        self.assertAlmostEqual(geomean, (1.1 * 0.5 * 0.5) ** (1 / 3))
+        self.assertTrue(low < geomean < high, (low, geomean, high))
+        self.assertRaises(ValueError,
+                          stats.combine_log_ratios, bootstraps, [0, 0, 0])
+        self.assertRaises(ValueError,
+                          stats.combine_log_ratios, bootstraps, [-1, 0, 0])
+        self.assertRaises(ValueError, stats.combine_log_ratios, [])
+
+    def test_window_changes(self):
+        rng = random.Random(3)
+        values = ([rng.gauss(1.0, 0.01) for _ in range(30)]
+                  + [rng.gauss(1.05, 0.01) for _ in range(20)]
+                  + [rng.gauss(1.0, 0.01) for _ in range(8)])
+        changes = stats.window_changes(values)
+        self.assertEqual([index for index, ratio, pvalue in changes],
+                         [30, 50])
+        self.assertAlmostEqual(changes[0][1], 1.05, delta=0.01)
+        self.assertAlmostEqual(changes[1][1], 1 / 1.05, delta=0.01)
+        self.assertTrue(all(pvalue < 0.001 for index, ratio, pvalue
+                            in changes))
+
+        noise = [rng.gauss(1.0, 0.01) for _ in range(200)]
+        self.assertEqual(stats.window_changes(noise), [])
+
+    def test_changepoints(self):
+        rng = random.Random(3)
+        steady = [rng.gauss(1.0, 0.01) for index in range(30)]
+        self.assertEqual(stats.changepoints(steady), [])
+
+        values = [rng.gauss(2.0, 0.01) for index in range(10)] + steady
+        self.assertEqual(stats.changepoints(values), [10])
+
+    def test_steady_state_start(self):
+        rng = random.Random(3)
+        steady = [rng.gauss(1.0, 0.01) for index in range(30)]
+        self.assertEqual(stats.steady_state_start(steady), 0)
+
+        # JIT warmup: decreasing timings
+        values = [2.0, 1.6, 1.3, 1.1] + steady
+        self.assertEqual(stats.steady_state_start(values), 4)
+
+        # an outlier inside the steady state is not a warmup
+        values = steady[:10] + [1.5] + steady[10:]
+        self.assertEqual(stats.steady_state_start(values), 0)
+
+        # keep at least min_steady values
+        values = [2.0, 1.6, 1.3, 1.1] + steady[:3]
+        self.assertEqual(stats.steady_state_start(values, min_steady=5), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+import json
+import random
+import unittest
+
+from performance.warmup import WarmupDetector
+
+
+def worker_output(samples):
+    return json.dumps({'benchmarks': [{'runs': [{'samples': samples}]}],
+                       'version': 4})
+
+
+class WarmupTests(unittest.TestCase):
+    def test_detector(self):
+        rng = random.Random(7)
+        detector = WarmupDetector()
+        outputs = []
+        for run in range(3):
+            samples = ([4.0, 2.0, 1.5]
+                       + [rng.gauss(1.0, 0.01) for index in range(20)])
+            outputs.append(json.loads(detector.process_stdout(
+                worker_output(samples))))
+
+        for data in outputs:
+            self.assertEqual(len(data['benchmarks'][0]['runs'][0]['samples']),
+                             20)
+
+        metadata = detector.get_metadata(loops=10)
+        self.assertEqual(metadata['warmup_samples'], '3 3 3')
+        self.assertAlmostEqual(float(metadata['warmup_time']), 75.0)
+        curve = [float(point) for point in metadata['warmup_curve'].split()]
+        self.assertEqual(len(curve), 23)
+        self.assertAlmostEqual(curve[0], 4.0, delta=0.1)
+        self.assertAlmostEqual(curve[-1], 1.0, delta=0.05)
+
+    def test_empty(self):
+        self.assertEqual(WarmupDetector().get_metadata(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
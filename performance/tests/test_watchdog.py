@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+import os
+import signal
+import subprocess
+import sys
+import textwrap
+import unittest
+try:
+    import faulthandler
+except ImportError:
+    # Python 2
+    faulthandler = None
+
+from performance.watchdog import (Watchdog, kill_all,
+                                  new_process_group_kwargs, watchdog_env)
+
+
+@unittest.skipUnless(os.name == 'posix', 'need process groups')
+class WatchdogTests(unittest.TestCase):
+    def spawn(self, code, timeout):
+        # the child spawns a grandchild which must also be killed
+        code = textwrap.dedent(code)
+        proc = subprocess.Popen([sys.executable, '-c', code],
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                env=watchdog_env(os.environ),
+                                universal_newlines=True,
+                                **new_process_group_kwargs())
+        watchdog = Watchdog(timeout)
+        watchdog.start(proc)
+        stdout, stderr = proc.communicate()
+        watchdog.stop()
+        return (watchdog, proc, stdout, stderr)
+
+    def test_completed(self):
+        watchdog, proc, stdout, stderr = self.spawn('print("ok")', 60.0)
+        self.assertFalse(watchdog.expired)
+        self.assertEqual(proc.returncode, 0)
+        self.assertEqual(stdout, 'ok\n')
+
+    @unittest.skipIf(faulthandler is None, 'need faulthandler')
+    def test_hang(self):
+        code = '''
+            import subprocess, sys, time
+            subprocess.Popen([sys.executable, '-c',
+                              'import time; time.sleep(60)'])
+            time.sleep(60)
+        '''
+        watchdog, proc, stdout, stderr = self.spawn(code, 0.5)
+        self.assertTrue(watchdog.expired)
+        self.assertNotEqual(proc.returncode, 0)
+        # faulthandler dumped the traceback of both processes
+        self.assertEqual(stderr.count('Fatal Python error'), 2)
+
+    def test_new_session(self):
+        if sys.version_info >= (3, 2):
+            # preexec_fn is not thread-safe
+            self.assertEqual(new_process_group_kwargs(),
+                             {'start_new_session': True})
+        proc = subprocess.Popen([sys.executable, '-c',
+                                 'import os; print(os.getpgrp())'],
+                                stdout=subprocess.PIPE,
+                                universal_newlines=True,
+                                **new_process_group_kwargs())
+        stdout = proc.communicate()[0]
+        self.assertEqual(int(stdout), proc.pid)
+
+    def test_kill_all(self):
+        proc = subprocess.Popen([sys.executable, '-c',
+                                 'import time; time.sleep(60)'],
+                                **new_process_group_kwargs())
+        watchdog = Watchdog(60.0)
+        watchdog.start(proc)
+        try:
+            kill_all()
+            proc.wait()
+        finally:
+            watchdog.stop()
+        self.assertFalse(watchdog.expired)
+        self.assertEqual(proc.returncode, -signal.SIGKILL)
+
+        # stopped watchdogs are not killed again
+        kill_all()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from performance import worker_server
+from performance.worker_server import WorkerPool
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+SCRIPT = """\
+from __future__ import print_function
+import os
+import sys
+print(' '.join(sys.argv[1:]), os.getpid())
+sys.exit(int(sys.argv[1]))
+"""
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'need os.fork()')
+class WorkerServerTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.script = os.path.join(self.tmpdir, 'bm_script.py')
+        with open(self.script, 'w') as fp:
+            fp.write(SCRIPT)
+
+    def test_run_script(self):
+        result = worker_server.run_script([self.script, '3', 'arg'])
+        self.assertEqual(result['exitcode'], 3)
+        output, pid = result['stdout'].rsplit(None, 1)
+        self.assertEqual(output, '3 arg')
+        # the script runs in a forked child process
+        self.assertNotEqual(int(pid), os.getpid())
+        if result['rusage'] is not None:
+            self.assertGreaterEqual(result['rusage']['ru_utime'], 0)
+
+    def test_pool(self):
+        # the server imports performance and perf
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join([ROOT_DIR] + sys.path[1:])
+        pool = WorkerPool([sys.executable], 2, env=env)
+        self.addCleanup(pool.close)
+
+        pids = set()
+        for exitcode in (0, 1, 0):
+            code, stdout, usage = pool.run_script([self.script,
+                                                   str(exitcode)])
+            self.assertEqual(code, exitcode)
+            pids.add(stdout.split()[-1])
+        # a fresh child per script, the server is reused: the failure of a
+        # script doesn't kill the server
+        self.assertEqual(len(pids), 3)
+        self.assertEqual(len(pool._servers), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,6 @@
 from __future__ import division, with_statement, print_function, absolute_import
 
+import argparse
 import errno
 import os
 import platform
@@ -339,6 +340,15 @@ def create_virtualenv(python, venv_path):
     return venv_python
 
 
+def get_virtualenv_python(python):
+    """Get the Python program of the virtual environment of the Python
+    program python. Create the virtual environment if it doesn't exist."""
+    options = argparse.Namespace(python=python, venv=None)
+
+    venv_path = virtualenv_path(options)
+    return create_virtualenv(python, venv_path)
+
+
 def exec_in_virtualenv(options):
     venv_path = virtualenv_path(options)
     venv_python = create_virtualenv(options.python, venv_path)
@@ -0,0 +1,74 @@
+"""Automatic warmup detection (--auto-warmups).
+
+Worker processes run without warmup. A changepoint analysis of the samples of
+each worker process (run) finds where the steady state starts: samples before
+it are removed from the run.
+
+Metadata:
+
+* warmup_samples: number of samples removed from each run, separated by
+  spaces
+* warmup_time: median time in seconds spent in the removed samples of a run
+* warmup_curve: median over runs of each sample divided by the median of the
+  steady state of its run, separated by spaces: the warmup curve (1.00 means
+  steady state)
+"""
+
+from __future__ import division, with_statement, print_function, absolute_import
+
+import json
+
+from performance import stats
+
+
+# Maximum number of points of the warmup curve stored in metadata
+CURVE_SIZE = 50
+
+
+class WarmupDetector(object):
+    """Detect warmup samples in worker results and remove them."""
+
+    def __init__(self):
+        # list of (samples, cut) tuples, one per run
+        self.runs = []
+
+    def process_stdout(self, stdout):
+        """Remove warmup samples from the JSON output of a worker process."""
+        data = json.loads(stdout)
+        for bench in data['benchmarks']:
+            for run in bench['runs']:
+                samples = run['samples']
+                cut = stats.steady_state_start(samples)
+                self.runs.append((samples, cut))
+                run['samples'] = samples[cut:]
+        return json.dumps(data)
+
+    def get_metadata(self, loops=1):
+        """Get metadata.
+
+        Args:
+            loops: number of loops (loops * inner_loops) of a sample.
+        """
+        if not self.runs:
+            return {}
+        cuts = [cut for samples, cut in self.runs]
+        times = [sum(samples[:cut]) * loops for samples, cut in self.runs]
+
+        curves = []
+        for samples, cut in self.runs:
+            steady = stats.median(samples[cut:])
+            if steady:
+                curves.append([sample / steady
+                               for sample in samples[:CURVE_SIZE]])
+        curve = []
+        for index in range(max(len(points) for points in curves)
+                           if curves else 0):
+            points = [points[index] for points in curves
+                      if index < len(points)]
+            curve.append(stats.median(points))
+
+        return {
+            'warmup_samples': ' '.join(str(cut) for cut in cuts),
+            'warmup_time': '%.6f' % stats.median(times),
+            'warmup_curve': ' '.join('%.3f' % point for point in curve),
+        }
@@ -0,0 +1,124 @@
+from __future__ import division, with_statement, print_function, absolute_import
+
+import errno
+import os
+import signal
+import sys
+import threading
+
+
+# Delay in seconds between SIGABRT (dump tracebacks) and SIGKILL
+KILL_DELAY = 5.0
+
+# Watchdogs of running processes: see kill_all()
+_running = set()
+_running_lock = threading.Lock()
+
+
+def new_process_group_kwargs():
+    """Keyword arguments of subprocess.Popen to spawn the process in a new
+    process group, to be able to kill the process and all its children."""
+    if os.name != 'posix':
+        return {}
+    if sys.version_info >= (3, 2):
+        # preexec_fn is not safe in the presence of threads (--jobs):
+        # setsid() is called by the subprocess module itself
+        return {'start_new_session': True}
+    # Python 2
+    return {'preexec_fn': os.setpgrp}
+
+
+def kill_all():
+    """Kill the process groups of all running watchdogs.
+
+    Used on CTRL+c: the process groups don't get the signal of the terminal,
+    and the threads of other jobs don't get the KeyboardInterrupt.
+    """
+    with _running_lock:
+        watchdogs = list(_running)
+    for watchdog in watchdogs:
+        watchdog.kill()
+
+
+def watchdog_env(env):
+    """Enable faulthandler in the process and its children: on SIGABRT,
+    faulthandler dumps the Python traceback of all threads into stderr."""
+    env = dict(env)
+    env['PYTHONFAULTHANDLER'] = '1'
+    return env
+
+
+class Watchdog(object):
+    """Kill a process and all its children if it doesn't complete in time.
+
+    The process must be the leader of its own process group (see
+    new_process_group_kwargs()). On timeout, SIGABRT is sent to the process
+    group so faulthandler dumps tracebacks, and then SIGKILL after
+    KILL_DELAY seconds.
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.expired = False
+        self._proc = None
+        self._timers = []
+        self._lock = threading.Lock()
+        self._stopped = False
+
+    def _signal(self, signum):
+        if os.name != 'posix':
+            self._proc.kill()
+            return
+        try:
+            os.killpg(self._proc.pid, signum)
+        except OSError as exc:
+            # the process group is gone
+            if exc.errno != errno.ESRCH:
+                raise
+
+    def _start_timer(self, delay, func):
+        timer = threading.Timer(delay, func)
+        timer.daemon = True
+        self._timers.append(timer)
+        timer.start()
+
+    def _expire(self):
+        with self._lock:
+            if self._stopped:
+                return
+            self.expired = True
+            self._signal(getattr(signal, 'SIGABRT', signal.SIGTERM))
+            self._start_timer(KILL_DELAY, self._kill)
+
+    def _kill(self):
+        with self._lock:
+            if self._stopped:
+                return
+            self._signal(getattr(signal, 'SIGKILL', signal.SIGTERM))
+
+    def kill(self):
+        """Kill the process group immediately."""
+        with self._lock:
+            if self._stopped:
+                return
+            self._signal(getattr(signal, 'SIGKILL', signal.SIGTERM))
+
+    def start(self, proc):
+        self._proc = proc
+        with _running_lock:
+            _running.add(self)
+        self._start_timer(self.timeout, self._expire)
+
+    def stop(self, usage=None):
+        with _running_lock:
+            _running.discard(self)
+        with self._lock:
+            self._stopped = True
+            for timer in self._timers:
+                timer.cancel()
+            if self.expired:
+                # kill worker processes which survived SIGABRT
+                self._signal(getattr(signal, 'SIGKILL', signal.SIGTERM))
+
+    def get_metadata(self):
+        return {}
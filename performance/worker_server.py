@@ -0,0 +1,211 @@
+"""Worker server: pool of warm interpreters running perf workers.
+
+By default, each benchmark runs in a fresh interpreter which spawns fresh perf
+worker processes: each process pays the interpreter startup and imports perf,
+six and the benchmark dependencies again.
+
+In worker server mode, a server process imports these modules once. For each
+perf worker, the server forks a child process which runs the benchmark script
+in worker mode (--worker), and sends back the result over a pipe.
+
+The server reads requests from stdin and writes responses to stdout, one JSON
+object per line:
+
+* request: {"argv": [script, arg1, ...]}
+* response: {"exitcode": int, "stdout": str, "rusage": dict or null}
+"""
+
+from __future__ import division, with_statement, print_function, absolute_import
+
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import traceback
+try:
+    import queue
+except ImportError:
+    # Python 2
+    import Queue as queue
+
+from performance import rusage
+
+
+# Modules imported by the server before forking workers
+PRELOAD = ('perf', 'perf.text_runner', 'six', 'six.moves')
+
+# Benchmark dependencies imported by the server, if available
+PRELOAD_OPTIONAL = ('chameleon', 'django.template', 'mako.template',
+                    'tornado.httpserver', 'tornado.web', 'html5lib',
+                    'xml.etree.ElementTree', 'json', 'pickle')
+
+
+def preload_modules():
+    for name in PRELOAD:
+        __import__(name)
+    for name in PRELOAD_OPTIONAL:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+
+
+def _run_child(argv, stdout_fd):
+    exitcode = 1
+    try:
+        null_fd = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(null_fd, 0)
+        os.close(null_fd)
+        os.dup2(stdout_fd, 1)
+        os.close(stdout_fd)
+        sys.stdout = os.fdopen(1, 'w')
+
+        # forked children share the state of the random module
+        random.seed()
+
+        sys.argv = list(argv)
+        sys.path[0] = os.path.dirname(os.path.abspath(argv[0]))
+
+        import runpy
+        runpy.run_path(argv[0], run_name='__main__')
+        exitcode = 0
+    except SystemExit as exc:
+        if exc.code is None:
+            exitcode = 0
+        elif isinstance(exc.code, int):
+            exitcode = exc.code
+        else:
+            print(exc.code, file=sys.stderr)
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(exitcode)
+
+
+def run_script(argv):
+    """Run a script in a child process forked from the server."""
+    rfd, wfd = os.pipe()
+    pid = os.fork()
+    if not pid:
+        os.close(rfd)
+        _run_child(argv, wfd)
+
+    os.close(wfd)
+    with os.fdopen(rfd) as fp:
+        stdout = fp.read()
+    if rusage.is_supported():
+        status, usage = os.wait4(pid, 0)[1:]
+        usage = rusage.rusage_to_dict(usage)
+    else:
+        status = os.waitpid(pid, 0)[1]
+        usage = None
+    if os.WIFSIGNALED(status):
+        exitcode = -os.WTERMSIG(status)
+    else:
+        exitcode = os.WEXITSTATUS(status)
+    return {'exitcode': exitcode, 'stdout': stdout, 'rusage': usage}
+
+
+def serve():
+    # Keep the protocol on a private file descriptor: anything written
+    # to stdout by preloaded modules goes to stderr.
+    output = os.fdopen(os.dup(1), 'w')
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    preload_modules()
+
+    for line in iter(sys.stdin.readline, ''):
+        request = json.loads(line)
+        response = run_script(request['argv'])
+        output.write(json.dumps(response) + '\n')
+        output.flush()
+
+
+class WorkerServer(object):
+    """Client of a worker server process."""
+
+    def __init__(self, python, env=None):
+        cmd = list(python) + ['-m', 'performance.worker_server']
+        self._proc = subprocess.Popen(cmd,
+                                      stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE,
+                                      env=env,
+                                      universal_newlines=True)
+
+    def run_script(self, argv):
+        """Run a script in a fresh child process of the server.
+
+        Returns:
+            (exitcode, stdout, usage) tuple where usage is the resource usage
+            of the child process (dict), or None if it is not available.
+        """
+        request = json.dumps({'argv': list(argv)})
+        try:
+            self._proc.stdin.write(request + '\n')
+            self._proc.stdin.flush()
+            line = self._proc.stdout.readline()
+        except (IOError, OSError) as exc:
+            raise RuntimeError("Worker server died: %s" % exc)
+        if not line:
+            raise RuntimeError("Worker server died")
+        response = json.loads(line)
+        return (response['exitcode'], response['stdout'],
+                response['rusage'])
+
+    def close(self):
+        self._proc.stdin.close()
+        self._proc.stdout.close()
+        self._proc.wait()
+
+
+class WorkerPool(object):
+    """Pool of worker servers, one per job; servers are spawned on demand."""
+
+    def __init__(self, python, size, env=None):
+        self._python = python
+        self._env = env
+        self._size = size
+        self._servers = []
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if len(self._servers) < self._size:
+                server = WorkerServer(self._python, self._env)
+                self._servers.append(server)
+                return server
+        return self._idle.get()
+
+    def run_script(self, argv):
+        server = self._acquire()
+        try:
+            result = server.run_script(argv)
+        except RuntimeError:
+            # don't reuse a dead server
+            with self._lock:
+                self._servers.remove(server)
+            raise
+        self._idle.put(server)
+        return result
+
+    def close(self):
+        for server in self._servers:
+            server.close()
+        del self._servers[:]
+
+
+if __name__ == "__main__":
+    serve()
@@ -51,8 +51,10 @@ def _main(venv):
 
 def main():
     # Unit tests
-    cmd = [sys.executable,
-           os.path.join('performance', 'tests', 'test_compare.py')]
+    root = os.path.dirname(os.path.abspath(__file__))
+    cmd = [sys.executable, '-m', 'unittest', 'discover',
+           '-s', os.path.join(root, 'performance', 'tests'),
+           '-t', root]
     run_cmd(cmd)
 
     # Functional tests